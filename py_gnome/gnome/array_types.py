@@ -239,6 +239,10 @@ _default_values = {'positions': ((3,), world_point_type, 'positions',
                                             (0., 0., 0.)),
                    'status_codes': ((), status_code_type, 'status_codes',
                                     oil_status.in_water),
+                   # raster pixel of 'positions', kept by RasterMap so only
+                   # elements that moved are projected.  int32 min: not set
+                   'pixel_positions': ((2,), np.int32, 'pixel_positions',
+                                       (np.iinfo(np.int32).min,) * 2),
                    'spill_num': ((), id_type, 'spill_num', 0),
                    'id': ((), np.uint32, 'id', 0, IdArrayType),
                    'windages': ((), windage_type, 'windages', 0),
@@ -257,6 +261,9 @@ _default_values = {'positions': ((3,), world_point_type, 'positions',
                    # It is evenly divided to number of LEs
                    'bulk_init_volume': ((), np.float64, 'bulk_init_volume', 0,
                                         ArrayTypeDivideOnSplit),
+                   # index of the blob the LE spreads with, in the spreading
+                   # weatherer's BlobTable. -1: not in a blob yet
+                   'blob_num': ((), np.int32, 'blob_num', -1),
                    'density': ((), np.float64, 'density', 1000),
                    'oil_density': ((), np.float64, 'oil_density', 0),
                    'evap_decay_constant': (None, np.float64,
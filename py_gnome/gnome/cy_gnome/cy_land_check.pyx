@@ -6,6 +6,8 @@ have crossed land on the raster map
 """
 
 import cython
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 from gnome.utilities.geometry.cy_point_in_polygon import points_in_poly
@@ -41,7 +43,7 @@ cdef int32_t c_overlap_grid(int32_t m,
                             int32_t y1,
                             int32_t x2,
                             int32_t y2,
-                            ):
+                            ) nogil:
     """
     check if the line segment from pt1 to pt could overlap the grid of
     size (m,n).
@@ -73,7 +75,7 @@ cdef bool c_find_first_pixel(uint8_t* grid,
                              int32_t *prev_y,
                              int32_t *hit_x,
                              int32_t *hit_y,
-                             ):
+                             ) nogil:
     """
     Marches along the grid to see if the LE movement crosses land
 
@@ -285,15 +287,190 @@ def check_land(cnp.ndarray[uint8_t, ndim=2, mode='c'] grid not None,
         return None
 
 
+cdef void c_check_land_layers(uint8_t** dataptrs,
+                              int32_t* widths,
+                              int32_t* heights,
+                              int32_t* grid_ratios,
+                              int32_t num_ratios,
+                              int32_t* positions,
+                              int32_t* end_positions,
+                              int16_t* status_codes,
+                              int32_t* last_water_positions,
+                              Py_ssize_t start,
+                              Py_ssize_t stop,
+                              ) nogil:
+    """
+    Land-check the LEs from start to stop (see check_land_layers)
+
+    positions, end_positions and last_water_positions are the (N, 2) arrays,
+    flattened.
+
+    This doesn't touch any python objects, so can be run without the GIL,
+    on separate chunks of LEs at the same time.
+    """
+    cdef int32_t prev_x, prev_y, hit_x, hit_y, cur_ratio, layer
+    cdef int32_t x0, y0, x1, y1
+    cdef Py_ssize_t i
+    cdef bool did_hit
+
+    # the finest layer -- the raster itself
+    cdef uint8_t* base = dataptrs[num_ratios - 1]
+    cdef int32_t m = widths[num_ratios - 1]
+    cdef int32_t n = heights[num_ratios - 1]
+
+    for i in range(start, stop):
+        if status_codes[i] == type_defs.OILSTAT_ONLAND:
+            continue
+
+        x0 = positions[2 * i]
+        y0 = positions[2 * i + 1]
+        x1 = end_positions[2 * i]
+        y1 = end_positions[2 * i + 1]
+
+        # most LEs don't move off their pixel in a time step -- if that
+        # pixel is water (or off the raster), there is nothing to walk
+        if (x0 == x1 and y0 == y1 and
+                (x0 < 0 or x0 >= m or y0 < 0 or y0 >= n or
+                 base[x0 * n + y0] == 0)):
+            continue
+
+        layer = 0
+        #begin the walk. If a hit is registered on the current grid, drop down one level and continue the walk.
+        #If a hit is registered on the lowest level, then LE has landed.
+        while True:
+            cur_ratio = grid_ratios[layer]
+            did_hit = c_find_first_pixel(dataptrs[layer],
+                                         widths[layer],
+                                         heights[layer],
+                                         div(x0, cur_ratio).quot,
+                                         div(y0, cur_ratio).quot,
+                                         div(x1, cur_ratio).quot,
+                                         div(y1, cur_ratio).quot,
+                                         &prev_x,
+                                         &prev_y,
+                                         &hit_x,
+                                         &hit_y,
+                                         )
+            if did_hit:
+                if layer == num_ratios - 1:
+                    # hit on the lowest layer (confirmed land hit)
+                    last_water_positions[2 * i] = prev_x
+                    last_water_positions[2 * i + 1] = prev_y
+                    end_positions[2 * i] = hit_x
+                    end_positions[2 * i + 1] = hit_y
+                    status_codes[i] = type_defs.OILSTAT_ONLAND
+                    break
+                else:
+                    # possible hit, go down a layer and try again
+                    layer += 1
+            else:
+                # didn't hit land -- can move the LE
+                positions[2 * i] = x1
+                positions[2 * i + 1] = y1
+                break
+
+
+cdef class _LayersChecker:
+    """
+    Holds the pointers to the raster layers and LE arrays, so chunks of the
+    LEs can be checked from separate threads.
+
+    Only used by check_land_layers()
+    """
+    cdef uint8_t** dataptrs
+    cdef int32_t* widths
+    cdef int32_t* heights
+    cdef int32_t num_ratios
+    cdef int32_t* ratios_ptr
+    cdef int32_t* pos_ptr
+    cdef int32_t* end_ptr
+    cdef int16_t* status_ptr
+    cdef int32_t* lwp_ptr
+    # keep the arrays alive while the pointers are in use
+    cdef object arrays
+
+    def __cinit__(self,
+                  grid_layers,
+                  cnp.ndarray[int32_t, ndim=1, mode='c'] grid_ratios,
+                  cnp.ndarray[int32_t, ndim=2, mode='c'] positions,
+                  cnp.ndarray[int32_t, ndim=2, mode='c'] end_positions,
+                  cnp.ndarray[int16_t, ndim=1, mode='c'] status_codes,
+                  cnp.ndarray[int32_t, ndim=2, mode='c'] last_water_positions):
+        cdef cnp.ndarray[uint8_t, ndim=2, mode="c"] grid_arr
+        cdef int32_t i
+
+        self.num_ratios = grid_ratios.shape[0]
+        self.dataptrs = <uint8_t**> PyMem_Malloc(self.num_ratios * sizeof(uint8_t *))
+        self.widths = <int32_t*> PyMem_Malloc(self.num_ratios * sizeof(int32_t))
+        self.heights = <int32_t*> PyMem_Malloc(self.num_ratios * sizeof(int32_t))
+        if not (self.dataptrs and self.widths and self.heights):
+            raise MemoryError()
+
+        for i in range(self.num_ratios):
+            grid_arr = grid_layers[i]
+            self.widths[i] = grid_arr.shape[0]
+            self.heights[i] = grid_arr.shape[1]
+            self.dataptrs[i] = <uint8_t*> grid_arr.data
+
+        self.ratios_ptr = <int32_t*> grid_ratios.data
+        self.pos_ptr = <int32_t*> positions.data
+        self.end_ptr = <int32_t*> end_positions.data
+        self.status_ptr = <int16_t*> status_codes.data
+        self.lwp_ptr = <int32_t*> last_water_positions.data
+
+        self.arrays = (list(grid_layers), grid_ratios, positions,
+                       end_positions, status_codes, last_water_positions)
+
+    def __dealloc__(self):
+        PyMem_Free(self.dataptrs)
+        PyMem_Free(self.widths)
+        PyMem_Free(self.heights)
+
+    def check(self, Py_ssize_t start, Py_ssize_t stop):
+        """
+        land-check LEs start to stop, without holding the GIL
+        """
+        with nogil:
+            c_check_land_layers(self.dataptrs,
+                                self.widths,
+                                self.heights,
+                                self.ratios_ptr,
+                                self.num_ratios,
+                                self.pos_ptr,
+                                self.end_ptr,
+                                self.status_ptr,
+                                self.lwp_ptr,
+                                start,
+                                stop)
+
+
+# don't bother with threads for fewer LEs than this
+MIN_CHUNK_SIZE = 1024
+
+# thread pools, by number of threads -- kept, so threads aren't started
+# every time step
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(num_threads):
+    with _pools_lock:
+        pool = _pools.get(num_threads)
+        if pool is None:
+            pool = ThreadPoolExecutor(max_workers=num_threads)
+            _pools[num_threads] = pool
+
+    return pool
+
+
 ## called by a method in gnome.map.RasterMap class
-@cython.boundscheck(False)
-@cython.wraparound(False)
 def check_land_layers(grid_layers,
-                cnp.ndarray[int32_t, ndim=1, mode='c'] grid_ratios,
-                cnp.ndarray[int32_t, ndim=2, mode='c'] positions,
-                cnp.ndarray[int32_t, ndim=2, mode='c'] end_positions,
-                cnp.ndarray[int16_t, ndim=1, mode='c'] status_codes,
-                cnp.ndarray[int32_t, ndim=2, mode='c'] last_water_positions):
+                      cnp.ndarray[int32_t, ndim=1, mode='c'] grid_ratios,
+                      cnp.ndarray[int32_t, ndim=2, mode='c'] positions,
+                      cnp.ndarray[int32_t, ndim=2, mode='c'] end_positions,
+                      cnp.ndarray[int16_t, ndim=1, mode='c'] status_codes,
+                      cnp.ndarray[int32_t, ndim=2, mode='c'] last_water_positions,
+                      int num_threads=1):
         """
         Do the actual land-checking
 
@@ -303,81 +480,46 @@ def check_land_layers(grid_layers,
 
         This version will look through multiple layers of raster map
 
+        Each LE is independent, so with num_threads > 1, the LEs are split
+        into chunks that are checked in separate threads, without the GIL.
+        The results are the same however many threads are used.
         """
-        cdef int32_t  prev_x, prev_y, hit_x, hit_y, cur_ratio, layer, coarse_pos_x, num_ratios
-        cdef uint32_t i, num_le
-        cdef int32_t m, n
-        cdef bool did_hit
-        cdef int32_t* coarse_pos = <int32_t*> PyMem_Malloc (2*sizeof(int32_t))
-        cdef int32_t* coarse_end = <int32_t*> PyMem_Malloc (2*sizeof(int32_t))
+        cdef Py_ssize_t num_le = positions.shape[0]
+        cdef Py_ssize_t chunk
 
-        num_ratios = grid_ratios.shape[0]
-        cdef uint8_t** dataptrs = <uint8_t**> PyMem_Malloc(num_ratios*sizeof(uint8_t *))
-        cdef int32_t* widths = <int32_t*> PyMem_Malloc(num_ratios*sizeof(int32_t))
-        cdef int32_t* heights = <int32_t*> PyMem_Malloc(num_ratios*sizeof(int32_t))
+        if num_le == 0:
+            return None
 
-        cdef cnp.ndarray[uint8_t, ndim=2, mode="c"] grid_arr
-        for i in range(num_ratios):
-            grid_arr = grid_layers[i]
-            widths[i] = grid_layers[i].shape[0]
-            heights[i] = grid_layers[i].shape[1]
-            dataptrs[i] = &grid_arr[0,0]
+        if (positions.shape[1] != 2 or
+                end_positions.shape[0] != num_le or
+                end_positions.shape[1] != 2 or
+                last_water_positions.shape[0] != num_le or
+                last_water_positions.shape[1] != 2 or
+                status_codes.shape[0] != num_le):
+            raise ValueError('positions, end_positions and last_water_positions '
+                             'must be (N, 2), and status_codes (N,)')
 
-        num_le = positions.shape[0]
+        if len(grid_layers) != grid_ratios.shape[0]:
+            raise ValueError('there must be one ratio for each raster layer')
 
-        for i in range(num_le):
-            #if the LE is on land, or if it starts and ends in the same water-only square on the coarsest grid, skip this LE
-            if status_codes[i] == type_defs.OILSTAT_ONLAND:
-                continue
+        checker = _LayersChecker(grid_layers, grid_ratios,
+                                 positions, end_positions,
+                                 status_codes, last_water_positions)
 
-            layer = 0
-            #begin the walk. If a hit is registered on the current grid, drop down one level and continue the walk.
-            #If a hit is registered on the lowest level, then LE has landed.
-            while True:
-                coarse_pos[0] = div(positions[i,0], grid_ratios[layer]).quot
-                coarse_pos[1] = div(positions[i,1], grid_ratios[layer]).quot
-                coarse_end[0] = div(end_positions[i,0], grid_ratios[layer]).quot
-                coarse_end[1] = div(end_positions[i,1], grid_ratios[layer]).quot
-                cur_ratio = grid_ratios[layer]
-                did_hit = c_find_first_pixel(dataptrs[layer],
-                                         widths[layer],
-                                         heights[layer],
-                                         coarse_pos[0],
-                                         coarse_pos[1],
-                                         coarse_end[0],
-                                         coarse_end[1],
-                                         &prev_x,
-                                         &prev_y,
-                                         &hit_x,
-                                         &hit_y,
-                                         )
-                if did_hit:
-                    if layer == num_ratios - 1:
-                        # hit on the lowest layer (confirmed land hit)
-                        last_water_positions[i, 0] = prev_x
-                        last_water_positions[i, 1] = prev_y
-                        end_positions[i,0] = hit_x
-                        end_positions[i,1] = hit_y
-                        status_codes[i] = type_defs.OILSTAT_ONLAND
-                        break
-                    else:
-                        # possible hit, go down a layer and try again
-                        layer += 1
-                        coarse_pos[0] = div(positions[i,0], grid_ratios[layer]).quot
-                        coarse_pos[1] = div(positions[i,1], grid_ratios[layer]).quot
-                        coarse_end[0] = div(end_positions[i,0], grid_ratios[layer]).quot
-                        coarse_end[1] = div(end_positions[i,1], grid_ratios[layer]).quot
-                else:
-                    # didn't hit land -- can move the LE
-                    positions[i, 0] = end_positions[i, 0]
-                    positions[i, 1] = end_positions[i, 1]
-                    break
+        num_threads = min(num_threads, num_le // MIN_CHUNK_SIZE)
+
+        if num_threads <= 1:
+            checker.check(0, num_le)
+        else:
+            chunk = -(-num_le // num_threads)
+            futures = [_get_pool(num_threads).submit(checker.check,
+                                                     start,
+                                                     min(start + chunk, num_le))
+                       for start in range(0, num_le, chunk)]
+            for f in futures:
+                f.result()
 
-        PyMem_Free(coarse_pos)
-        PyMem_Free(coarse_end)
-        PyMem_Free(dataptrs)
-        PyMem_Free(widths)
-        PyMem_Free(heights)
+        return None
 
 
 def move_particles(cnp.ndarray[cnp.float64_t, ndim=2, mode='c'] positions not None,
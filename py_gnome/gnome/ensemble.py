@@ -0,0 +1,407 @@
+'''
+Monte Carlo ensembles of a Model
+
+The EnsembleRunner runs many perturbed copies (members) of a model across a
+pool of processes, and reduces their results as they come in.  Only small
+per-member summaries (where the oil beached, the mass balance at each step)
+are sent back to the main process -- not the full element data.
+
+A perturbation spec is a dict of {name: spec}, where name is one of
+PERTURBATIONS, and spec is either:
+
+    - a (low, high) pair, sampled uniformly for each member,
+    - a pair of such pairs, each sampled separately
+      (e.g. windage_range=((0.01, 0.02), (0.03, 0.05)))
+    - a callable taking a numpy RandomState, and returning the value
+
+Each member also gets its own random seed, so an ensemble is reproducible
+no matter which process runs which member.
+'''
+import multiprocessing as mp
+from contextlib import contextmanager
+
+import numpy as np
+
+from gnome.gnomeobject import AddLogger
+from gnome.basic_types import oil_status
+from gnome.environment import Wind
+from gnome.movers import GridWindMover, PyWindMover
+from gnome.utilities import rand
+
+
+# wind_scale and amount_scale multiply the values in the model,
+# diffusion_coef and windage_range replace them.
+PERTURBATIONS = ('wind_scale', 'diffusion_coef', 'windage_range',
+                 'amount_scale')
+
+# the gridded wind movers, and the attribute they scale their wind by --
+# the other wind movers use the Wind objects that are scaled (_winds())
+WIND_MOVER_SCALES = ((PyWindMover, 'scale_value'),
+                     (GridWindMover, 'wind_scale'))
+
+
+def _sample(spec, random_state):
+    if callable(spec):
+        return spec(random_state)
+
+    low, high = spec
+
+    if np.isscalar(low):
+        return random_state.uniform(low, high)
+    else:
+        return tuple(_sample(s, random_state) for s in spec)
+
+
+def sample_perturbations(perturbations, num_members, seed=1):
+    '''
+        Sample the parameters of each member of an ensemble.
+
+        :param dict perturbations: {name: spec}, see module docstring.
+
+        :param int num_members: number of members in the ensemble.
+
+        :param int seed=1: seed used for the sampling.  Member i is run with
+                           random seed seed + i.
+
+        :returns: a list of dicts, one per member, of {name: value},
+                  including 'seed'.
+    '''
+    perturbations = perturbations or {}
+
+    for name in perturbations:
+        if name not in PERTURBATIONS:
+            raise ValueError('Unknown perturbation {}. Must be one of {}'
+                             .format(name, PERTURBATIONS))
+
+    random_state = np.random.RandomState(seed)
+    members = []
+
+    for i in range(num_members):
+        params = {name: _sample(spec, random_state)
+                  for name, spec in sorted(perturbations.items())}
+        params['seed'] = seed + i
+
+        members.append(params)
+
+    return members
+
+
+def _winds(model):
+    '''
+        All the Wind objects used in a model, each only once.
+    '''
+    winds = {}
+
+    for obj in list(model.environment) + list(model.movers):
+        wind = obj if isinstance(obj, Wind) else getattr(obj, 'wind', None)
+
+        if isinstance(wind, Wind):
+            winds[id(wind)] = wind
+
+    return list(winds.values())
+
+
+@contextmanager
+def perturbed(model, params):
+    '''
+        Apply a member's perturbations to a model, and put the original
+        values back on exit, so the same model object can be used for the
+        next member.
+
+        While perturbed, the model's outputters, cache and uncertain spills
+        are turned off -- the ensemble takes the place of those.
+    '''
+    restore = []
+
+    def set_(obj, attr, value):
+        restore.append((obj, attr, getattr(obj, attr)))
+        setattr(obj, attr, value)
+
+    try:
+        set_(model, 'uncertain', False)
+        set_(model, 'cache_enabled', False)
+
+        for outputter in model.outputters:
+            set_(outputter, 'on', False)
+
+        if 'wind_scale' in params:
+            scale = params['wind_scale']
+
+            for wind in _winds(model):
+                data = wind.get_wind_data()
+                restore.append((wind, None, (data.copy(), wind.units)))
+
+                data['value'][:, 0] *= scale
+                wind.set_wind_data(data, wind.units)
+
+            for mover in model.movers:
+                # gridded winds are scaled by the mover -- current movers
+                # have a scale_value too, so only the wind movers
+                for mover_type, attr in WIND_MOVER_SCALES:
+                    if isinstance(mover, mover_type):
+                        set_(mover, attr, getattr(mover, attr) * scale)
+
+        if 'diffusion_coef' in params:
+            for mover in model.movers:
+                if hasattr(mover, 'diffusion_coef'):
+                    set_(mover, 'diffusion_coef', params['diffusion_coef'])
+
+        for spill in model.spills:
+            if 'windage_range' in params:
+                set_(spill.substance, 'windage_range',
+                     tuple(params['windage_range']))
+
+            if 'amount_scale' in params:
+                set_(spill, 'amount', spill.amount * params['amount_scale'])
+
+        yield model
+    finally:
+        for obj, attr, value in reversed(restore):
+            if attr is None:
+                obj.set_wind_data(*value)
+            else:
+                setattr(obj, attr, value)
+
+
+def run_member(model, params, grid=None):
+    '''
+        Run one member of an ensemble, and summarize it.
+
+        :param model: the model to run.  It is perturbed for the run, and put
+                      back to its original state afterwards.
+
+        :param dict params: the member's parameters, as returned by
+                            sample_perturbations()
+
+        :param grid: ((x_min, y_min), (x_max, y_max), (num_x, num_y)) of the
+                     grid to record beached elements on, or None to skip it.
+
+        :returns: dict with:
+                  'params': params
+                  'beached': boolean array of shape (num_y, num_x), True
+                             where any element beached during the run
+                  'mass_balance': {name: array of the value at each step}
+    '''
+    beached = None
+
+    if grid is not None:
+        (x_min, y_min), (x_max, y_max), (num_x, num_y) = grid
+        beached = np.zeros((num_y, num_x), dtype=bool)
+
+        dx = (x_max - x_min) / num_x
+        dy = (y_max - y_min) / num_y
+
+    mass_balance = []
+
+    with perturbed(model, params):
+        # rewind() seeds the generators with 1, so the member's seed goes
+        # after it
+        model.rewind()
+        rand.seed(params['seed'])
+
+        while True:
+            try:
+                model.step()
+            except StopIteration:
+                break
+
+            sc = model.spills.items()[0]
+            mass_balance.append(dict(sc.mass_balance))
+
+            if beached is not None and len(sc) > 0:
+                on_land = sc['status_codes'] == oil_status.on_land
+                pos = sc['positions'][on_land]
+
+                ix = np.floor((pos[:, 0] - x_min) / dx).astype(np.intp)
+                iy = np.floor((pos[:, 1] - y_min) / dy).astype(np.intp)
+
+                inside = (ix >= 0) & (ix < num_x) & (iy >= 0) & (iy < num_y)
+                beached[iy[inside], ix[inside]] = True
+
+        model.rewind()
+
+    # weatherers add to the mass balance as they become active
+    names = sorted(set().union(*mass_balance)) if mass_balance else []
+
+    return {'params': params,
+            'beached': beached,
+            'mass_balance': {name: np.array([mb.get(name, 0.0)
+                                             for mb in mass_balance])
+                             for name in names}
+            }
+
+
+# the model each pool process runs its members on
+_worker_model = None
+
+
+def _init_worker(model):
+    global _worker_model
+
+    _worker_model = model
+
+
+def _run_member(args):
+    return run_member(_worker_model, *args)
+
+
+class EnsembleResult(object):
+    '''
+        Statistics of the members of an ensemble, accumulated as the members
+        finish.
+    '''
+    def __init__(self, grid=None):
+        self.grid = grid
+        self.params = []
+        self.beached_count = None
+        self._mass_balance = []
+
+        if grid is not None:
+            num_x, num_y = grid[2]
+            self.beached_count = np.zeros((num_y, num_x), dtype=np.int64)
+
+    @property
+    def num_members(self):
+        return len(self.params)
+
+    def add(self, summary):
+        '''
+            Add the summary of a member, as returned by run_member()
+        '''
+        self.params.append(summary['params'])
+        self._mass_balance.append(summary['mass_balance'])
+
+        if self.beached_count is not None:
+            self.beached_count += summary['beached']
+
+    @property
+    def beaching_probability(self):
+        '''
+            Fraction of the members that beached oil in each grid cell
+        '''
+        if self.beached_count is None or self.num_members == 0:
+            return None
+
+        return self.beached_count / float(self.num_members)
+
+    def mass_balance_percentiles(self, q=(5, 50, 95)):
+        '''
+            Percentiles of the mass balance over the members, at each step.
+
+            :param q=(5, 50, 95): the percentiles to compute
+
+            :returns: {name: array of shape (len(q), num_steps)}
+        '''
+        names = sorted(set().union(*self._mass_balance))
+        percentiles = {}
+
+        for name in names:
+            num_steps = max(len(mb[name]) for mb in self._mass_balance
+                            if name in mb)
+
+            # members that never had this value are left out
+            values = np.full((self.num_members, num_steps), np.nan)
+            for i, mb in enumerate(self._mass_balance):
+                if name in mb:
+                    values[i, :len(mb[name])] = mb[name]
+
+            percentiles[name] = np.nanpercentile(values, q, axis=0)
+
+        return percentiles
+
+
+class EnsembleRunner(AddLogger):
+    '''
+        Run a Monte Carlo ensemble of a model across a pool of processes.
+
+        The members are handed to the processes one at a time, so a process
+        that finishes early picks up the next member rather than waiting on
+        a fixed share of the work.
+    '''
+    def __init__(self, model, num_members,
+                 perturbations=None,
+                 seed=1,
+                 num_workers=None,
+                 grid_shape=(100, 100),
+                 grid_bounds=None):
+        '''
+            :param model: the model to run.  It is sent to each process once,
+                          when the pool starts.
+
+            :param int num_members: number of members in the ensemble
+
+            :param dict perturbations=None: {name: spec}, see the
+                                            gnome.ensemble module docstring
+
+            :param int seed=1: random seed of the ensemble
+
+            :param int num_workers=None: number of processes.  None uses one
+                                         per CPU; 0 runs the members in this
+                                         process.
+
+            :param grid_shape=(100, 100): (num_x, num_y) of the grid beaching
+                                          probability is computed on.  None
+                                          to skip it.
+
+            :param grid_bounds=None: ((x_min, y_min), (x_max, y_max)) of that
+                                     grid.  Defaults to the bounds of the
+                                     model's map.
+        '''
+        self.model = model
+        self.num_members = num_members
+        self.perturbations = perturbations
+        self.seed = seed
+        self.num_workers = num_workers
+
+        self.members = sample_perturbations(perturbations, num_members, seed)
+
+        self.grid = None
+        if grid_shape is not None:
+            if grid_bounds is None:
+                bounds = np.asarray(model.map.map_bounds)
+                grid_bounds = (bounds.min(axis=0), bounds.max(axis=0))
+
+            (x_min, y_min), (x_max, y_max) = grid_bounds
+            self.grid = ((x_min, y_min), (x_max, y_max), tuple(grid_shape))
+
+    def iter_members(self):
+        '''
+            Run the members, and yield their summaries (see run_member()) as
+            they finish -- not necessarily in order.
+        '''
+        args = [(params, self.grid) for params in self.members]
+
+        if self.num_workers == 0:
+            for a in args:
+                yield run_member(self.model, *a)
+
+            return
+
+        pool = mp.Pool(self.num_workers,
+                       initializer=_init_worker,
+                       initargs=(self.model,))
+
+        try:
+            for summary in pool.imap_unordered(_run_member, args,
+                                               chunksize=1):
+                self.logger.info('ensemble member with seed {} done'
+                                 .format(summary['params']['seed']))
+                yield summary
+
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def run(self):
+        '''
+            Run all the members.
+
+            :returns: an EnsembleResult
+        '''
+        result = EnsembleResult(self.grid)
+
+        for summary in self.iter_members():
+            result.add(summary)
+
+        return result
@@ -0,0 +1,98 @@
+'''
+Values of the environment objects at the elements, shared in one time step
+
+The weatherers each look up the wind (and the waves, which look up the wind
+again) at the positions of the elements, in each weathering sub-step.  For
+gridded winds every at() call is expensive, and they are all for the same
+positions and times.
+
+An EnvironmentSampler is made by the model and given to the weatherers and
+environment objects.  The first lookup for an object, points and time is
+computed; the others get the same (read-only) arrays.  The model calls
+invalidate() when the positions of the elements change.
+
+Objects without a sampler (used outside of a model) look up their values
+as they always have.
+'''
+
+import numpy as np
+
+
+class EnvironmentSampler(object):
+    '''
+    Cache of environment values, keyed on the object, what was asked of it,
+    the time, and the points.
+    '''
+    def __init__(self):
+        self._entries = {}
+
+    def __len__(self):
+        return sum(len(e) for e in self._entries.values())
+
+    def invalidate(self):
+        '''
+        Forget all the values -- call this when the positions change.
+        '''
+        self._entries = {}
+
+    def get(self, obj, name, points, time, compute):
+        '''
+        The values compute() returns for obj, name at points and time --
+        computed the first time they are asked for.
+
+        :param obj: the object the values are from
+        :param name: what is asked of obj -- anything hashable
+        :param points: Nx3 array of the positions the values are at
+        :param time: time of the values
+        :param compute: function that computes the values. It should return
+                        an array or a tuple of arrays.
+
+        Weatherers get the points from a view of the data arrays, which is a
+        new array for each of them, so the points are compared by value.
+
+        The values are read-only -- copy them to change them.
+        '''
+        points = np.asarray(points)
+        key = (id(obj), name, time, points.shape)
+
+        entries = self._entries.setdefault(key, [])
+        for _obj, cached_points, values in entries:
+            if np.array_equal(cached_points, points):
+                return values
+
+        values = self._read_only(compute())
+
+        # keep obj too, so its id is not reused while it's cached
+        entries.append((obj, points.copy(), values))
+
+        return values
+
+    def at(self, env, points, time, coord_sys='r', fill_value=None):
+        '''
+        env.at(points, time, coord_sys=coord_sys), cached
+
+        :param fill_value=None: if not None, masked values are filled with
+                                this, and a plain array returned
+        '''
+        def compute():
+            values = env.at(points, time, coord_sys=coord_sys)
+
+            if fill_value is not None and isinstance(values,
+                                                     np.ma.MaskedArray):
+                values = values.filled(fill_value)
+
+            return values
+
+        return self.get(env, ('at', coord_sys, fill_value),
+                        points, time, compute)
+
+    @classmethod
+    def _read_only(cls, values):
+        if isinstance(values, tuple):
+            return tuple(cls._read_only(v) for v in values)
+
+        # a view, so whatever computed the values can still change them
+        values = np.asanyarray(values).view()
+        values.flags.writeable = False
+
+        return values
@@ -200,8 +200,8 @@ class Water(Environment):
                 unit = self._si_units[attr]
 
         if unit in self._units_type[attr][1]:
-            return uc.convert(self._units_type[attr][0], self.units[attr], unit,
-                              val)
+            return self._convert(self._units_type[attr][0], self.units[attr],
+                                 unit, val)
         else:
             # log to file if we have logger
             ex = uc.InvalidUnitError((unit, self._units_type[attr][0]))
@@ -220,6 +220,21 @@ class Water(Environment):
         setattr(self, attr, value)
         self.units[attr] = unit
 
+    # the weatherers get the same few values in the same units many times
+    # each step, so cache the conversions
+    @staticmethod
+    @lru_cache(32)
+    def _cached_convert(unit_type, from_unit, to_unit, val):
+        return uc.convert(unit_type, from_unit, to_unit, val)
+
+    @classmethod
+    def _convert(cls, unit_type, from_unit, to_unit, val):
+        try:
+            return cls._cached_convert(unit_type, from_unit, to_unit, val)
+        except TypeError:
+            # not hashable -- an array, say
+            return uc.convert(unit_type, from_unit, to_unit, val)
+
     # has to be a staticmethod, as the type is not hashable foe lru_cache
     @staticmethod
     @lru_cache(2)
@@ -61,6 +61,9 @@ class Waves(Environment):
     _req_refs = ['wind', 'water']
     _schema = WavesSchema
 
+    # EnvironmentSampler shared with the weatherers -- set by the model
+    _sampler = None
+
     def __init__(self, wind=None, water=None, **kwargs):
         """
         wind and water must be set before running the model; however, these
@@ -130,7 +133,17 @@ class Waves(Environment):
           peak_period: seconds
           whitecap_fraction: unit-less fraction
           dissipation_energy: not sure!! # fixme!
+
+        If the waves have a sampler, the values are shared with the
+        weatherers, and are read-only.
         """
+        if self._sampler is not None:
+            return self._sampler.get(self, 'get_value', points, time,
+                                     lambda: self._get_value(points, time))
+
+        return self._get_value(points, time)
+
+    def _get_value(self, points, time):
         # make sure are we are up to date with water object
         wave_height = self.water.get('wave_height')
 
@@ -158,6 +171,11 @@ class Waves(Environment):
         '''
         Wrapper for the weatherers so they can extrapolate
         '''
+        if self._sampler is not None:
+            return self._sampler.at(self.wind, points, model_time,
+                                    coord_sys=coord_sys,
+                                    fill_value=fill_value)
+
         retval = self.wind.at(points, model_time, coord_sys=coord_sys)
 
         if isinstance(retval, np.ma.MaskedArray):
@@ -18,4 +18,4 @@ from .map import (GnomeMap,
                   ParamMapSchema,
                   MapFromUGridSchema,
                   )
-
+from .vector_map import VectorMap, VectorMapSchema
@@ -24,7 +24,7 @@ Features:
 """
 
 import os
-import math
+import hashlib
 
 import py_gd
 
@@ -38,6 +38,7 @@ import unit_conversion as uc
 
 from gnome import _valid_units
 from gnome.basic_types import oil_status, world_point_type
+from gnome.array_types import gat
 
 from gnome.utilities.projections import (FlatEarthProjection,
                                          RectangularGridProjection,
@@ -53,6 +54,7 @@ from gnome.utilities.geometry import points_in_poly, point_in_poly
 from gnome.utilities.appearance import AppearanceSchema
 
 from gnome.cy_gnome.cy_land_check import check_land_layers, move_particles
+from gnome.maps.raster_cache import RasterCache
 from gnome.persist import base_schema
 
 
@@ -82,6 +84,7 @@ class MapFromBNASchema(RasterMapSchema):
     refloat_halflife = SchemaNode(Float())
     raster_size = SchemaNode(Float())
     shift_lons = SchemaNode(Integer(), missing=drop)
+    persist_layers = SchemaNode(Boolean(), missing=drop)
     approximate_raster_interval = SchemaNode(Float(), save=False, update=False, read_only=True)
 
 
@@ -90,6 +93,7 @@ class MapFromUGridSchema(RasterMapSchema):
         String(), read_only=True, isdatafile=True, test_equal=False
     )
     refloat_halflife = SchemaNode(Float())
+    persist_layers = SchemaNode(Boolean(), missing=drop)
 
 
 class GnomeMap(GnomeId):
@@ -334,6 +338,10 @@ class GnomeMap(GnomeId):
         if len(next_positions) != 0 and np.all(off_map):
             self.logger.warning("All particles left the map this timestep.")
 
+        # elements already marked to_be_removed were counted as off_maps
+        # when they left -- removal may be deferred by the SpillContainer
+        off_map &= status_codes != oil_status.to_be_removed
+
         # let model decide if we want to remove elements marked as off-map
         status_codes[off_map] = oil_status.off_maps
 
@@ -562,6 +570,10 @@ class ParamMap(GnomeMap):
         status_codes = spill['status_codes']
         off_map = np.logical_not(self.on_map(next_positions))
 
+        # elements already marked to_be_removed were counted as off_maps
+        # when they left -- removal may be deferred by the SpillContainer
+        off_map &= status_codes != oil_status.to_be_removed
+
         # let model decide if we want to remove elements marked as off-map
         status_codes[off_map] = oil_status.off_maps
 
@@ -669,6 +681,47 @@ class ParamMap(GnomeMap):
         return stuff
 
 
+def reduce_raster(raster, factor):
+    """
+    Block-reduce a raster: each cell of the result is 1 if any cell of the
+    corresponding factor x factor block of the raster is non-zero.
+
+    The raster is padded with water if its size is not a multiple of factor,
+    so the result is ceil(w / factor) x ceil(h / factor)
+
+    :param raster: (w, h) numpy array
+    :param factor: integer block size
+
+    :returns: (ceil(w / factor), ceil(h / factor)) uint8 array
+    """
+    w, h = raster.shape
+    coarse_w = -(-w // factor)
+    coarse_h = -(-h // factor)
+
+    if (coarse_w * factor, coarse_h * factor) != (w, h):
+        padded = np.zeros((coarse_w * factor, coarse_h * factor),
+                          dtype=raster.dtype)
+        padded[:w, :h] = raster
+        raster = padded
+
+    # reduce one axis at a time -- it's faster than both at once
+    blocks = raster.reshape(coarse_w, factor, coarse_h * factor).any(axis=1)
+    blocks = blocks.reshape(coarse_w, coarse_h, factor).any(axis=2)
+
+    return blocks.view(np.uint8)
+
+
+def _raster_key(raster, ratios):
+    """
+    A key that identifies a raster and the ratios of its coarser layers
+    """
+    hasher = hashlib.sha1(np.ascontiguousarray(raster).view(np.uint8))
+    hasher.update(str((raster.shape, raster.dtype.str,
+                       [int(r) for r in ratios])).encode())
+
+    return hasher.hexdigest()
+
+
 class RasterMap(GnomeMap):
     """
     A land water map implemented as a raster
@@ -698,6 +751,9 @@ class RasterMap(GnomeMap):
                  raster=None,
                  projection=None,
                  refloat_halflife=1,
+                 layers_file=None,
+                 layers=None,
+                 num_threads=1,
                  **kwargs):
         """
         create a new RasterMap
@@ -728,6 +784,24 @@ class RasterMap(GnomeMap):
         :param spillable_area: The polygon bounding the spillable_area
         :type spillable_area: (N,2) numpy array of floats
 
+        :param layers_file=None: file to save the coarser rasters in, and
+                                 load them from if they are there and match
+                                 the raster.  None means they are always
+                                 built.
+        :type layers_file: string (path)
+
+        :param layers=None: the coarser rasters, if they have already been
+                            built for this raster (see
+                            build_coarser_rasters()).  They are built if
+                            None.
+        :type layers: list of numpy arrays, the last one being the raster
+
+        :param num_threads=1: number of threads to use for the land check.
+                              The elements are split between the threads,
+                              which run without the GIL -- worth it for
+                              large numbers of elements.
+        :type num_threads: integer
+
         :param id: unique ID of the object. Using UUID as a string.
                    This is only used when loading object from save file.
 
@@ -735,11 +809,18 @@ class RasterMap(GnomeMap):
         """
         super(RasterMap, self).__init__(**kwargs)
         self._refloat_halflife = refloat_halflife * self.seconds_in_hour
+        self.layers_file = layers_file
+        self.num_threads = num_threads
+        self._near_land = None
+
+        # pixel coords of the elements, so they are only projected when
+        # they move
+        self.array_types.update({'pixel_positions': gat('pixel_positions')})
 
         if raster is None:
             self.raster = np.zeros((1024, 1024))
         else:
-            self.raster = np.ascontiguousarray(raster)
+            self._set_raster(raster, layers)
 
         self.projection = projection
 
@@ -766,37 +847,83 @@ class RasterMap(GnomeMap):
         In the end, if the scale decreases to 1:1 and there's still a land hit,
         then land was hit.
         """
+        if self.layers_file is not None and self.load_layers(self.layers_file):
+            return
+
         self.logger.info('generating coarser rasters')
-        self.layers = []
-        base_w = self.raster.shape[0]
-        base_h = self.raster.shape[1]
+        layers = {1: self.raster}
 
-        for ratio in self.ratios[:-1]:
-            genned_layer = np.zeros((int(math.ceil(float(base_w) / ratio)),
-                                     int(math.ceil(float(base_h) / ratio))),
-                                    dtype=np.uint8, order='C')
+        # build each layer from the finest one it can be reduced from,
+        # rather than from the full raster every time
+        for ratio in sorted(self.ratios[:-1]):
+            finer = max(r for r in layers if ratio % r == 0)
+            layers[ratio] = reduce_raster(layers[finer], ratio // finer)
 
-            for j in range(0, genned_layer.shape[1]):
-                for i in range(0, genned_layer.shape[0]):
-                    genned_layer[i, j] = np.any(self.raster[
-                                                i * ratio:(i + 1) * ratio,
-                                                j * ratio:(j + 1) * ratio
-                                                ])
+        self.layers = [layers[ratio] for ratio in self.ratios[:-1]]
+        self.layers.append(self.raster)
 
-            self.layers.append(genned_layer)
+        if self.layers_file is not None:
+            self.save_layers(self.layers_file)
 
-        self.layers.append(self.raster)
-        # self.layers = np.array(self.layers)
-        # print("the layers array:", self.layers)
+    def save_layers(self, filename):
+        """
+        Save the coarser rasters, so they can be loaded with load_layers()
+        rather than built again.
+
+        Failing to write the file is not an error -- it's only a cache.
+        """
+        arrays = {'layer_{}'.format(i): layer
+                  for i, layer in enumerate(self.layers[:-1])}
+
+        try:
+            with open(filename, 'wb') as outfile:
+                np.savez(outfile,
+                         key=_raster_key(self.raster, self.ratios),
+                         ratios=self.ratios,
+                         **arrays)
+        except OSError as err:
+            self.logger.warning('could not save the coarser rasters to {}: '
+                                '{}'.format(filename, err))
+
+    def load_layers(self, filename):
+        """
+        Load the coarser rasters saved by save_layers()
+
+        The file is only used if it was saved for this raster and these
+        ratios.
+
+        :returns: True if the layers were loaded, False otherwise.
+        """
+        try:
+            with np.load(filename) as saved:
+                if (str(saved['key']) !=
+                        _raster_key(self.raster, self.ratios)):
+                    return False
+
+                layers = [saved['layer_{}'.format(i)]
+                          for i in range(len(self.ratios) - 1)]
+        except (OSError, KeyError, ValueError):
+            return False
+
+        self.logger.info('loaded coarser rasters from {}'.format(filename))
+        self.layers = layers + [self.raster]
+
+        return True
 
     @property
     def ratios(self):
         if self._ratios is None:
-            self._ratios = (16, 1)
+            self._ratios = np.array((16, 1), dtype=np.int32)
         return self._ratios
 
     @ratios.setter
     def ratios(self, r):
+        r = np.array(r, dtype=np.int32)
+
+        if r[-1] != 1 or np.any(r[:-1] <= r[1:]):
+            raise ValueError('ratios must be decreasing, and end with 1: {}'
+                             .format(r))
+
         self._ratios = r
         self.build_coarser_rasters()
 
@@ -806,6 +933,9 @@ class RasterMap(GnomeMap):
 
     @raster.setter
     def raster(self, arr):
+        self._set_raster(arr)
+
+    def _set_raster(self, arr, layers=None):
         if arr.size > 16000000:
             self._ratios = np.array((128, 32, 1,), dtype=np.int32)
         elif arr.size > 1000000:
@@ -813,8 +943,17 @@ class RasterMap(GnomeMap):
         else:
             self._ratios = np.array((16, 1,), dtype=np.int32)
 
-        self._raster = np.ascontiguousarray(arr)
-        self.build_coarser_rasters()
+        # ascontiguousarray would turn a memory-mapped raster (from the
+        # raster cache) into a plain ndarray
+        if arr.flags.c_contiguous:
+            self._raster = arr
+        else:
+            self._raster = np.ascontiguousarray(arr)
+
+        if layers is not None and len(layers) == len(self._ratios):
+            self.layers = list(layers[:-1]) + [self._raster]
+        else:
+            self.build_coarser_rasters()
 
     @property
     def refloat_halflife(self):
@@ -944,6 +1083,12 @@ class RasterMap(GnomeMap):
         This version uses a modified Bresenham algorithm to find out
         which pixels the LE may have crossed.
 
+        Only the elements that are not already on land are checked, and of
+        those, elements that stay well clear of land on the coarsest raster
+        are not walked at all.  If the spill container has a
+        'pixel_positions' array, the pixel coords are kept there between
+        steps, so only elements that have moved are projected.
+
         :param sc: the current spill container
         :type sc:  :class:`gnome.spill_container.SpillContainer`
             It must have the following data arrays:
@@ -953,35 +1098,57 @@ class RasterMap(GnomeMap):
         self.resurface_airborne_elements(sc)
 
         # pull the data from the sc
-        # Is the last water point the same as the previous position? why not??
-        # If beached, it won't move, if not, then we can use it?
-
         start_pos = sc['positions']
         next_pos = sc['next_positions']
         status_codes = sc['status_codes']
         last_water_positions = sc['last_water_positions']
 
-        # transform to pixel coords:
-        # NOTE: must be integers!
-
-        start_pos_pixel = self.projection.to_pixel(start_pos, asint=True)
-        next_pos_pixel = self.projection.to_pixel(next_pos, asint=True)
-        last_water_pos_pixel = self.projection.to_pixel(last_water_positions,
-                                                        asint=True)
-
-        # call the actual hit code:
-        # the status_code and last_water_point arrays are altered in-place
-        # only check the ones that aren't already beached?
-        self._check_land_layers(self.layers, self.ratios,
-                                start_pos_pixel, next_pos_pixel,
-                                status_codes, last_water_pos_pixel)
-
-        # transform the points back to lat-long.
-        beached = status_codes == oil_status.on_land
-        next_pos[beached, :2] = \
-            self.projection.to_lonlat(next_pos_pixel[beached])
-        last_water_positions[beached, :2] = \
-            self.projection.to_lonlat(last_water_pos_pixel[beached, :2])
+        # elements already on land don't move
+        active = np.flatnonzero(status_codes != oil_status.on_land)
+
+        if len(active) > 0:
+            # transform to pixel coords:
+            # NOTE: must be integers!
+            start_pixel = self._pixel_positions(sc, active)
+
+            next_pixel = start_pixel.copy()
+            moved = np.any(next_pos[active, :2] != start_pos[active, :2],
+                           axis=1)
+            if moved.any():
+                next_pixel[moved] = self.projection.to_pixel(
+                    next_pos[active[moved]], asint=True)
+
+            # call the actual hit code on the ones that could hit land:
+            # the status_code and last_water_point arrays are altered
+            # in-place
+            check = ~self._far_from_land(start_pixel, next_pixel)
+            checked = active[check]
+
+            if len(checked) > 0:
+                end_pixel = next_pixel[check]
+                checked_status = status_codes[checked]
+                last_water_pixel = np.zeros_like(end_pixel)
+
+                self._check_land_layers(self.layers, self.ratios,
+                                        start_pixel[check], end_pixel,
+                                        checked_status, last_water_pixel)
+
+                status_codes[checked] = checked_status
+
+                # transform the points back to lat-long.
+                hit = checked_status == oil_status.on_land
+                beached = checked[hit]
+                next_pos[beached, :2] = \
+                    self.projection.to_lonlat(end_pixel[hit])
+                last_water_positions[beached, :2] = \
+                    self.projection.to_lonlat(last_water_pixel[hit])
+
+                # the beached ones end up on the land pixel
+                next_pixel[check] = end_pixel
+
+            if 'pixel_positions' in sc:
+                # where the elements will be next step
+                sc['pixel_positions'][active] = next_pixel
 
         self._set_off_map_status(sc)
 
@@ -993,6 +1160,68 @@ class RasterMap(GnomeMap):
         sc.mass_balance['off_maps'] += \
             sc['mass'][sc['status_codes'] == oil_status.off_maps].sum()
 
+    def _pixel_positions(self, sc, idx):
+        """
+        pixel coords of the positions of elements idx -- from the
+        'pixel_positions' array if it is there and set, projected if not.
+        """
+        if 'pixel_positions' not in sc:
+            return self.projection.to_pixel(sc['positions'][idx], asint=True)
+
+        pixels = sc['pixel_positions'][idx]
+        unset = pixels[:, 0] == np.iinfo(np.int32).min
+        if unset.any():
+            pixels[unset] = self.projection.to_pixel(
+                sc['positions'][idx[unset]], asint=True)
+
+        return pixels
+
+    def _far_from_land(self, start_pixel, end_pixel):
+        """
+        True for the moves that can't hit land: the ones that start in a cell
+        of the coarsest raster with no land in or next to it, and end in or
+        next to that cell.
+
+        :param start_pixel, end_pixel: Nx2 arrays of pixel coords
+        """
+        near = self._coarse_near_land()
+        ratio = self.ratios[0]
+
+        start_cell = start_pixel // ratio
+        end_cell = end_pixel // ratio
+
+        # near_land is padded by one cell. Cells further off the raster are
+        # clipped to the edge, which only makes the test more conservative.
+        i = np.clip(start_cell[:, 0] + 1, 0, near.shape[0] - 1)
+        j = np.clip(start_cell[:, 1] + 1, 0, near.shape[1] - 1)
+
+        return (~near[i, j] &
+                np.all(np.abs(end_cell - start_cell) <= 1, axis=1))
+
+    def _coarse_near_land(self):
+        """
+        Boolean array: land in or next to each cell of the coarsest raster.
+
+        It is padded by a cell all round, so cell (i, j) of the raster is
+        at (i + 1, j + 1).  Computed the first time it is needed for each
+        set of layers.
+        """
+        coarse = self.layers[0]
+
+        if self._near_land is None or self._near_land[0] is not coarse:
+            w, h = coarse.shape
+            padded = np.zeros((w + 4, h + 4), dtype=bool)
+            padded[2:-2, 2:-2] = coarse
+
+            near = np.zeros((w + 2, h + 2), dtype=bool)
+            for di in range(3):
+                for dj in range(3):
+                    near |= padded[di:di + w + 2, dj:dj + h + 2]
+
+            self._near_land = (coarse, near)
+
+        return self._near_land[1]
+
     def refloat_elements(self, spill_container, time_step, model_time=None):
         """
         This method performs the re-float logic -- changing the element
@@ -1033,20 +1262,25 @@ class RasterMap(GnomeMap):
                 spill_container['last_water_positions'][r_idx]
             spill_container['status_codes'][r_idx] = oil_status.in_water
 
+            if 'pixel_positions' in spill_container:
+                spill_container['pixel_positions'][r_idx] = \
+                    np.iinfo(np.int32).min
+
     def _check_land_layers(self, raster_map_layers, ratios,
                            positions, end_positions,
                            status_codes, last_water_positions):
         """
         Do the actual land-checking.
         This method simply calls a Cython version:
-            gnome.cy_gnome.cy_land_check.check_land()
+            gnome.cy_gnome.cy_land_check.check_land_layers()
 
         The arguments 'status_codes', 'positions' and 'last_water_positions'
         are altered in place.
         """
         check_land_layers(raster_map_layers, ratios,
                           positions, end_positions,
-                          status_codes, last_water_positions)
+                          status_codes, last_water_positions,
+                          num_threads=self.num_threads)
 
     def allowable_spill_position(self, coord):
         """
@@ -1091,6 +1325,67 @@ def ShiftLon180(points):
         pass
     return points
 
+def sort_map_polygons(polygons,
+                      map_bounds=None,
+                      spillable_area=None,
+                      logger=None):
+    """
+    Sort the polygons read from a map file (a BNA) into the land polygons
+    (and lakes), the map bounds and the spillable area.
+
+    :param polygons: the PolygonSet read from the file
+
+    :param map_bounds=None: map bounds that were passed in. If None, the
+                            ones in the file are used, or if there are none,
+                            the bounding box of the land and spillable area.
+
+    :param spillable_area=None: spillable area that was passed in. If None,
+                                the one in the file is used, if any.
+
+    :returns: (land_polys, map_bounds, spillable_area)
+    """
+    land_polys = PolygonSet()  # and lakes....
+    spillable_area_bna = PolygonSet()
+
+    for p in polygons:
+        if p.metadata[1].lower().replace(' ', '') == 'spillablearea':
+            spillable_area_bna.append(p)
+
+        elif p.metadata[1].lower().replace(' ', '') == 'mapbounds':
+            if map_bounds is not None:
+                warnings.warn('Provided map bounds superscede map bounds found in file. Please double check.')
+            else:
+                map_bounds = p
+        else:
+            #  Fixme: we could do something with the polylines....
+            if len(p) > 2:
+                land_polys.append(p)
+            elif logger is not None:
+                logger.debug("invalid polygon ignored:"
+                             "{} points: {}, ".format(len(p), p.metadata))
+
+    BB = land_polys.bounding_box
+
+    if not spillable_area:  # not passed in
+        # use the one in the bna
+        if len(spillable_area_bna) == 0:
+            # no spillable_area in the file
+            spillable_area = None
+        else:
+            spillable_area = spillable_area_bna
+
+    # fixme: map bounds might not be a rectangle -- is this doing the right thing?
+    if map_bounds is None:
+        if spillable_area:  # add the spillable area to the bounds
+            saBB = spillable_area.bounding_box
+            saBB.Merge(BB)
+            map_bounds = saBB.AsPoly()
+        else:
+            map_bounds = BB.AsPoly()
+
+    return land_polys, map_bounds, spillable_area
+
+
 class MapFromBNA(RasterMap):
     """
     A raster land-water map, created from file with polygons in it.
@@ -1105,6 +1400,8 @@ class MapFromBNA(RasterMap):
                  map_bounds=None,
                  spillable_area=None,
                  shift_lons=0,
+                 persist_layers=False,
+                 raster_cache_dir=None,
                  **kwargs):
         """
         Creates a RasterMap from a data file.
@@ -1124,6 +1421,17 @@ class MapFromBNA(RasterMap):
                           180, or 360 are valid inputs
         :type shiftLons: integer
 
+        :param persist_layers=False: if True, save the coarser rasters in a
+                                     file next to the data file, and load
+                                     them from there the next time the map
+                                     is created.
+        :type persist_layers: bool
+
+        :param raster_cache_dir=None: directory of the raster cache
+                                      (see gnome.maps.raster_cache).  If
+                                      None, the default one is used, if set.
+        :type raster_cache_dir: string (path)
+
         Optional arguments (kwargs):
 
         :param refloat_halflife: the half-life (in hours) for the re-floating.
@@ -1140,9 +1448,32 @@ class MapFromBNA(RasterMap):
         self.filename = filename
         self._raster_size = raster_size
         self.shift_lons = shift_lons
+        self.persist_layers = persist_layers
 
-        # fixme: do some file type checking here.
-        polygons = haz_files.ReadBNA(filename, 'PolygonSet')
+        if persist_layers:
+            kwargs['layers_file'] = filename + '.layers.npz'
+
+        raster_cache = RasterCache.from_dir(raster_cache_dir)
+        cached = None
+
+        if raster_cache is not None:
+            cache_key = raster_cache.key(filename,
+                                         raster_size=raster_size,
+                                         shift_lons=shift_lons)
+            cached = raster_cache.load(cache_key)
+
+        if cached is None:
+            # fixme: do some file type checking here.
+            polygons = haz_files.ReadBNA(filename, 'PolygonSet')
+
+            #add if based on input param
+            if shift_lons == 360:
+                polygons.TransformData(ShiftLon360)
+            elif shift_lons == 180:
+                polygons.TransformData(ShiftLon180)
+        else:
+            # already shifted
+            polygons = cached['polygons']
 
         if kwargs.get('name', False):
             self.name = os.path.split(filename)[1]
@@ -1152,56 +1483,25 @@ class MapFromBNA(RasterMap):
         #  fixme -- adding a "pop" method to PolygonSet might be better
         #      or a gnome_map_data object...
 
-        land_polys = PolygonSet()  # and lakes....
-        spillable_area_bna = PolygonSet()
-
-        #add if based on input param
-        if shift_lons == 360:
-            polygons.TransformData(ShiftLon360)
-        elif shift_lons == 180:
-            polygons.TransformData(ShiftLon180)
-
-        for p in polygons:
-            if p.metadata[1].lower().replace(' ', '') == 'spillablearea':
-                spillable_area_bna.append(p)
-
-            elif p.metadata[1].lower().replace(' ', '') == 'mapbounds':
-                if map_bounds is not None:
-                    warnings.warn('Provided map bounds superscede map bounds found in file. Please double check.')
-                else:
-                    map_bounds = p
-            else:
-                #  Fixme: we could do something with the polylines....
-                if len(p) > 2:
-                    land_polys.append(p)
-                else:
-                    self.logger.debug("invalid polygon ignored:"
-                                      "{} points: {}, ".format(len(p), p.metadata))
-
+        (land_polys,
+         map_bounds,
+         spillable_area) = sort_map_polygons(polygons,
+                                             map_bounds,
+                                             spillable_area,
+                                             logger=self.logger)
 
         # Draw the raster map with a map_canvas:
         # determine the size:
         BB = land_polys.bounding_box
 
-        if not spillable_area:  # not passed in
-            # use the one in the bna
-            if len(spillable_area_bna) == 0:
-                # no spillable_area in the file
-                spillable_area = None
-            else:
-                spillable_area = spillable_area_bna
-
-        # fixme: map bounds might not be a rectangle -- is this doing the right thing?
-        if map_bounds is None:
-            if spillable_area:  # add the spillable area to the bounds
-                saBB = spillable_area.bounding_box
-                saBB.Merge(BB)
-                map_bounds = saBB.AsPoly()
-            else:
-                map_bounds = BB.AsPoly()
-
         # get the raster as a numpy array:
-        raster, projection = self.build_raster(land_polys, BB)
+        if cached is None:
+            raster, projection = self.build_raster(land_polys, BB)
+            layers = None
+        else:
+            raster = cached['raster']
+            projection = cached['projection']
+            layers = cached['layers']
 
         super(MapFromBNA, self).__init__(
             raster=raster,
@@ -1209,7 +1509,13 @@ class MapFromBNA(RasterMap):
             map_bounds=map_bounds,
             spillable_area=spillable_area,
             land_polys=land_polys,
+            layers=layers,
             **kwargs)
+
+        if raster_cache is not None and cached is None:
+            raster_cache.save(cache_key, self.raster, self.projection,
+                              self.layers, self.ratios, polygons)
+
         return None
 
 
@@ -1340,7 +1646,8 @@ class MapFromUGrid(RasterMap):
     """
     _schema = MapFromUGridSchema
 
-    def __init__(self, filename, raster_size=1024 * 1024, **kwargs):
+    def __init__(self, filename, raster_size=1024 * 1024,
+                 persist_layers=False, raster_cache_dir=None, **kwargs):
         """
         Creates a GnomeMap (specifically a RasterMap) from a netcdf
         data file with a triangular mesh grid in it.
@@ -1358,6 +1665,17 @@ class MapFromUGrid(RasterMap):
                             aspect ratio of the bounding box of the land
         :type raster_size: integer
 
+        :param persist_layers=False: if True, save the coarser rasters in a
+                                     file next to the data file, and load
+                                     them from there the next time the map
+                                     is created.
+        :type persist_layers: bool
+
+        :param raster_cache_dir=None: directory of the raster cache
+                                      (see gnome.maps.raster_cache).  If
+                                      None, the default one is used, if set.
+        :type raster_cache_dir: string (path)
+
         Optional arguments (kwargs):
 
         :param map_bounds: The polygon bounding the map -- could be larger or
@@ -1370,10 +1688,25 @@ class MapFromUGrid(RasterMap):
         :type id: string
         """
         self.filename = filename
+        self.persist_layers = persist_layers
+
+        if persist_layers:
+            kwargs['layers_file'] = filename + '.layers.npz'
+
+        raster_cache = RasterCache.from_dir(raster_cache_dir)
+        cached = None
 
-        grid = PyGrid.from_netCDF(filename)
+        if raster_cache is not None:
+            cache_key = raster_cache.key(filename, raster_size=raster_size)
+            cached = raster_cache.load(cache_key)
+
+        if cached is None:
+            grid = PyGrid.from_netCDF(filename)
+
+            polygons = haz_files.ReadBNA(filename, 'PolygonSet')
+        else:
+            polygons = cached['polygons']
 
-        polygons = haz_files.ReadBNA(filename, 'PolygonSet')
         map_bounds = None
         self.name = kwargs.pop('name', os.path.split(filename)[1])
 
@@ -1415,54 +1748,66 @@ class MapFromUGrid(RasterMap):
 
         map_bounds = kwargs.pop('map_bounds', map_bounds)
 
-        # stretch the bounding box, to get approximate aspect ratio in
-        # projected coords.
-        aspect_ratio = (np.cos(BB.Center[1] * np.pi / 180) * (BB.Width / BB.Height))
-
-        w = int(np.sqrt(raster_size * aspect_ratio))
-        h = raster_size // w
-
-        canvas = MapCanvas(image_size=(w, h),
-                           preset_colors=None,
-                           background_color='water',
-                           viewport=BB,
-                           )
-        # color doesn't matter here, only index
-        canvas.add_colors((('water', (0, 255, 255)),  # aqua
-                           ('land', (255, 204, 153)),  # brown
-                           ))
-        canvas.clear_background()
-
-        # draw the land to the background
-        for poly in land_polys:
-            # fixme -- this should be something like "land"
-            if poly.metadata[2] == '1':
-                canvas.draw_polygon(poly,
-                                    line_color='land',
-                                    fill_color='land',
-                                    line_width=1,
-                                    background=True)
-            # fixme -- this should be something like "lake"
-            elif poly.metadata[2] == '2':
-                # this is a lake, draw as water
-                canvas.draw_polygon(poly,
-                                    line_color='water',
-                                    fill_color='water',
-                                    line_width=1,
-                                    background=True)
-
-        # just for testing
-        # canvas.save_background("raster_map_test.png")
-
-        # get the raster as a numpy array:
-        raster_array = canvas.back_asarray()
+        if cached is None:
+            # stretch the bounding box, to get approximate aspect ratio in
+            # projected coords.
+            aspect_ratio = (np.cos(BB.Center[1] * np.pi / 180) * (BB.Width / BB.Height))
+
+            w = int(np.sqrt(raster_size * aspect_ratio))
+            h = raster_size // w
+
+            canvas = MapCanvas(image_size=(w, h),
+                               preset_colors=None,
+                               background_color='water',
+                               viewport=BB,
+                               )
+            # color doesn't matter here, only index
+            canvas.add_colors((('water', (0, 255, 255)),  # aqua
+                               ('land', (255, 204, 153)),  # brown
+                               ))
+            canvas.clear_background()
+
+            # draw the land to the background
+            for poly in land_polys:
+                # fixme -- this should be something like "land"
+                if poly.metadata[2] == '1':
+                    canvas.draw_polygon(poly,
+                                        line_color='land',
+                                        fill_color='land',
+                                        line_width=1,
+                                        background=True)
+                # fixme -- this should be something like "lake"
+                elif poly.metadata[2] == '2':
+                    # this is a lake, draw as water
+                    canvas.draw_polygon(poly,
+                                        line_color='water',
+                                        fill_color='water',
+                                        line_width=1,
+                                        background=True)
+
+            # just for testing
+            # canvas.save_background("raster_map_test.png")
+
+            # get the raster as a numpy array:
+            raster_array = canvas.back_asarray()
+            projection = canvas.projection
+            layers = None
+        else:
+            raster_array = cached['raster']
+            projection = cached['projection']
+            layers = cached['layers']
 
-        RasterMap.__init__(self, raster_array, canvas.projection,
+        RasterMap.__init__(self, raster_array, projection,
                            map_bounds=map_bounds,
                            spillable_area=spillable_area,
                            land_polys=land_polys,
+                           layers=layers,
                            ** kwargs)
 
+        if raster_cache is not None and cached is None:
+            raster_cache.save(cache_key, self.raster, self.projection,
+                              self.layers, self.ratios, polygons)
+
         return None
 
 
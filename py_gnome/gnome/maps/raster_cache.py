@@ -0,0 +1,201 @@
+"""
+On-disk cache of the land rasters built for maps
+
+Building a raster map from a shoreline file -- parsing the polygons, then
+drawing them into a large raster and building the coarser layers -- is the
+slowest part of setting up most models.  The same few shorelines are used
+over and over, so the result is cached on disk, keyed on the contents of
+the file and the parameters used to build the raster.
+
+Each entry is a directory of .npy files, so warm loads memory-map the arrays
+rather than reading (or building) them, and processes using the same map
+share the pages.
+
+The cache is off unless a cache directory is given to the map, or set here
+for the whole process:
+
+    import gnome.maps.raster_cache
+    gnome.maps.raster_cache.raster_cache_dir = '/var/cache/gnome_rasters'
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import logging
+
+import numpy as np
+
+from gnome.utilities.projections import FlatEarthProjection
+from gnome.utilities.geometry.polygons import PolygonSet
+
+
+# default for maps that are not given a cache directory.
+# None means no caching.
+raster_cache_dir = None
+
+# change this if what is stored changes, so old entries are not used
+_cache_version = 1
+
+logger = logging.getLogger(__name__)
+
+
+def file_hash(filename, blocksize=1 << 20):
+    '''
+    sha1 hex digest of the contents of a file
+    '''
+    hasher = hashlib.sha1()
+
+    with open(filename, 'rb') as infile:
+        for block in iter(lambda: infile.read(blocksize), b''):
+            hasher.update(block)
+
+    return hasher.hexdigest()
+
+
+class RasterCache(object):
+    '''
+    A directory of cached rasters, with their projection, coarser layers
+    and the polygons they were drawn from.
+    '''
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    @classmethod
+    def from_dir(cls, cache_dir=None):
+        '''
+        The cache in cache_dir, or in the default raster_cache_dir if None.
+
+        :returns: a RasterCache, or None if caching is off
+        '''
+        if cache_dir is None:
+            cache_dir = raster_cache_dir
+
+        if cache_dir is None:
+            return None
+
+        return cls(cache_dir)
+
+    def key(self, filename, **params):
+        '''
+        Key for the raster of a file, built with params.
+
+        All the parameters that change the raster (raster_size, shift_lons,
+        ...) need to be passed in.
+        '''
+        params = sorted((k, repr(v)) for k, v in params.items())
+        content = json.dumps([_cache_version, file_hash(filename), params])
+
+        return hashlib.sha1(content.encode()).hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def load(self, key):
+        '''
+        Load an entry.  The arrays are memory mapped copy-on-write -- they
+        can be changed, but the changes are not saved.
+
+        :returns: dict with 'raster', 'projection', 'layers', 'ratios' and
+                  'polygons', or None if it is not in the cache.
+        '''
+        entry_dir = self._entry_dir(key)
+
+        try:
+            with open(os.path.join(entry_dir, 'meta.json')) as infile:
+                meta = json.load(infile)
+
+            def load_array(name):
+                return np.load(os.path.join(entry_dir, name + '.npy'),
+                               mmap_mode='c')
+
+            raster = load_array('raster')
+            layers = [load_array('layer_{}'.format(i))
+                      for i in range(len(meta['ratios']) - 1)]
+
+            points = load_array('polygon_points')
+            index = load_array('polygon_index')
+        except (OSError, ValueError, KeyError) as err:
+            if os.path.isdir(entry_dir):
+                logger.warning('ignoring bad raster cache entry {}: {}'
+                               .format(entry_dir, err))
+            return None
+
+        polygons = PolygonSet()
+        for i, metadata in enumerate(meta['polygon_metadata']):
+            polygons.append(points[index[i]:index[i + 1]], tuple(metadata))
+
+        proj = meta['projection']
+        projection = FlatEarthProjection(proj['image_box'],
+                                         tuple(proj['image_size']))
+        # set exactly what the raster was drawn with
+        projection.center = np.array(proj['center'])
+        projection.offset = np.array(proj['offset'])
+        projection.scale = tuple(proj['scale'])
+        projection.image_box = tuple(tuple(p) for p in proj['image_box'])
+
+        logger.info('loaded raster from cache: {}'.format(entry_dir))
+
+        return {'raster': raster,
+                'projection': projection,
+                'layers': layers + [raster],
+                'ratios': np.array(meta['ratios'], dtype=np.int32),
+                'polygons': polygons}
+
+    def save(self, key, raster, projection, layers, ratios, polygons):
+        '''
+        Save an entry.  Entries are written to a temporary directory and
+        renamed into place, so processes building the same raster at the
+        same time do not see each other's partial entries.
+
+        Failing to write the entry is not an error -- it's only a cache.
+        '''
+        if type(projection) is not FlatEarthProjection:
+            logger.info('not caching raster with a {} projection'
+                        .format(type(projection).__name__))
+            return
+
+        entry_dir = self._entry_dir(key)
+        tmp_dir = '{}.tmp-{}'.format(entry_dir, os.getpid())
+
+        points, index = polygons.GetPointsData()
+
+        projection_params = {name: np.asarray(getattr(projection, name))
+                                   .tolist()
+                             for name in ('image_box', 'image_size',
+                                          'center', 'offset', 'scale')}
+
+        meta = {'version': _cache_version,
+                'ratios': [int(r) for r in ratios],
+                'projection': projection_params,
+                'polygon_metadata': [list(m)
+                                     for m in polygons.GetMetaData()]}
+
+        try:
+            os.makedirs(tmp_dir)
+
+            np.save(os.path.join(tmp_dir, 'raster.npy'), raster)
+            for i, layer in enumerate(layers[:-1]):
+                np.save(os.path.join(tmp_dir, 'layer_{}.npy'.format(i)),
+                        layer)
+
+            np.save(os.path.join(tmp_dir, 'polygon_points.npy'), points)
+            np.save(os.path.join(tmp_dir, 'polygon_index.npy'), index)
+
+            # written last: an entry with a meta.json is complete
+            with open(os.path.join(tmp_dir, 'meta.json'), 'w') as outfile:
+                json.dump(meta, outfile)
+
+            os.rename(tmp_dir, entry_dir)
+        except OSError as err:
+            if not os.path.isdir(entry_dir):
+                logger.warning('could not save raster to cache {}: {}'
+                               .format(entry_dir, err))
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def clear(self):
+        '''
+        Remove all the entries
+        '''
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
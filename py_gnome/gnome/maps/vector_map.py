@@ -0,0 +1,468 @@
+"""
+vector_map.py
+
+A land-water map that beaches elements on the shoreline polygons directly,
+rather than on a raster drawn from them.
+
+The accuracy of a RasterMap is set by the size of the raster: to resolve a
+harbour at a meter scale, the raster for the whole map gets very large.
+A VectorMap intersects the path of each element in a time step with the
+edges of the land polygons, so it is as accurate as the shoreline itself,
+and the memory it uses is proportional to the number of edges.
+
+The edges are kept in a uniform grid of buckets (SegmentIndex), so the cost
+of the check is proportional to the number of edges near the elements, not
+the total length of the shoreline.
+"""
+
+import os
+
+import numpy as np
+
+from colander import SchemaNode, String, Float, Integer, drop
+from geojson import FeatureCollection, Feature, MultiPolygon
+
+from gnome.basic_types import oil_status
+from gnome.utilities.file_tools import haz_files
+from gnome.utilities.geometry import points_in_poly
+
+from .map import (GnomeMap,
+                  GnomeMapSchema,
+                  ShiftLon180,
+                  ShiftLon360,
+                  sort_map_polygons)
+
+
+class VectorMapSchema(GnomeMapSchema):
+    filename = SchemaNode(
+        String(), isdatafile=True, test_equal=False, missing=drop)
+    refloat_halflife = SchemaNode(Float())
+    shift_lons = SchemaNode(Integer(), missing=drop)
+
+
+def polygon_edges(polygons):
+    '''
+    The edges of the land (and lake) polygons, as a Nx4 array of
+    (x0, y0, x1, y1)
+
+    Polygons with a type other than land ('1') or lake ('2') in their
+    metadata are not used. Ones without metadata are taken as land.
+    '''
+    edges = [np.zeros((0, 4))]
+
+    for poly in polygons:
+        if polygon_type(poly) not in ('1', '2'):
+            continue
+
+        pts = np.asarray(poly, dtype=np.float64)
+        edges.append(np.hstack((pts, np.roll(pts, -1, axis=0))))
+
+    return np.vstack(edges)
+
+
+def polygon_type(poly):
+    '''
+    '1' for land, '2' for a lake -- from the metadata of a polygon
+    read from a bna file. Land if there is no metadata.
+    '''
+    try:
+        return poly.metadata[2]
+    except (IndexError, KeyError, TypeError):
+        return '1'
+
+
+def segment_crossings(start, end, edges):
+    '''
+    Where the segments from start to end cross the edges.
+
+    :param start, end: Nx2 arrays of points
+    :param edges: Nx4 array of (x0, y0, x1, y1)
+
+    :returns: the fraction of the way from start to end of each crossing,
+              nan for the ones that don't cross.  Parallel segments are
+              never counted as crossing.
+    '''
+    r = end - start
+    s = edges[:, 2:] - edges[:, :2]
+    qp = edges[:, :2] - start
+
+    denom = r[:, 0] * s[:, 1] - r[:, 1] * s[:, 0]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = (qp[:, 0] * s[:, 1] - qp[:, 1] * s[:, 0]) / denom
+        u = (qp[:, 0] * r[:, 1] - qp[:, 1] * r[:, 0]) / denom
+
+    crosses = (denom != 0) & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+
+    return np.where(crosses, t, np.nan)
+
+
+class SegmentIndex(object):
+    '''
+    A uniform grid of buckets of line segments, for finding the segments
+    near a given box.
+
+    Each segment is in every bucket its bounding box overlaps.  The buckets
+    are stored as one array of segment numbers, sorted by bucket, and the
+    start of each bucket in it.
+    '''
+    def __init__(self, segments, cell_size=None):
+        '''
+        :param segments: Nx4 array of (x0, y0, x1, y1)
+
+        :param cell_size=None: size of the buckets.  Default is twice the
+                               mean length of the segments, or larger if
+                               that would make far more buckets than
+                               segments.
+        '''
+        self.segments = np.asarray(segments, dtype=np.float64).reshape(-1, 4)
+
+        if len(self.segments) == 0:
+            self.origin = (0.0, 0.0)
+            self.cell_size = 1.0
+            self.shape = (1, 1)
+            self._bucket_start = np.zeros(2, dtype=np.intp)
+            self._bucket_segments = np.zeros(0, dtype=np.intp)
+            return
+
+        bounds = self.bounds(self.segments[:, :2], self.segments[:, 2:])
+        x_min, y_min = bounds[:, :2].min(axis=0)
+        x_max, y_max = bounds[:, 2:].max(axis=0)
+        width = max(x_max - x_min, 1e-12)
+        height = max(y_max - y_min, 1e-12)
+
+        if cell_size is None:
+            lengths = np.hypot(self.segments[:, 2] - self.segments[:, 0],
+                               self.segments[:, 3] - self.segments[:, 1])
+            cell_size = 2 * lengths.mean()
+
+            # no more than about 4 buckets per segment
+            cell_size = max(cell_size,
+                            np.sqrt(width * height /
+                                    (4.0 * len(self.segments))))
+
+        self.origin = (x_min, y_min)
+        self.cell_size = cell_size
+        self.shape = (int(width // cell_size) + 1,
+                      int(height // cell_size) + 1)
+
+        seg, bucket = self._buckets(bounds)
+
+        order = np.argsort(bucket, kind='stable')
+        self._bucket_segments = seg[order]
+        self._bucket_start = np.searchsorted(
+            bucket[order], np.arange(self.shape[0] * self.shape[1] + 1))
+
+    @staticmethod
+    def bounds(start, end):
+        '''
+        bounding boxes of segments: Nx4 (x_min, y_min, x_max, y_max)
+        '''
+        return np.hstack((np.minimum(start, end), np.maximum(start, end)))
+
+    def _buckets(self, bounds):
+        '''
+        (i, bucket) for each bucket that each box in bounds overlaps.
+        Boxes that are off the grid are in no buckets.
+        '''
+        num_x, num_y = self.shape
+
+        cells = np.floor((bounds - np.tile(self.origin, 2)) /
+                         self.cell_size)
+        on_grid = ((cells[:, 2] >= 0) & (cells[:, 0] < num_x) &
+                   (cells[:, 3] >= 0) & (cells[:, 1] < num_y))
+
+        idx = np.flatnonzero(on_grid)
+        cells = cells[idx]
+
+        x0 = np.clip(cells[:, 0], 0, num_x - 1).astype(np.intp)
+        y0 = np.clip(cells[:, 1], 0, num_y - 1).astype(np.intp)
+        nx = np.clip(cells[:, 2], 0, num_x - 1).astype(np.intp) - x0 + 1
+        ny = np.clip(cells[:, 3], 0, num_y - 1).astype(np.intp) - y0 + 1
+
+        counts = nx * ny
+        item = np.repeat(idx, counts)
+
+        # position in the block of buckets of each box
+        pos = (np.arange(counts.sum()) -
+               np.repeat(np.cumsum(counts) - counts, counts))
+        nx = np.repeat(nx, counts)
+        ix = np.repeat(x0, counts) + pos % nx
+        iy = np.repeat(y0, counts) + pos // nx
+
+        return item, iy * num_x + ix
+
+    def candidates(self, bounds):
+        '''
+        The segments in the buckets that each box overlaps.
+
+        :param bounds: Nx4 array of (x_min, y_min, x_max, y_max)
+
+        :returns: (i, segment) arrays: box i may overlap the segment.
+                  A segment can come up more than once for the same box.
+        '''
+        item, bucket = self._buckets(bounds)
+
+        first = self._bucket_start[bucket]
+        counts = self._bucket_start[bucket + 1] - first
+
+        item = np.repeat(item, counts)
+        idx = (np.repeat(first - (np.cumsum(counts) - counts), counts) +
+               np.arange(counts.sum()))
+
+        return item, self._bucket_segments[idx]
+
+
+class VectorMap(GnomeMap):
+    """
+    A land-water map that beaches elements where their path crosses the
+    shoreline polygons.
+
+    Elements are beached exactly on the shoreline, and their last water
+    position is just off it, on the water side, along their path.
+
+    Lakes (polygons of type '2' in a bna file) are water. Elements are
+    assumed to start in water, as they do after re-floating.
+    """
+    _schema = VectorMapSchema
+
+    # distance (in degrees, about 1cm) back along the path from the shoreline
+    # that the last water position is put
+    water_offset = 1e-7
+
+    def __init__(self,
+                 filename=None,
+                 refloat_halflife=1,
+                 map_bounds=None,
+                 spillable_area=None,
+                 land_polys=None,
+                 shift_lons=0,
+                 bucket_size=None,
+                 **kwargs):
+        """
+        Create a VectorMap, from a bna file, or from land polygons
+
+        :param filename=None: full path to the bna file. Map bounds and
+                              the spillable area are read from it, if they
+                              are there.
+
+        :param refloat_halflife=1: the half-life (in hours) for the
+                                   re-floating.
+                                   0.0 means all refloat every time step
+                                   < 0.0 means never re-float.
+
+        :param map_bounds: The polygon bounding the map
+
+        :param spillable_area: The polygon bounding the spillable_area
+
+        :param land_polys: the land polygons, if not read from a file
+
+        :param shift_lons: shift longitudes to be in -180 to 180 coords or
+                           0 to 360. 180, or 360 are valid inputs
+        :type shift_lons: integer
+
+        :param bucket_size=None: size (in degrees) of the buckets the
+                                 shoreline is indexed with.  See
+                                 SegmentIndex for the default.
+        """
+        self.filename = filename
+        self.shift_lons = shift_lons
+
+        if filename is not None:
+            polygons = haz_files.ReadBNA(filename, 'PolygonSet')
+
+            if shift_lons == 360:
+                polygons.TransformData(ShiftLon360)
+            elif shift_lons == 180:
+                polygons.TransformData(ShiftLon180)
+
+            (land_polys,
+             map_bounds,
+             spillable_area) = sort_map_polygons(polygons,
+                                                 map_bounds,
+                                                 spillable_area,
+                                                 logger=self.logger)
+
+            if kwargs.get('name', False):
+                self.name = os.path.split(filename)[1]
+
+        super(VectorMap, self).__init__(map_bounds=map_bounds,
+                                        spillable_area=spillable_area,
+                                        land_polys=land_polys,
+                                        **kwargs)
+
+        self.refloat_halflife = refloat_halflife
+        self.index = SegmentIndex(polygon_edges(self.land_polys),
+                                  cell_size=bucket_size)
+
+    @property
+    def refloat_halflife(self):
+        return self._refloat_halflife / 3600.0
+
+    @refloat_halflife.setter
+    def refloat_halflife(self, value):
+        self._refloat_halflife = value * 3600.0
+
+    def on_land(self, coord):
+        """
+        :param coord: (long, lat, depth) location, or an Nx3 array of them
+
+        :return: True where the point is in land, and not in a lake
+
+        Land and lakes alternate, so a point is on land if it is in an odd
+        number of them.
+        """
+        coord = np.asarray(coord, dtype=np.float64)
+        pts = coord.reshape(-1, coord.shape[-1])
+
+        count = np.zeros(len(pts), dtype=np.int32)
+        for poly in self.land_polys:
+            if polygon_type(poly) in ('1', '2'):
+                count += points_in_poly(np.ascontiguousarray(poly,
+                                                             np.float64),
+                                        pts)
+
+        on_land = count % 2 == 1
+
+        return on_land if coord.ndim > 1 else bool(on_land[0])
+
+    def in_water(self, coord):
+        """
+        :param coord: (long, lat, depth) location, or an Nx3 array of them
+
+        :return: True if the point is on the map, and not on land
+        """
+        return self.on_map(coord) & np.logical_not(self.on_land(coord))
+
+    def allowable_spill_position(self, coord):
+        """
+        Returns true if the spill position is in the allowable spill area,
+        and not on land
+
+        :param coord: (lon, lat, depth) coordinate
+        """
+        if self.on_map(coord) and not self.on_land(coord):
+            return (super(VectorMap, self).allowable_spill_position(coord))
+        else:
+            return False
+
+    def first_crossings(self, start, end):
+        """
+        Where the paths from start to end first cross the shoreline
+
+        :param start, end: Nx2 arrays of (lon, lat)
+
+        :returns: the fraction of the way along each path of the first
+                  crossing, inf if it doesn't cross.
+        """
+        first = np.full(len(start), np.inf)
+
+        item, seg = self.index.candidates(self.index.bounds(start, end))
+
+        if len(item) > 0:
+            t = segment_crossings(start[item], end[item],
+                                  self.index.segments[seg])
+            crosses = ~np.isnan(t)
+            np.minimum.at(first, item[crosses], t[crosses])
+
+        return first
+
+    def beach_elements(self, sc, model_time=None):
+        """
+        Determines which elements were or weren't beached.
+
+        Any that are beached have the beached flag set, are put where they
+        cross the shoreline, and a "last known water position" (lkwp) is
+        computed
+
+        :param sc: the current spill container
+        :type sc:  :class:`gnome.spill_container.SpillContainer`
+        """
+        self.resurface_airborne_elements(sc)
+
+        start_pos = sc['positions']
+        next_pos = sc['next_positions']
+        status_codes = sc['status_codes']
+        last_water_positions = sc['last_water_positions']
+
+        # only the ones that are in the water and have moved
+        moving = np.flatnonzero((status_codes != oil_status.on_land) &
+                                np.any(next_pos[:, :2] != start_pos[:, :2],
+                                       axis=1))
+
+        if len(moving) > 0:
+            start = start_pos[moving, :2]
+            move = next_pos[moving, :2] - start
+
+            t = self.first_crossings(start, start + move)
+            hit = np.isfinite(t)
+
+            if hit.any():
+                beached = moving[hit]
+                start, move, t = start[hit], move[hit], t[hit]
+
+                # back off from the shoreline, but not past the start
+                length = np.hypot(move[:, 0], move[:, 1])
+                t_water = np.maximum(t - self.water_offset / length, 0.0)
+
+                next_pos[beached, :2] = start + t[:, None] * move
+                last_water_positions[beached, :2] = (start +
+                                                     t_water[:, None] * move)
+                last_water_positions[beached, 2] = next_pos[beached, 2]
+                status_codes[beached] = oil_status.on_land
+
+        self._set_off_map_status(sc)
+
+        sc.mass_balance['beached'] = \
+            sc['mass'][sc['status_codes'] == oil_status.on_land].sum()
+        sc.mass_balance['off_maps'] += \
+            sc['mass'][sc['status_codes'] == oil_status.off_maps].sum()
+
+    def refloat_elements(self, spill_container, time_step, model_time=None):
+        """
+        This method performs the re-float logic -- changing the element
+        status flag, and moving the element to the last known water position
+
+        :param spill_container: the current spill container
+        :type spill_container:  :class:`gnome.spill_container.SpillContainer`
+        """
+        r_idx = np.flatnonzero(spill_container['status_codes'] ==
+                               oil_status.on_land)
+
+        if r_idx.size == 0 or self._refloat_halflife < 0.0:
+            return
+
+        if self._refloat_halflife > 0.0:
+            # refloat particles based on probability
+            refloat_probability = 1.0 - 0.5 ** (float(time_step) /
+                                                self._refloat_halflife)
+            rnd = np.random.uniform(0, 1, len(r_idx))
+            r_idx = r_idx[rnd <= refloat_probability]
+
+        spill_container['positions'][r_idx] = \
+            spill_container['last_water_positions'][r_idx]
+        spill_container['status_codes'][r_idx] = oil_status.in_water
+
+    def to_geojson(self):
+        """
+        Output the shoreline polygons -- the same as MapFromBNA
+        """
+        coords = {'1': [], '2': []}
+
+        for poly in self.land_polys:
+            kind = polygon_type(poly)
+            if kind in coords:
+                pts = poly.points.tolist()
+                pts.append(pts[0])
+                coords[kind].append([pts])
+
+        features = []
+        if coords['1']:
+            features.append(Feature(id="1",
+                                    properties={'name': 'Shoreline Polys'},
+                                    geometry=MultiPolygon(coords['1'])))
+            features.append(Feature(id="2",
+                                    properties={'name': 'Lakes'},
+                                    geometry=MultiPolygon(coords['2'])))
+
+        return FeatureCollection(features)
@@ -49,6 +49,7 @@ from colander import (SchemaNode,
 from gnome.utilities.time_utils import round_time, asdatetime
 import gnome.utilities.rand
 from gnome.utilities.cache import ElementCache
+from gnome.utilities.surface_concentration import compute_surface_concentration
 from gnome.utilities.orderedcollection import OrderedCollection
 from gnome.spill_container import SpillContainerPair
 from gnome.basic_types import oil_status, fate
@@ -62,8 +63,10 @@ from gnome.maps.map import (GnomeMapSchema,
 from gnome.environment import Environment, Wind
 from gnome.array_types import gat
 from gnome.environment import schemas as env_schemas
+from gnome.environment.sampling import EnvironmentSampler
 
 from gnome.movers import Mover, mover_schemas
+from gnome.movers.transport import TransportStep
 from gnome.weatherers import (weatherer_sort,
                               Weatherer,
                               WeatheringData,
@@ -75,6 +78,7 @@ from gnome.weatherers import (weatherer_sort,
                               )
 from gnome.outputters import Outputter, NetCDFOutput, WeatheringOutput
 from gnome.outputters import schemas as out_schemas
+from gnome.outputters.executor import OutputExecutor, output_results
 from gnome.persist import (extend_colander,
                            validators,
                            References)
@@ -192,6 +196,11 @@ class Model(GnomeId):
                  map=None,
                  uncertain=False,
                  cache_enabled=False,
+                 cache_options=None,
+                 output_workers=0,
+                 output_queue_size=2,
+                 removal_interval=1,
+                 removal_fraction=None,
                  mode=None,
                  make_default_refs=True,
                  location=[],
@@ -229,6 +238,27 @@ class Model(GnomeId):
         :param cache_enabled=False: Flag for setting whether the model should
                                     cache results to disk.
 
+        :param cache_options=None: dict of options of the element cache:
+                                   num_writers, max_queue_size, file_format,
+                                   recent_steps, recent_bytes and
+                                   spill_to_disk. See
+                                   gnome.utilities.cache.ElementCache
+
+        :param output_workers=0: If more than 0, the outputters are run in
+                                 this many threads, while the model computes
+                                 the next step. See gnome.outputters.executor
+
+        :param output_queue_size=2: How many steps can be being written by
+                                    the output_workers before the model
+                                    waits for them.
+
+        :param removal_interval=1: The elements that left the map are
+                                   dropped every removal_interval steps.
+
+        :param removal_fraction=None: If given, they are dropped as soon as
+                                      they are this fraction of the elements.
+                                      See gnome.spill_container.SpillContainer
+
         :param mode='Gnome': The runtime 'mode' that the model should use.
                              This is a value that the Web Client uses to
                              decide which UI views it should present.
@@ -246,16 +276,28 @@ class Model(GnomeId):
         self.outputters.add(outputters)
 
         # contains both certain/uncertain spills
-        self.spills = SpillContainerPair(uncertain)
+        self.spills = SpillContainerPair(uncertain,
+                                         removal_interval=removal_interval,
+                                         removal_fraction=removal_fraction)
         if len(uncertain_spills) > 0:
             _spills = list(zip(spills, uncertain_spills))
         else:
             _spills = spills
         self.spills.add(_spills)
 
-        self._cache = ElementCache()
+        self._cache = None
+        self.cache_options = cache_options
         self._cache.enabled = cache_enabled
 
+        # environment values at the elements, shared by the weatherers
+        self._sampler = EnvironmentSampler()
+
+        # runs the outputters in other threads, if output_workers > 0
+        self.output_workers = output_workers
+        self.output_queue_size = output_queue_size
+        self._output_executor = None
+        self._output_schedules = {}
+
         # default to now, rounded to the nearest hour
         self.start_time = start_time
         self._duration = duration
@@ -377,6 +419,9 @@ class Model(GnomeId):
         # clear the cache:
         self._cache.rewind()
 
+        # the output of the run is not wanted any more
+        self._finish_output(raise_errors=False)
+
         for outputter in self.outputters:
             outputter.rewind()
 
@@ -491,6 +536,40 @@ class Model(GnomeId):
     def cache_enabled(self, enabled):
         self._cache.enabled = enabled
 
+    # the ElementCache options that can be set for a model
+    _cache_option_names = ('num_writers', 'max_queue_size', 'file_format',
+                           'recent_steps', 'recent_bytes', 'spill_to_disk')
+
+    @property
+    def cache_options(self):
+        '''
+        The options of the element cache -- see ElementCache. Setting them
+        rewinds the model.
+        '''
+        return dict(self._cache_options)
+
+    @cache_options.setter
+    def cache_options(self, options):
+        options = dict(options or {})
+
+        unknown = set(options).difference(self._cache_option_names)
+        if unknown:
+            raise TypeError('unknown cache options: {0}. Options are: {1}'
+                            .format(', '.join(sorted(unknown)),
+                                    ', '.join(self._cache_option_names)))
+
+        if self._cache is not None:
+            # the steps of the old cache are not needed any more
+            self.rewind()
+            options['enabled'] = self._cache.enabled
+
+        self._cache = ElementCache(**options)
+        options.pop('enabled', None)
+        self._cache_options = options
+
+        for outputter in self.outputters:
+            outputter.cache = self._cache
+
     @property
     def has_weathering_uncertainty(self):
         return (any([w.on for w in self.weatherers]) and
@@ -805,6 +884,9 @@ class Model(GnomeId):
                 if (hasattr(item, 'array_types')):
                     array_types.update(item.all_array_types)
 
+        # the map may keep data for each element too
+        array_types.update(self.map.all_array_types)
+
         #self.logger.debug(array_types)
 
         for sc in self.spills.items():
@@ -814,6 +896,9 @@ class Model(GnomeId):
         ref_dict = {}
         self._attach_default_refs(ref_dict)
 
+        # the weatherers (and the waves they use) share what they look up
+        self._share_sampler()
+
         '''Step 5 & 6: Call prepare_for_model_run and misc setup'''
         transport = False
         for mover in self.movers:
@@ -849,15 +934,41 @@ class Model(GnomeId):
 
         # outputters need array_types, so this needs to come after those
         # have been updated.
+        self._finish_output()
+
         for outputter in self.outputters:
             outputter.prepare_for_model_run(model_start_time=self.start_time,
                                             cache=self._cache,
                                             uncertain=self.uncertain,
                                             spills=self.spills,
                                             model_time_step=self.time_step)
+
+        if self.output_workers > 0:
+            self._output_executor = OutputExecutor(self.output_workers,
+                                                   self.output_queue_size)
+
+            # copies the model follows the outputters' schedules on, to know
+            # which ones write a step -- see _output_steps()
+            self._output_schedules = {id(o): copy.copy(o)
+                                      for o in self.outputters}
         self.logger.debug("{0._pid} setup_model_run complete for: "
                           "{0.name}".format(self))
 
+    def _share_sampler(self):
+        '''
+        Give the weatherers, and the environment objects they use, the
+        model's EnvironmentSampler
+        '''
+        self._sampler.invalidate()
+
+        for item in list(self.weatherers) + list(self.environment):
+            if hasattr(item, '_sampler'):
+                item._sampler = self._sampler
+
+            waves = getattr(item, 'waves', None)
+            if hasattr(waves, '_sampler'):
+                waves._sampler = self._sampler
+
     def post_model_run(self):
         '''
         A place where the model goes through all collections and calls
@@ -868,6 +979,10 @@ class Model(GnomeId):
         for mov in self.movers:
             if mov.on:
                 mov.post_model_run()
+
+        # the outputters finish writing the run first
+        self._finish_output()
+
         for out in self.outputters:
             if out.on:
                 out.post_model_run()
@@ -875,6 +990,48 @@ class Model(GnomeId):
             if wea.on:
                 wea.post_model_run()
 
+        # make sure any steps still being written to the cache are on disk
+        self._cache.post_model_run()
+
+    def _call_outputter(self, outputter, method, *args):
+        '''
+        Call a method of an outputter -- in the output executor, after the
+        outputter's calls for the earlier steps, if there is one
+        '''
+        executor = self._executor_for(outputter)
+
+        if executor is None:
+            return getattr(outputter, method)(*args)
+
+        return executor.submit(outputter, getattr(outputter, method), *args)
+
+    def _executor_for(self, outputter):
+        '''
+        The output executor the outputter is run in -- None if there is
+        none, or if the outputter reads the model's objects
+        '''
+        if outputter.reads_model_objects:
+            return None
+
+        return self._output_executor
+
+    def _finish_output(self, raise_errors=True):
+        '''
+        Wait for the output executor to write all the steps, and stop it
+
+        :param raise_errors=True: raise the first error of the outputters
+        '''
+        executor = self._output_executor
+
+        if executor is not None:
+            self._output_executor = None
+            self._output_schedules = {}
+
+            try:
+                executor.drain(raise_errors)
+            finally:
+                executor.shutdown()
+
     def setup_time_step(self):
         '''
         sets up everything for the current time_step:
@@ -893,7 +1050,14 @@ class Model(GnomeId):
             environment.prepare_for_model_step(self.model_time)
 
         for outputter in self.outputters:
-            outputter.prepare_for_model_step(self.time_step, self.model_time)
+            self._call_outputter(outputter, 'prepare_for_model_step',
+                                 self.time_step, self.model_time)
+
+            if self._executor_for(outputter) is not None:
+                # only the base class's, which decides the steps written
+                Outputter.prepare_for_model_step(
+                    self._output_schedules[id(outputter)],
+                    self.time_step, self.model_time)
 
     def move_elements(self):
         '''
@@ -911,10 +1075,14 @@ class Model(GnomeId):
                 # reset next_positions
                 (sc['next_positions'])[:] = sc['positions']
 
-                # loop through the movers
+                # loop through the movers -- each one adds its move to
+                # next_positions, sharing what they can in step
+                step = TransportStep(sc, self.time_step, self.model_time)
+                next_positions = sc['next_positions']
+
                 for m in self.movers:
-                    delta = m.get_move(sc, self.time_step, self.model_time)
-                    sc['next_positions'] += delta
+                    m.add_move(sc, self.time_step, self.model_time,
+                               next_positions, step)
 
                 self.map.beach_elements(sc, self.model_time)
 
@@ -929,6 +1097,9 @@ class Model(GnomeId):
                 # the final move to the new positions
                 (sc['positions'])[:] = sc['next_positions']
 
+        # the environment values at the old positions are no good now
+        self._sampler.invalidate()
+
     def _update_fate_status(self, sc):
         '''
         WeatheringData used to perform this operation in weather_elements;
@@ -978,16 +1149,21 @@ class Model(GnomeId):
             # if no weatherers then mass_components array may not be defined
             return
 
+        substeps = self._split_into_substeps()
+
         for sc in self.spills.items():
             # elements may have beached to update fate_status
 
             sc.reset_fate_dataview()
 
-            for w in self.weatherers:
-                for model_time, time_step in self._split_into_substeps():
-                    # change 'mass_components' in weatherer
-                    w.weather_elements(sc, time_step, model_time)
-                    #self.logger.info('density after {0}: {1}'.format(w.name, sc['density'][-5:]))
+            # the weatherers share the fate data, which goes back into the
+            # data arrays once they are all done
+            with sc.batched_weathering():
+                for w in self.weatherers:
+                    for model_time, time_step in substeps:
+                        # change 'mass_components' in weatherer
+                        w.weather_elements(sc, time_step, model_time)
+                        #self.logger.info('density after {0}: {1}'.format(w.name, sc['density'][-5:]))
 
         #self.logger.info('density after weather_elements: {0}'.format(sc['density'][-5:]))
 
@@ -1033,7 +1209,7 @@ class Model(GnomeId):
                 w.model_step_is_done(sc)
 
         for outputter in self.outputters:
-            outputter.model_step_is_done()
+            self._call_outputter(outputter, 'model_step_is_done')
 
         for sc in self.spills.items():
             '''
@@ -1045,28 +1221,125 @@ class Model(GnomeId):
             sc['age'][:] = sc['age'][:] + self.time_step
 
     def write_output(self, valid, messages=None):
+        '''
+        Call write_output on the outputters for the current step
+
+        If output_workers is more than 0, the outputters write the step in
+        other threads, and the values in the returned dict are Futures
+        with their output -- see gnome.outputters.executor.output_results
+        '''
         output_info = {'step_num': self.current_time_step}
+        islast_step = self.current_time_step == self.num_time_steps - 1
+
+        if self._output_executor is not None:
+            steps = self._output_steps(islast_step)
 
         for outputter in self.outputters:
-            if self.current_time_step == self.num_time_steps - 1:
-                output = outputter.write_output(self.current_time_step, True)
+            executor = self._executor_for(outputter)
+
+            if executor is None:
+                output = outputter.write_output(self.current_time_step,
+                                                islast_step)
             else:
-                output = outputter.write_output(self.current_time_step)
+                output = executor.write_output(outputter,
+                                               steps[id(outputter)],
+                                               islast_step)
 
             if output is not None:
                 output_info[outputter.__class__.__name__] = output
 
+        if self._output_executor is not None:
+            self._output_executor.end_step()
+
         if len(output_info) > 1:
             # append 'valid' flag to output
             output_info['valid'] = valid
 
         return output_info
 
+    def _output_steps(self, islast_step):
+        '''
+        The CachedStep each outputter run in the output executor writes the
+        current step from
+
+        Which outputters write the step is followed on copies of them, so
+        the surface concentration is only computed if one of them writes it
+        -- in the model thread, once for each algorithm. As when they are
+        run in the model thread, the cache keeps the last one computed.
+
+        :returns: dict of id(outputter): CachedStep
+        '''
+        step_num = self.current_time_step
+        step = self._cache.step_snapshot(step_num)
+
+        # only the certain one -- as Outputter.write_output does
+        data = self._cache.recent[step_num][0]
+
+        computed = {}
+        steps = {}
+
+        for outputter in self.outputters:
+            if self._executor_for(outputter) is None:
+                continue
+
+            schedule = self._output_schedules[id(outputter)]
+            Outputter._update_write_step(schedule, step_num, islast_step)
+
+            steps[id(outputter)] = step
+
+            if (not outputter.on or
+                    not schedule._write_step or
+                    outputter.surface_conc is None or
+                    schedule._surf_conc_computed):
+                continue
+
+            schedule._surf_conc_computed = True
+
+            algorithm = outputter.surface_conc
+            if algorithm not in computed:
+                sc = dict(data)
+                compute_surface_concentration(sc, algorithm)
+                computed[algorithm] = sc.get('surface_concentration')
+
+            surface_conc = computed[algorithm]
+
+            if surface_conc is not None:
+                data['surface_concentration'] = surface_conc
+                steps[id(outputter)] = \
+                    step.with_surface_concentration(surface_conc)
+
+        return steps
+
     def step(self):
         '''
         Steps the model forward (or backward) in time. Needs testing for
         hindcasting.
+
+        If the step raises an error, the outputters close their files.
         '''
+        try:
+            return self._step()
+        except StopIteration:
+            raise
+        except Exception:
+            self._abort_run()
+            raise
+
+    def _abort_run(self):
+        '''
+        Stop writing the output of a run a step failed in, and let the
+        outputters close their files
+        '''
+        self._finish_output(raise_errors=False)
+
+        for out in self.outputters:
+            try:
+                out.abort_model_run()
+            except Exception:
+                self.logger.exception('{0} could not close its output'
+                                      .format(out.name))
+
+    def _step(self):
         isValid = True
         for sc in self.spills.items():
             # Set the current time stamp only after current_time_step is
@@ -1192,7 +1465,8 @@ class Model(GnomeId):
                 self.logger.info('** Run Complete **')
                 break
 
-        return output_data
+        # the outputters are done, if they were run in other threads
+        return [output_results(results) for results in output_data]
 
     def _add_to_environ_collec(self, obj_added):
         '''
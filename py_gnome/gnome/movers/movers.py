@@ -8,7 +8,8 @@ from colander import (SchemaNode, TupleSchema, Bool, drop)
 from gnome.basic_types import (world_point,
                                world_point_type,
                                spill_type,
-                               status_code_type)
+                               status_code_type,
+                               oil_status)
 
 from gnome.utilities import time_utils
 from gnome.persist.base_schema import ObjTypeSchema
@@ -199,6 +200,20 @@ class Mover(Process):
 
         return delta
 
+    def add_move(self, sc, time_step, model_time_datetime, out, step=None):
+        """
+        Add the move of the elements to out -- this is what the model calls.
+
+        :param out: (number_elements X 3) array the move is added to --
+                    sc['next_positions'] when called by the model.
+        :param step=None: the :class:`gnome.movers.transport.TransportStep`
+                          shared by the movers in this time step.
+
+        This default adds the result of get_move().  Movers can override it
+        to add the move in place, and use what is shared in step.
+        """
+        out += self.get_move(sc, time_step, model_time_datetime)
+
     def get_bounds(self):
         '''
             Return a bounding box surrounding the grid data.
@@ -207,14 +222,43 @@ class Mover(Process):
         return ((-360, -90), (360, 90))
 
 
+# Dormand-Prince coefficients for the RK45 method
+_DP_C = (0.0, 1.0 / 5, 3.0 / 10, 4.0 / 5, 8.0 / 9, 1.0, 1.0)
+_DP_A = ((),
+         (1.0 / 5,),
+         (3.0 / 40, 9.0 / 40),
+         (44.0 / 45, -56.0 / 15, 32.0 / 9),
+         (19372.0 / 6561, -25360.0 / 2187, 64448.0 / 6561, -212.0 / 729),
+         (9017.0 / 3168, -355.0 / 33, 46732.0 / 5247, 49.0 / 176,
+          -5103.0 / 18656),
+         (35.0 / 384, 0.0, 500.0 / 1113, 125.0 / 192, -2187.0 / 6784,
+          11.0 / 84))
+# 5th order weights are the last row of _DP_A -- difference from 4th order:
+_DP_E = (35.0 / 384 - 5179.0 / 57600,
+         0.0,
+         500.0 / 1113 - 7571.0 / 16695,
+         125.0 / 192 - 393.0 / 640,
+         -2187.0 / 6784 + 92097.0 / 339200,
+         11.0 / 84 - 187.0 / 2100,
+         -1.0 / 40)
+
+
 class PyMover(Mover):
+    # error allowed in the move of an element in a time step by the RK45
+    # method, in meters
+    rk45_tolerance = 1.0
+
+    # the RK45 method halves the step this many times, at most
+    rk45_max_depth = 6
+
     def __init__(self, default_num_method='RK2',
                  **kwargs):
         super(PyMover, self).__init__(**kwargs)
 
         self.num_methods = {'RK4': self.get_delta_RK4,
                             'Euler': self.get_delta_Euler,
-                            'RK2': self.get_delta_RK2}
+                            'RK2': self.get_delta_RK2,
+                            'RK45': self.get_delta_RK45}
         self.default_num_method = default_num_method
 
         if 'env' in kwargs:
@@ -242,17 +286,62 @@ class PyMover(Mover):
 
         return self.num_methods[method_name]
 
-    def get_delta_Euler(self, sc, time_step, model_time, pos, vel_field):
-        vels = vel_field.at(pos, model_time)
+    def active_elements(self, sc):
+        '''
+        Indices of the elements the mover acts on -- the ones in the water
+        '''
+        return np.flatnonzero(sc['status_codes'] == oil_status.in_water)
+
+    def get_active_deltas(self, sc, time_step, model_time, vel_field,
+                          num_method=None, step=None):
+        '''
+            Runs the numerical method on the active elements only.
+
+            The positions of the active elements are gathered into a
+            compact array, so the velocity field is only evaluated where
+            it is needed -- beached, off map, etc. elements are skipped.
+
+            If a TransportStep is passed in, the active elements and the
+            velocities at their starting positions come from it, so they
+            are shared with other movers.
+
+            :returns: (idx, deltas) -- the indices of the active elements,
+                      and their moves, in meters, as a (len(idx), 3) array.
+                      Scatter them back with deltas_all[idx] = deltas.
+        '''
+        if step is None:
+            idx = self.active_elements(sc)
+            v0 = None
+        else:
+            idx = step.active
+            v0 = (step.sample(vel_field, model_time, active_only=True)
+                  if len(idx) > 0 else None)
+
+        deltas = np.zeros((len(idx), 3), dtype=world_point_type)
+
+        if len(idx) > 0:
+            pos = sc['positions'][idx]
+
+            res = self.delta_method(num_method)(sc, time_step, model_time,
+                                                pos, vel_field, v0=v0)
+            deltas[:, :res.shape[1]] = res
+
+        return idx, deltas
+
+    def get_delta_Euler(self, sc, time_step, model_time, pos, vel_field,
+                        v0=None):
+        vels = vel_field.at(pos, model_time) if v0 is None else v0
 
         return vels * time_step
 
-    def get_delta_RK2(self, sc, time_step, model_time, pos, vel_field):
+    def get_delta_RK2(self, sc, time_step, model_time, pos, vel_field,
+                      v0=None):
         dt = timedelta(seconds=time_step)
         dt_s = dt.seconds
         t = model_time
 
-        v0 = vel_field.at(pos, t)
+        if v0 is None:
+            v0 = vel_field.at(pos, t)
         d0 = FlatEarthProjection.meters_to_lonlat(v0 * dt_s, pos)
         p1 = pos.copy()
         p1 += d0
@@ -261,23 +350,25 @@ class PyMover(Mover):
 
         return dt_s / 2 * (v0 + v1)
 
-    def get_delta_RK4(self, sc, time_step, model_time, pos, vel_field):
+    def get_delta_RK4(self, sc, time_step, model_time, pos, vel_field,
+                      v0=None):
         dt = timedelta(seconds=time_step)
         dt_s = dt.seconds
         t = model_time
 
-        v0 = vel_field.at(pos, t)
+        if v0 is None:
+            v0 = vel_field.at(pos, t)
         d0 = FlatEarthProjection.meters_to_lonlat(v0 * dt_s / 2, pos)
         p1 = pos.copy()
         p1 += d0
 
         v1 = vel_field.at(p1, t + dt / 2)
-        d1 = FlatEarthProjection.meters_to_lonlat(v1 * dt_s / 2, pos)
+        d1 = FlatEarthProjection.meters_to_lonlat(v1 * dt_s / 2, p1)
         p2 = pos.copy()
         p2 += d1
 
         v2 = vel_field.at(p2, t + dt / 2)
-        d2 = FlatEarthProjection.meters_to_lonlat(v2 * dt_s, pos)
+        d2 = FlatEarthProjection.meters_to_lonlat(v2 * dt_s, p2)
         p3 = pos.copy()
         p3 += d2
 
@@ -285,6 +376,79 @@ class PyMover(Mover):
 
         return dt_s / 6 * (v0 + 2 * v1 + 2 * v2 + v3)
 
+    def get_delta_RK45(self, sc, time_step, model_time, pos, vel_field,
+                       v0=None):
+        '''
+            Adaptive Runge-Kutta (Dormand-Prince 5(4)) method.
+
+            Each element is first moved with a single step.  The elements
+            whose error estimate is over rk45_tolerance (meters) -- the ones
+            in strong shear -- are moved again in two half steps, and so on,
+            up to rk45_max_depth times.  The elements in each sub-step share
+            its times, so the velocity field is evaluated once per stage for
+            all of them.
+        '''
+        y0 = np.zeros((len(pos), 2), dtype=np.float64)
+
+        return self._rk45_step(pos, y0, model_time, float(time_step),
+                               vel_field, 0, v0=v0)
+
+    def _rk45_step(self, pos, y0, t, h, vel_field, depth, v0=None):
+        '''
+            Move the elements from y0 (meters from pos) at time t over h
+            seconds, halving the step for the elements that need it.
+
+            :returns: where they end up, in meters from pos
+        '''
+        k = []
+        for c, a in zip(_DP_C, _DP_A):
+            y = y0.copy()
+            for a_j, k_j in zip(a, k):
+                if a_j != 0.0:
+                    y += (h * a_j) * k_j
+
+            if v0 is not None and not k:
+                # the velocity at the start position is already known
+                vel = v0
+            else:
+                vel = vel_field.at(self._rk45_position(pos, y),
+                                   t + timedelta(seconds=c * h))
+
+            k.append(np.asarray(vel, dtype=np.float64)[:, :2])
+
+        # the 7th stage is at the 5th order result
+        y5 = y
+        err = np.hypot(*(h * sum(e * k_i for e, k_i in zip(_DP_E, k)
+                                 if e != 0.0)).T)
+
+        refine = np.flatnonzero(err > self.rk45_tolerance)
+
+        if len(refine) > 0 and depth < self.rk45_max_depth:
+            half = h / 2
+            sub_pos = pos[refine]
+
+            y_mid = self._rk45_step(sub_pos, y0[refine], t, half,
+                                    vel_field, depth + 1)
+            y5[refine] = self._rk45_step(sub_pos, y_mid,
+                                         t + timedelta(seconds=half), half,
+                                         vel_field, depth + 1)
+        elif len(refine) > 0:
+            self.logger.debug('RK45: {} elements over the error tolerance '
+                              'at the smallest step ({} s)'
+                              .format(len(refine), h))
+
+        return y5
+
+    @staticmethod
+    def _rk45_position(pos, meters):
+        '''
+            pos moved by meters (Nx2) -- as Nx3 points for vel_field.at()
+        '''
+        p = pos.copy()
+        p[:, :2] += FlatEarthProjection.meters_to_lonlat(meters, pos)[:, :2]
+
+        return p
+
 
 class CyMover(Mover):
     def __init__(self, **kwargs):
@@ -310,6 +474,9 @@ class CyMover(Mover):
         self.model_time = 0
         self.positions = np.zeros((0, 3), dtype=world_point_type)
         self.delta = np.zeros((0, 3), dtype=world_point_type)
+        # reused from step to step by add_move()
+        self._delta_buffer = np.zeros((0, 3), dtype=world_point_type)
+        self._reuse_delta = False
         self.status_codes = np.zeros((0, 1), dtype=status_code_type)
 
         # either a 1, or 2 depending on whether spill is certain or not
@@ -392,6 +559,19 @@ class CyMover(Mover):
         return (self.delta.view(dtype=world_point_type)
                 .reshape((-1, len(world_point))))
 
+    def add_move(self, sc, time_step, model_time_datetime, out, step=None):
+        """
+        Add the move to out, computing it in a buffer that is kept from
+        step to step, rather than a new array each time.
+        """
+        self._reuse_delta = True
+        try:
+            delta = self.get_move(sc, time_step, model_time_datetime)
+        finally:
+            self._reuse_delta = False
+
+        out += delta
+
     def prepare_data_for_get_move(self, sc, model_time_datetime):
         """
         organizes the spill object into inputs for calling with Cython
@@ -419,7 +599,19 @@ class CyMover(Mover):
         self.positions = (self.positions.view(dtype=world_point)
                           .reshape((len(self.positions),)))
 
-        self.delta = np.zeros(len(self.positions), dtype=world_point)
+        if self._reuse_delta:
+            # called from add_move(), which is done with the delta before
+            # the next call -- so the buffer can be used again
+            if len(self._delta_buffer) != len(self.positions):
+                self._delta_buffer = np.zeros((len(self.positions), 3),
+                                              dtype=world_point_type)
+            else:
+                self._delta_buffer[:] = 0.0
+
+            self.delta = (self._delta_buffer.view(dtype=world_point)
+                          .reshape((len(self.positions),)))
+        else:
+            self.delta = np.zeros(len(self.positions), dtype=world_point)
 
     def model_step_is_done(self, sc=None):
         """
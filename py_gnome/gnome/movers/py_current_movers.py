@@ -4,16 +4,15 @@ import numpy as np
 
 from colander import (SchemaNode, Bool, Float, drop)
 
-from gnome.basic_types import oil_status
 # from gnome.basic_types import (world_point_type,
 #                                status_code_type)
 
-from gnome.utilities.projections import FlatEarthProjection
 
 from gnome.environment import GridCurrent
 from gnome.environment.gridded_objects_base import Grid_U, VectorVariableSchema
 
 from gnome.movers.movers import TimeRangeSchema
+from gnome.movers.transport import TransportStep
 
 from gnome.persist.base_schema import ObjTypeSchema
 from gnome.persist.validators import convertible_to_seconds
@@ -271,29 +270,33 @@ class PyCurrentMover(movers.PyMover):
 
         All movers must implement get_move() since that's what the model calls
         """
-        positions = sc['positions']
+        deltas = np.zeros_like(sc['positions'])
 
+        self.add_move(sc, time_step, model_time_datetime, deltas,
+                      num_method=num_method)
 
-        if self.active and len(positions) > 0:
-            status = sc['status_codes'] != oil_status.in_water
-            pos = positions[:]
+        return deltas
 
-            res = self.delta_method(num_method)(sc, time_step,
-                                                model_time_datetime,
-                                                pos,
-                                                self.current)
+    def add_move(self, sc, time_step, model_time_datetime, out, step=None,
+                 num_method=None):
+        """
+        Add the move of the elements in the water to out.
 
-            if res.shape[1] == 2:
-                deltas = np.zeros_like(positions)
-                deltas[:, 0:2] = res
-            else:
-                deltas = res
+        :param step=None: the TransportStep shared by the movers. One is
+                          made for just this mover if None.
+        """
+        if not self.active or len(out) == 0:
+            return
 
-            deltas *= self.scale_value
+        if step is None:
+            step = TransportStep(sc, time_step, model_time_datetime)
 
-            deltas = FlatEarthProjection.meters_to_lonlat(deltas, positions)
-            deltas[status] = (0, 0, 0)
-        else:
-            deltas = np.zeros_like(positions)
+        # only the elements in the water
+        idx, res = self.get_active_deltas(sc, time_step,
+                                          model_time_datetime,
+                                          self.current,
+                                          num_method,
+                                          step=step)
+        res *= self.scale_value
 
-        return deltas
+        out[idx] += step.meters_to_lonlat(res, idx)
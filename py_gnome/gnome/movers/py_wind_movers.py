@@ -10,15 +10,14 @@ import numpy as np
 from colander import (SchemaNode,
                       Bool, Float, String, Sequence, drop)
 
-from gnome.basic_types import oil_status
 from gnome.array_types import gat
 
 from gnome.utilities import rand
-from gnome.utilities.projections import FlatEarthProjection
 
 from gnome.environment import GridWind
 
 from gnome.movers.movers import TimeRangeSchema
+from gnome.movers.transport import TransportStep
 
 from gnome.persist.base_schema import ObjTypeSchema
 from gnome.persist.validators import convertible_to_seconds
@@ -266,19 +265,35 @@ class PyWindMover(movers.PyMover):
 
         All movers must implement get_move() since that's what the model calls
         """
-        positions = sc['positions']
+        deltas = np.zeros_like(sc['positions'])
 
-        if self.active and len(positions) > 0:
-            status = sc['status_codes'] != oil_status.in_water
-            pos = positions[:]
+        self.add_move(sc, time_step, model_time_datetime, deltas,
+                      num_method=num_method)
 
-            deltas = self.delta_method(num_method)(sc, time_step, model_time_datetime, pos, self.wind)
-            deltas[:, 0] *= sc['windages'] * self.scale_value
-            deltas[:, 1] *= sc['windages'] * self.scale_value
+        return deltas
 
-            deltas = FlatEarthProjection.meters_to_lonlat(deltas, positions)
-            deltas[status] = (0, 0, 0)
-        else:
-            deltas = np.zeros_like(positions)
+    def add_move(self, sc, time_step, model_time_datetime, out, step=None,
+                 num_method=None):
+        """
+        Add the move of the elements in the water to out.
 
-        return deltas
+        :param step=None: the TransportStep shared by the movers. One is
+                          made for just this mover if None.
+        """
+        if not self.active or len(out) == 0:
+            return
+
+        if step is None:
+            step = TransportStep(sc, time_step, model_time_datetime)
+
+        # only the elements in the water
+        idx, res = self.get_active_deltas(sc, time_step,
+                                          model_time_datetime,
+                                          self.wind,
+                                          num_method,
+                                          step=step)
+        windages = sc['windages'][idx] * self.scale_value
+        res[:, 0] *= windages
+        res[:, 1] *= windages
+
+        out[idx] += step.meters_to_lonlat(res, idx)
@@ -0,0 +1,122 @@
+'''
+Things the movers share in one time step
+
+The model moves the elements by adding the move of each mover into
+sc['next_positions'] (Mover.add_move()).  A TransportStep is made for each
+spill container in each step and passed to every mover, so the work that
+does not depend on the mover is only done once:
+
+ - the indices of the elements in the water
+ - the meters to lon-lat scale at the position of each element
+ - the values of an environment object at the positions of the elements
+   (so two movers using the same wind only look it up once)
+'''
+
+import numpy as np
+
+from gnome.basic_types import oil_status
+
+
+# meters to degrees of latitude -- see FlatEarthProjection.meters_to_lonlat
+METERS_TO_DEGREES = 8.9992801e-06
+
+
+class TransportStep(object):
+    '''
+    Per-step data shared by the movers of one spill container.
+
+    Everything is computed the first time it is asked for, from the
+    positions at the start of the step.
+    '''
+    def __init__(self, sc, time_step, model_time):
+        '''
+        :param sc: the spill container being moved
+        :param time_step: time step in seconds
+        :param model_time: model time at the start of the step (datetime)
+        '''
+        self.sc = sc
+        self.time_step = time_step
+        self.model_time = model_time
+
+        self._active = None
+        self._lonlat_scale = None
+        self._samples = {}
+
+    @property
+    def positions(self):
+        return self.sc['positions']
+
+    @property
+    def active(self):
+        '''
+        indices of the elements in the water -- the ones the movers move
+        '''
+        if self._active is None:
+            self._active = np.flatnonzero(self.sc['status_codes'] ==
+                                          oil_status.in_water)
+        return self._active
+
+    @property
+    def lonlat_scale(self):
+        '''
+        Nx2 array: degrees of (lon, lat) per meter at each element
+        '''
+        if self._lonlat_scale is None:
+            lat = np.deg2rad(self.positions[:, 1])
+
+            scale = np.empty((len(lat), 2), dtype=np.float64)
+            scale[:, 1] = METERS_TO_DEGREES
+            scale[:, 0] = METERS_TO_DEGREES / np.cos(lat)
+
+            self._lonlat_scale = scale
+
+        return self._lonlat_scale
+
+    def meters_to_lonlat(self, meters, idx=None):
+        '''
+        Convert moves in meters to lon-lat, in place, as
+        FlatEarthProjection.meters_to_lonlat does
+
+        :param meters: Nx3 (dx, dy, dz) array -- dz is not changed
+        :param idx=None: indices of the elements the rows of meters are
+                         for. All of them if None.
+
+        :returns: meters, converted
+        '''
+        scale = self.lonlat_scale if idx is None else self.lonlat_scale[idx]
+        meters[:, :2] *= scale
+
+        return meters
+
+    def sample(self, env, time=None, active_only=False):
+        '''
+        The values of env (anything with an at(points, time) method) at
+        the positions of the elements.  Cached, so movers using the same
+        object at the same time share the values.
+
+        :param time=None: time of the values. The start of the step if None
+        :param active_only=False: if True, only at the elements in the
+                                  water (self.active)
+
+        The values are read-only -- copy them to change them.
+        '''
+        if time is None:
+            time = self.model_time
+
+        key = (id(env), time, active_only)
+        cached = self._samples.get(key)
+
+        if cached is not None:
+            return cached[1]
+
+        points = (self.positions[self.active] if active_only
+                  else self.positions)
+
+        # a view, so whatever env returned is not made read-only
+        values = np.asarray(env.at(points, time)).view()
+        values.flags.writeable = False
+
+        # keep env too, so its id is not reused while it's cached
+        self._samples[key] = (env, values)
+
+        return values
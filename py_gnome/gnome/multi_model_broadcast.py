@@ -10,8 +10,11 @@ from pickle import loads, dumps
 import uuid
 
 import multiprocessing as mp
+from multiprocessing import shared_memory, resource_tracker
 import tblib.pickling_support
 
+import numpy as np
+
 
 import zmq
 from zmq.eventloop import ioloop, zmqstream
@@ -25,6 +28,63 @@ from gnome.outputters import WeatheringOutput
 tblib.pickling_support.install()
 
 
+def attach_shared_arrays(layout, blocks):
+    '''
+        Build numpy arrays backed by the shared memory blocks described in
+        layout, as returned by ModelConsumer's publish_element_arrays command.
+        No data is copied.
+
+        :param dict layout: {array_name: (block_name, dtype_str, shape)}
+
+        :param dict blocks: {block_name: SharedMemory} of the blocks already
+                            attached. Newly attached blocks are added to it.
+    '''
+    arrays = {}
+
+    for array_name, (block_name, dtype, shape) in layout.items():
+        if block_name not in blocks:
+            shm = shared_memory.SharedMemory(name=block_name)
+
+            # the consumer owns the block and unlinks it when it is done.
+            # Don't let the resource tracker unlink it from here as well.
+            resource_tracker.unregister(shm._name, 'shared_memory')
+
+            blocks[block_name] = shm
+
+        # frombuffer holds on to the block's buffer, so the block can't be
+        # closed while the arrays are in use (np.ndarray(buffer=) doesn't)
+        arrays[array_name] = np.frombuffer(blocks[block_name].buf,
+                                           dtype=dtype,
+                                           count=int(np.prod(shape))
+                                           ).reshape(shape)
+
+    return arrays
+
+
+def close_shared_blocks(blocks, keep=(), unlink=False):
+    '''
+        Close (and optionally unlink) the shared memory blocks that are not
+        in keep.  Blocks still used by arrays somebody holds can't be closed
+        yet -- they are left for the garbage collector.
+    '''
+    for block_name in [n for n in blocks if n not in keep]:
+        shm = blocks.pop(block_name)
+
+        if unlink:
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                # already unlinked -- unlink() didn't get to unregister it
+                resource_tracker.unregister(shm._name, 'shared_memory')
+
+        try:
+            shm.close()
+        except BufferError:
+            logging.getLogger(__name__).warning(
+                'shared memory block {} is still used by arrays, it is '
+                'left for the garbage collector'.format(block_name))
+
+
 class ModelConsumer(mp.Process):
     '''
         This is a consumer process that makes the model available
@@ -52,6 +112,10 @@ class ModelConsumer(mp.Process):
         self.model = model
         self.ipc_folder = ipc_folder
 
+        # shared memory blocks the element arrays are published in,
+        # {array_name: SharedMemory}
+        self._shared_blocks = {}
+
     def run(self):
         # remove any root handlers else we get IOErrors for shared file
         # handlers
@@ -81,6 +145,10 @@ class ModelConsumer(mp.Process):
         sock.close()
         context.destroy(linger=0)
 
+        close_shared_blocks({shm.name: shm
+                             for shm in self._shared_blocks.values()},
+                            unlink=True)
+
     def cleanup_inherited_files(self):
         proc = psutil.Process(os.getpid())
         try:
@@ -184,6 +252,46 @@ class ModelConsumer(mp.Process):
     def _get_outputters(self):
         return [o for o in self.model.outputters]
 
+    def _publish_element_arrays(self, array_names=None):
+        '''
+            Copy the forecast SpillContainer's data arrays into shared
+            memory blocks, so the broadcaster can read them without them
+            being pickled.  Blocks are re-used from step to step and only
+            re-allocated when the arrays outgrow them.
+
+            :param array_names: names of the arrays to publish.  If None,
+                                all of them are published.
+
+            :returns: {array_name: (block_name, dtype_str, shape)}
+        '''
+        sc = self.model.spills.items()[0]
+
+        if array_names is None:
+            array_names = list(sc.data_arrays.keys())
+
+        layout = {}
+
+        for name in array_names:
+            array = sc[name]
+            shm = self._shared_blocks.get(name)
+
+            if shm is None or shm.size < array.nbytes:
+                if shm is not None:
+                    close_shared_blocks({shm.name: shm}, unlink=True)
+
+                # leave room for the arrays to grow
+                shm = shared_memory.SharedMemory(create=True,
+                                                 size=max(2 * array.nbytes,
+                                                          1))
+                self._shared_blocks[name] = shm
+
+            np.ndarray(array.shape, dtype=array.dtype,
+                       buffer=shm.buf)[...] = array
+
+            layout[name] = (shm.name, array.dtype.str, array.shape)
+
+        return layout
+
     def _get_weatherer_attribute(self, idx, attr):
         return getattr(self.model.weatherers[idx], attr)
 
@@ -214,6 +322,10 @@ class ModelBroadcaster(GnomeId):
         self.task_files = []
         self.lookup = {}
 
+        # shared memory blocks attached for each task,
+        # {task_idx: {block_name: SharedMemory}}
+        self._shared_blocks = {}
+
         self._get_available_ports(wind_speed_uncertainties,
                                   spill_amount_uncertainties)
         self._spawn_consumers()
@@ -324,14 +436,182 @@ class ModelBroadcaster(GnomeId):
 
             return out
 
+    def iter_steps(self, num_steps=None, timeout=None, max_restarts=1):
+        '''
+            Step all the subprocesses without keeping them in lock step, and
+            yield the results as they come in.
+
+            As soon as a subprocess returns a step, it is sent the next one,
+            so fast subprocesses run ahead of slow ones while the caller
+            processes the results.
+
+            A subprocess that dies, raises an exception or takes longer than
+            timeout for a step is restarted on its own, and the steps it had
+            already done are re-run (those results are not yielded again).
+
+            :param int num_steps: number of steps to run in each subprocess.
+                                  If None, run until the models are done.
+
+            :param timeout: seconds a subprocess may take for one step.
+                            If None, there is no limit.
+
+            :param int max_restarts: how many times each subprocess may be
+                                     restarted before giving up.
+
+            :yields: (idx, step_num, result) tuples, in the order the results
+                     arrive.  For each subprocess idx, step_num is increasing.
+        '''
+        if len(self.tasks) == 0:
+            self.logger.warning('Broadcaster is stopped.  Cannot step.')
+            return
+
+        request = dumps(('step', {}))
+
+        num_tasks = len(self.tasks)
+        steps_done = [0] * num_tasks
+        to_skip = [0] * num_tasks
+        restarts = [0] * num_tasks
+        sent_at = [None] * num_tasks
+
+        poller = zmq.Poller()
+        running = set()
+
+        def send_step(idx):
+            self.tasks[idx].send(request)
+            sent_at[idx] = time.time()
+
+        for idx, task in enumerate(self.tasks):
+            poller.register(task, zmq.POLLIN)
+            running.add(idx)
+            send_step(idx)
+
+        try:
+            while running:
+                events = dict(poller.poll(100))
+                now = time.time()
+
+                for idx in sorted(running):
+                    task = self.tasks[idx]
+                    response = None
+
+                    if task in events:
+                        response = self.recv_from_task(task)
+
+                        if not self.is_child_exception(response):
+                            if to_skip[idx] > 0:
+                                # re-running steps after a restart
+                                to_skip[idx] -= 1
+                                send_step(idx)
+                                continue
+
+                            step_num = steps_done[idx]
+                            steps_done[idx] += 1
+
+                            if (num_steps is None or
+                                    steps_done[idx] < num_steps):
+                                send_step(idx)
+                            else:
+                                running.discard(idx)
+                                poller.unregister(task)
+
+                            yield idx, step_num, response
+                            continue
+
+                        if issubclass(response[0], StopIteration):
+                            # this model is done
+                            running.discard(idx)
+                            poller.unregister(task)
+                            continue
+                    elif (self.consumers[idx].is_alive() and
+                          (timeout is None or now - sent_at[idx] < timeout)):
+                        continue
+
+                    # the subprocess is dead, timed out, or raised
+                    restarts[idx] += 1
+                    if restarts[idx] > max_restarts:
+                        running.discard(idx)
+
+                        if response is not None:
+                            self.handle_child_exception(response)
+
+                        self.stop()
+                        raise zmq.Again('model consumer {} failed'
+                                        .format(idx))
+
+                    poller.unregister(task)
+                    self._restart_task(idx)
+                    poller.register(self.tasks[idx], zmq.POLLIN)
+
+                    to_skip[idx] = steps_done[idx]
+                    send_step(idx)
+        finally:
+            # if the caller stopped early, collect the outstanding replies so
+            # the sockets can be used again
+            for idx in running:
+                if idx < len(self.tasks):
+                    try:
+                        self.recv_from_task(self.tasks[idx])
+                    except zmq.ZMQError:
+                        pass
+
+    def get_element_arrays(self, array_names=None,
+                           uncertainty_values=None, idx=None):
+        '''
+            Get the forecast element data arrays from the subprocesses.
+
+            The subprocesses publish their arrays in shared memory, so only
+            the layout of the blocks goes through the command channel.  The
+            arrays returned are views onto the shared memory, not copies --
+            they are only valid until the next call for the same subprocess.
+
+            :param array_names: names of the arrays to get.  If None, all of
+                                them are returned.
+
+            :param uncertainty_values: see cmd()
+
+            :param int idx: see cmd()
+
+            :returns: a dict of {array_name: array} if a subprocess was
+                      targeted, else a list of them, one per subprocess.
+        '''
+        layouts = self.cmd('publish_element_arrays',
+                           dict(array_names=array_names),
+                           uncertainty_values=uncertainty_values, idx=idx)
+
+        if layouts is None:
+            return None
+
+        if idx is not None or uncertainty_values is not None:
+            if idx is None:
+                idx = self.lookup[uncertainty_values]
+
+            return self._attach_arrays(idx, layouts)
+        else:
+            return [self._attach_arrays(i, layout)
+                    for i, layout in enumerate(layouts)]
+
+    def _attach_arrays(self, idx, layout):
+        blocks = self._shared_blocks.setdefault(idx, {})
+
+        # blocks the subprocess has replaced since last time
+        close_shared_blocks(blocks,
+                            keep=[block for block, _dt, _sh
+                                  in layout.values()])
+
+        return attach_shared_arrays(layout, blocks)
+
     def recv_from_task(self, task):
         return loads(task.recv())
 
-    def handle_child_exception(self, response):
-        if (isinstance(response, tuple) and len(response) == 3 and
+    @staticmethod
+    def is_child_exception(response):
+        return (isinstance(response, tuple) and len(response) == 3 and
                 isinstance(response[0], type) and
                 isinstance(response[1], Exception) and
-                isinstance(response[2], traceback.types.TracebackType)):
+                isinstance(response[2], traceback.types.TracebackType))
+
+    def handle_child_exception(self, response):
+        if self.is_child_exception(response):
             self.stop()
             raise response[0](str(response[1])).with_traceback()
 
@@ -345,9 +625,17 @@ class ModelBroadcaster(GnomeId):
             finally:
                 [t.close() for t in self.tasks]
 
-            for c in self.consumers:
-                c.terminate()
-                c.join()
+            for idx, c in enumerate(self.consumers):
+                # give the consumer a chance to release its shared memory
+                c.join(1)
+
+                if c.is_alive():
+                    c.terminate()
+                    c.join()
+
+                self._release_blocks(idx)
+
+            self._shared_blocks = {}
 
             self.logger.info('joined all consumers!')
 
@@ -384,25 +672,87 @@ class ModelBroadcaster(GnomeId):
 
     def _spawn_consumers(self):
         for p in self.task_ports:
-            model_consumer = ModelConsumer(p, self.model, self.ipc_folder)
-            model_consumer.start()
-            self.consumers.append(model_consumer)
+            self.consumers.append(self._spawn_consumer(p))
+
+    def _spawn_consumer(self, port):
+        model_consumer = ModelConsumer(port, self.model, self.ipc_folder)
+        model_consumer.start()
+
+        return model_consumer
 
     def _spawn_tasks(self):
         self.context = zmq.Context()
 
         for p in self.task_ports:
-            task = self.context.socket(zmq.REQ)
-            task_file = '{}/Task-{}'.format(self.ipc_folder, p)
-
-            task.connect('ipc://{}'.format(task_file))
-
-            task.setsockopt(zmq.RCVTIMEO, 10 * 1000)
-            task.setsockopt(zmq.LINGER, 5)
+            task, task_file = self._spawn_task(p)
 
             self.tasks.append(task)
             self.task_files.append(task_file)
 
+    def _spawn_task(self, port):
+        task = self.context.socket(zmq.REQ)
+        task_file = '{}/Task-{}'.format(self.ipc_folder, port)
+
+        task.connect('ipc://{}'.format(task_file))
+
+        task.setsockopt(zmq.RCVTIMEO, 10 * 1000)
+        task.setsockopt(zmq.LINGER, 5)
+
+        return task, task_file
+
+    def _restart_task(self, idx):
+        '''
+            Replace the subprocess at idx with a new one, set up with the
+            same uncertainty and rewound.  The other subprocesses are left
+            alone.
+        '''
+        self.logger.warning('restarting model consumer {}'.format(idx))
+
+        self.tasks[idx].close(linger=0)
+
+        consumer = self.consumers[idx]
+        if consumer.is_alive():
+            consumer.terminate()
+        consumer.join()
+
+        self._release_blocks(idx)
+
+        try:
+            os.remove(self.task_files[idx])
+        except OSError:
+            pass
+
+        port = uuid.uuid4()
+        self.task_ports[idx] = port
+        self.consumers[idx] = self._spawn_consumer(port)
+        self.tasks[idx], self.task_files[idx] = self._spawn_task(port)
+
+        wsu, sau = [k for k, v in self.lookup.items() if v == idx][0]
+
+        self._set_uncertainty(wsu, sau)
+        self._set_new_cache_dir(idx)
+        self._disable_cache(idx)
+        self._set_weathering_output_only(idx)
+
+        self.cmd('rewind', {}, idx=idx)
+
+    def _release_blocks(self, idx):
+        '''
+            Close the shared memory blocks attached for the subprocess at
+            idx, once it has exited.  If it was terminated (or died), it
+            could not unlink its blocks, so they are unlinked here.
+        '''
+        blocks = self._shared_blocks.pop(idx, {})
+        unlink = self.consumers[idx].exitcode != 0
+
+        if unlink:
+            for shm in blocks.values():
+                # unregistered when they were attached -- unlink()
+                # unregisters them again
+                resource_tracker.register(shm._name, 'shared_memory')
+
+        close_shared_blocks(blocks, unlink=unlink)
+
     def _set_uncertainty(self,
                          wind_speed_uncertainty,
                          spill_amount_uncertainty):
@@ -0,0 +1,204 @@
+'''
+Running the outputters off the model thread
+
+Writing the output (rendering images, writing netcdf, kmz, shape or json
+files) can take as long as the model step. The outputters get the data of a
+step from the cache, so they can write it while the model computes the next
+step.
+
+An OutputExecutor runs the calls to the outputters in a pool of threads.
+The calls to each outputter are run in order, one at a time, so an outputter
+sees the same calls it does when the model runs it -- only later. The
+model gives the write_output calls of a step a CachedStep in place of the
+cache, so the data of the step is still there when it is written. The
+model follows which outputters write the step, and computes the surface
+concentration they need before -- once for each algorithm.
+
+The model waits for the oldest step's output if more than max_pending_steps
+steps are being written, and for all of them at the end of the run
+(drain()). Errors in the outputters are raised in the model thread then.
+
+Outputters that read the model's objects (rather than the cache) in
+write_output set reads_model_objects -- the model runs them in its own
+thread.
+'''
+
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+
+class _Lane(object):
+    'the calls waiting to be run for one outputter, in order'
+    def __init__(self):
+        self.calls = deque()
+        self.running = False
+
+
+class OutputExecutor(object):
+    '''
+    Pool of threads the model's outputters are run in
+    '''
+    def __init__(self, max_workers=1, max_pending_steps=2):
+        '''
+        :param max_workers=1: number of threads -- outputters are run at the
+                              same time, each one in a single thread
+        :param max_pending_steps=2: number of steps that can be being
+                                    written before the model waits
+        '''
+        if max_workers < 1:
+            raise ValueError('max_workers must be at least 1')
+
+        if max_pending_steps < 1:
+            raise ValueError('max_pending_steps must be at least 1')
+
+        self.max_workers = max_workers
+        self.max_pending_steps = max_pending_steps
+
+        self._pool = ThreadPoolExecutor(max_workers,
+                                        thread_name_prefix='gnome-output')
+        self._lock = threading.Lock()
+
+        # id(outputter) -> (outputter, _Lane)
+        self._lanes = {}
+
+        # the futures of the current step, and of the steps not waited for
+        self._pending = []
+        self._steps = deque()
+
+    def submit(self, outputter, fn, *args):
+        '''
+        Call fn(*args) after the earlier calls submitted for outputter
+
+        :returns: a Future with the result
+        '''
+        future = Future()
+
+        with self._lock:
+            lane = self._lanes.setdefault(id(outputter),
+                                          (outputter, _Lane()))[1]
+            lane.calls.append((future, fn, args))
+
+            start = not lane.running
+            lane.running = True
+
+        if start:
+            self._pool.submit(self._run_lane, lane)
+
+        self._pending.append(future)
+
+        return future
+
+    def write_output(self, outputter, step, islast_step=False):
+        '''
+        Call outputter.write_output() for a step
+
+        :param step: the CachedStep the outputter gets its data from
+        :param islast_step=False: passed on to write_output
+
+        :returns: a Future with what write_output returns
+        '''
+        return self.submit(outputter, self._write_output,
+                           outputter, step, islast_step)
+
+    @staticmethod
+    def _write_output(outputter, step, islast_step):
+        # the model's cache is not used while the step is written -- the
+        # outputter's calls are run one at a time, so it can be swapped
+        cache = outputter.cache
+        outputter.cache = step
+
+        if step.surface_conc_computed:
+            # so write_output doesn't compute it again
+            outputter._surf_conc_computed = True
+
+        try:
+            return outputter.write_output(step.step_num, islast_step)
+        finally:
+            outputter.cache = cache
+
+    def end_step(self):
+        '''
+        Call when the calls for a step have been submitted -- waits for the
+        oldest steps if there are more than max_pending_steps
+
+        Raises the first error of the steps waited for.
+        '''
+        self._steps.append(self._pending)
+        self._pending = []
+
+        while len(self._steps) > self.max_pending_steps:
+            for future in self._steps.popleft():
+                future.result()
+
+    def drain(self, raise_errors=True):
+        '''
+        Wait for all the calls submitted
+
+        :param raise_errors=True: raise the first error of the calls, in the
+                                  order they were submitted
+        '''
+        futures = [f for step in self._steps for f in step] + self._pending
+        self._steps.clear()
+        self._pending = []
+
+        wait(futures)
+
+        if raise_errors:
+            for future in futures:
+                future.result()
+
+    def shutdown(self):
+        '''
+        drain(), ignoring the errors, and stop the threads
+        '''
+        self.drain(raise_errors=False)
+        self._pool.shutdown(wait=True)
+
+    def _run_lane(self, lane):
+        'run the calls of a lane until there are none left'
+        while True:
+            with self._lock:
+                if not lane.calls:
+                    lane.running = False
+                    return
+
+                future, fn, args = lane.calls.popleft()
+
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                result = fn(*args)
+            except BaseException as excp:
+                future.set_exception(excp)
+            else:
+                future.set_result(result)
+
+
+def output_results(output_info):
+    '''
+    The output info Model.write_output returns, with the results of the
+    outputters in place of the Futures of an OutputExecutor -- the same as
+    it returns without one.
+
+    Waits for the outputters to finish the step.
+    '''
+    if not any(isinstance(v, Future) for v in output_info.values()):
+        return output_info
+
+    info = {}
+    for key, val in output_info.items():
+        if isinstance(val, Future):
+            val = val.result()
+
+            if val is None:
+                continue
+
+        info[key] = val
+
+    if set(info) == {'step_num', 'valid'}:
+        # no outputter wrote anything
+        del info['valid']
+
+    return info
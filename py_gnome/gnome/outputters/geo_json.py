@@ -266,6 +266,9 @@ class IceGeoJsonOutput(Outputter):
                                  }
         }
     '''
+    # it gets the data from its movers
+    reads_model_objects = True
+
     _schema = IceGeoJsonSchema
 
     def __init__(self, ice_movers, **kwargs):
@@ -45,6 +45,9 @@ class IceImageOutput(Outputter):
         The image is PNG encoded, then Base64 encoded to include in a
         JSON response.
     '''
+    # it gets the data from its movers
+    reads_model_objects = True
+
     _schema = IceImageSchema
 
     def __init__(self, ice_movers=None,
@@ -176,6 +176,9 @@ class CurrentJsonOutput(Outputter):
         }
 
     '''
+    # it gets the data from its movers
+    reads_model_objects = True
+
     _schema = CurrentJsonSchema
 
     def __init__(self, current_movers, **kwargs):
@@ -295,6 +298,9 @@ class IceJsonOutput(Outputter):
                                  }
         }
     '''
+    # it gets the data from its movers
+    reads_model_objects = True
+
     _schema = IceJsonSchema
 
     def __init__(self, ice_movers, **kwargs):
@@ -89,6 +89,7 @@ var_attributes = {
     'next_positions': {},
     'last_water_positions': {},
     'bulk_init_volume': {},
+    'blob_num': {},
     'interfacial_area': {},
     'area': {},
     'fay_area': {},
@@ -169,8 +170,8 @@ class NetCDFOutputSchema(BaseOutputterSchema):
     compress = SchemaNode(
         Bool(), missing=drop, save=True, update=True
     )
-    _start_idx = SchemaNode(
-        Int(), missing=drop, save=True, read_only=True, test_equal=False
+    buffer_steps = SchemaNode(
+        Int(), missing=drop, save=True, update=True
     )
     _middle_of_run = SchemaNode(
         Bool(), missing=drop, save=True, read_only=True, test_equal=False
@@ -254,6 +255,7 @@ class NetCDFOutput(Outputter, OutputterFilenameMixin):
     # "all" will output everything.
     usually_skipped_arrays = ['next_positions',
                               'last_water_positions',
+                              'pixel_positions',
                               'windages',
                               'mass_components',
                               'half_lives',
@@ -278,8 +280,8 @@ class NetCDFOutput(Outputter, OutputterFilenameMixin):
                  # FIXME: this should not be default, but since we don't have
                  #        a way for WebGNOME to set it yet..
                  surface_conc="kde",
+                 buffer_steps=1,
                  # _middle_of_run=False,
-                 _start_idx=0,
                  **kwargs):
         """
         Constructor for Net_CDFOutput object. It reads data from cache and
@@ -301,6 +303,12 @@ class NetCDFOutput(Outputter, OutputterFilenameMixin):
             attributes
         :type which_data: string -- one of {'standard', 'most', 'all'}
 
+        :param buffer_steps=1: number of output steps to keep in memory before
+            writing them to the file -- they are written in one contiguous
+            write per variable. The files are open for the whole run, and
+            written out at the last step, in post_model_run and in rewind.
+        :type buffer_steps: int
+
         Optional arguments passed on to base class (kwargs):
 
         :param cache: sets the cache object from which to read data. The model
@@ -325,6 +333,11 @@ class NetCDFOutput(Outputter, OutputterFilenameMixin):
 
         # uncertain file is only written out if model is uncertain
 
+        # the open netcdf files, and the steps not yet written to them,
+        # keyed by filename -- the base class __init__ calls rewind()
+        self._datasets = {}
+        self._buffers = {}
+
         ## why is this even here ?!?!
         # kwargs['_middle_of_run'] = _middle_of_run
         super(NetCDFOutput, self).__init__(filename=filename,
@@ -369,9 +382,7 @@ class NetCDFOutput(Outputter, OutputterFilenameMixin):
         # The default in netcdf4 is 1 -- which works really badly
         self._chunksize = 1024
 
-        # need to keep track of starting index for writing data since variable
-        # number of particles are released
-        self._start_idx = _start_idx
+        self._buffer_steps = self._check_buffer_steps(buffer_steps)
 
         # define NetCDF variable attributes that are instance attributes here
         # It is set in prepare_for_model_run():
@@ -420,6 +431,25 @@ class NetCDFOutput(Outputter, OutputterFilenameMixin):
         else:
             self._chunksize = value
 
+    @property
+    def buffer_steps(self):
+        return self._buffer_steps
+
+    @buffer_steps.setter
+    def buffer_steps(self, value):
+        if self.middle_of_run:
+            raise AttributeError('buffer_steps can not be set '
+                                 'in the middle of a run')
+        else:
+            self._buffer_steps = self._check_buffer_steps(value)
+
+    @staticmethod
+    def _check_buffer_steps(value):
+        if int(value) != value or value < 1:
+            raise ValueError('buffer_steps must be a positive integer')
+
+        return int(value)
+
     @property
     def compress(self):
         return self._compress
@@ -554,6 +584,9 @@ class NetCDFOutput(Outputter, OutputterFilenameMixin):
         if not self.on:
             return
 
+        # files from a previous run are deleted by the base class
+        self._close_datasets(flush=False)
+
         super(NetCDFOutput, self).prepare_for_model_run(model_start_time,
                                                         spills, **kwargs)
 
@@ -572,8 +605,13 @@ class NetCDFOutput(Outputter, OutputterFilenameMixin):
 
             self._file_exists_error(file_)
 
-            # create the netcdf files and write the standard stuff:
-            with nc.Dataset(file_, 'w', format=self._format) as rootgrp:
+            # create the netcdf files and write the standard stuff
+            # they are kept open for the run
+            rootgrp = nc.Dataset(file_, 'w', format=self._format)
+            self._datasets[file_] = rootgrp
+            self._forget_offsets(file_)
+
+            try:
                 self._initialize_rootgrp(rootgrp, sc)
 
                 # create a dict with dims {2: 'two', 3: 'three' ...}
@@ -590,13 +628,17 @@ class NetCDFOutput(Outputter, OutputterFilenameMixin):
 
                 self._update_arrays_to_output(sc)
 
+                # the buffered steps are written at once, so make the chunks
+                # of the data as big
+                data_chunksz = self._chunksize * self._buffer_steps
+
                 for var_name in self.arrays_to_output:
                     # the special cases:
                     if var_name in ('latitude', 'longitude', 'depth'):
                         # these don't  map directly to an array_type
                         dt = world_point_type
                         shape = ('data', )
-                        chunksz = (self._chunksize,)
+                        chunksz = (data_chunksz,)
                     else:
                         # in prepare_for_model_run, nothing is released but
                         # numpy arrays are initialized with 0 elements so use
@@ -610,11 +652,11 @@ class NetCDFOutput(Outputter, OutputterFilenameMixin):
                         else:
                             if len(sc[var_name].shape) == 1:
                                 shape = ('data',)
-                                chunksz = (self._chunksize,)
+                                chunksz = (data_chunksz,)
                             else:
                                 y_sz = d_dims[sc[var_name].shape[1]]
                                 shape = ('data', y_sz)
-                                chunksz = (self._chunksize,
+                                chunksz = (data_chunksz,
                                            sc[var_name].shape[1])
 
                     self._create_nc_var(rootgrp, var_name, dt, shape, chunksz)
@@ -633,10 +675,9 @@ class NetCDFOutput(Outputter, OutputterFilenameMixin):
                                             dtype='float',
                                             shape=('time',),
                                             chunksz=(256,))
-
-        # need to keep track of starting index for writing data since variable
-        # number of particles are released
-        self._start_idx = 0
+            except Exception:
+                self._close_datasets(flush=False)
+                raise
 
     def _create_nc_var(self, grp, var_name, dtype, shape, chunksz):
         # fixme: why is this even here? it's wrapping a single call???
@@ -715,51 +756,131 @@ class NetCDFOutput(Outputter, OutputterFilenameMixin):
 
             time_stamp = sc.current_time_stamp
 
-            with nc.Dataset(file_, 'a') as rootgrp:
-                rg_vars = rootgrp.variables
-                idx = len(rg_vars['time'])
-
-                rg_vars['time'][idx] = nc.date2num(time_stamp,
-                                                   rg_vars['time'].units,
-                                                   rg_vars['time'].calendar)
-                pc = rg_vars['particle_count']
-                pc[idx] = len(sc)
-
-                _end_idx = self._start_idx + pc[idx]
+            # copies -- the step is written when the buffer is full
+            data = {}
+            for var_name in self.arrays_to_output:
+                # special case positions:
+                if var_name == 'longitude':
+                    data[var_name] = sc['positions'][:, 0].copy()
+                elif var_name == 'latitude':
+                    data[var_name] = sc['positions'][:, 1].copy()
+                elif var_name == 'depth':
+                    data[var_name] = sc['positions'][:, 2].copy()
+                else:
+                    data[var_name] = sc[var_name].copy()
 
-                # add the data:
-                for var_name in self.arrays_to_output:
-                    # special case positions:
-                    if var_name == 'longitude':
-                        rg_vars['longitude'][self._start_idx:_end_idx] = sc['positions'][:, 0]
-                    elif var_name == 'latitude':
-                        rg_vars['latitude'][self._start_idx:_end_idx] = sc['positions'][:, 1]
-                    elif var_name == 'depth':
-                        rg_vars['depth'][self._start_idx:_end_idx] = sc['positions'][:, 2]
-                    else:
-                        rg_vars[var_name][self._start_idx:_end_idx] = sc[var_name]
+            buf = self._buffers.setdefault(file_, [])
+            buf.append((time_stamp, len(sc), data, dict(sc.mass_balance)))
 
-                # write mass_balance data
-                if sc.mass_balance:
-                    grp = rootgrp.groups['mass_balance']
-                    for key, val in sc.mass_balance.items():
-                        if key not in grp.variables:
-                            self._create_nc_var(grp,
-                                                key, 'float', ('time', ),
-                                                (self._chunksize,)
-                                                )
-                        grp.variables[key][idx] = val
+            if len(buf) >= self._buffer_steps:
+                self._flush(file_)
 
         if islast_step:
+            self._close_datasets()
+
             if self.zip_output is True:
                 self._zip_output_files()
 
-        self._start_idx = _end_idx  # set _start_idx for the next timestep
-
         return {'filename': (self.filename,
                              self._u_filename),
                 'time_stamp': time_stamp.isoformat()}
 
+    def _dataset(self, file_):
+        '''
+        the open netcdf file -- opened for appending if it isn't open
+        '''
+        try:
+            return self._datasets[file_]
+        except KeyError:
+            rootgrp = nc.Dataset(file_, 'a')
+            self._datasets[file_] = rootgrp
+
+            return rootgrp
+
+    def _flush(self, file_):
+        '''
+        write the buffered steps to file_ -- one write for each variable
+        '''
+        steps = self._buffers.pop(file_, None)
+
+        if not steps:
+            return
+
+        try:
+            rootgrp = self._dataset(file_)
+            rg_vars = rootgrp.variables
+
+            # where the steps go
+            idx = len(rootgrp.dimensions['time'])
+            stop = idx + len(steps)
+            start_idx = len(rootgrp.dimensions['data'])
+
+            counts = np.array([s[1] for s in steps], dtype=np.int32)
+            end_idx = start_idx + counts.sum()
+
+            time_ = rg_vars['time']
+            time_[idx:stop] = nc.date2num([s[0] for s in steps],
+                                          time_.units, time_.calendar)
+            rg_vars['particle_count'][idx:stop] = counts
+
+            # add the data:
+            for var_name in steps[0][2]:
+                rg_vars[var_name][start_idx:end_idx] = \
+                    np.concatenate([s[2][var_name] for s in steps])
+
+            # write mass_balance data
+            mb_keys = []
+            for s in steps:
+                mb_keys.extend(k for k in s[3] if k not in mb_keys)
+
+            if mb_keys:
+                grp = rootgrp.groups['mass_balance']
+
+                for key in mb_keys:
+                    if key not in grp.variables:
+                        self._create_nc_var(grp,
+                                            key, 'float', ('time', ),
+                                            (self._chunksize,)
+                                            )
+
+                    # steps without the key are left as fill values
+                    vals = np.ma.masked_all((len(steps),), dtype=np.float64)
+                    for i, s in enumerate(steps):
+                        if key in s[3]:
+                            vals[i] = s[3][key]
+
+                    grp.variables[key][idx:stop] = vals
+
+            # so the file can be read in the middle of the run
+            rootgrp.sync()
+            self._forget_offsets(file_)
+        except Exception:
+            self._close_datasets(flush=False)
+            raise
+
+    def _close_datasets(self, flush=True):
+        '''
+        close the open netcdf files
+
+        :param flush=True: write the buffered steps first -- if False they
+                           are dropped
+        '''
+        try:
+            if flush:
+                for file_ in list(self._buffers):
+                    self._flush(file_)
+        finally:
+            datasets = self._datasets
+            self._datasets = {}
+            self._buffers = {}
+
+            for rootgrp in datasets.values():
+                try:
+                    rootgrp.close()
+                except RuntimeError:
+                    # it's already closed
+                    pass
+
     def _zip_output_files(self):
         zfilename = self.zip_filename
         zipf = zipfile.ZipFile(zfilename, 'w')
@@ -805,7 +926,23 @@ class NetCDFOutput(Outputter, OutputterFilenameMixin):
         '''
         super(NetCDFOutput, self).rewind()
 
-        self._start_idx = 0
+        self._close_datasets()
+
+    def post_model_run(self):
+        '''
+        write out the buffered steps and close the files
+        '''
+        super(NetCDFOutput, self).post_model_run()
+
+        self._close_datasets()
+
+    def abort_model_run(self):
+        '''
+        close the files -- the steps already buffered are written out
+        '''
+        super(NetCDFOutput, self).abort_model_run()
+
+        self._close_datasets()
 
     # fixme: we should use the code in nc_particles for this!!!
     @classmethod
@@ -872,104 +1009,303 @@ class NetCDFOutput(Outputter, OutputterFilenameMixin):
                                ]
         """
 
+        klass._check_data_file(netcdf_file)
+
+        with nc.Dataset(netcdf_file) as data:
+            # first find the index of index in which we are interested
+            index = klass._time_index(data.variables['time'], time, index)
+
+            offsets = klass._step_offsets(netcdf_file, data)
+            data_arrays = klass._arrays_to_read(data, which_data)
+
+            return klass._read_run(data, offsets, index, index + 1,
+                                   data_arrays)[0]
+
+    @classmethod
+    def read_steps(klass,
+                   netcdf_file,
+                   indices=None,
+                   which_data='standard'):
+        """
+        Read the data of several time steps of a netcdf file that was created
+        with NetCDFOutput class. Each variable is read once for each run of
+        consecutive steps asked for.
+
+        :param netcdf_file: Name of the NetCDF file from which to read the data
+
+        :param indices=None: Indices of the 'time' variable (or time_steps).
+                             Negative indices count from the end.
+                             If None, all the steps are read.
+        :type indices: sequence of ints
+
+        :param which_data='standard': Which data arrays are desired -- as for
+                                      read_data
+        :type which_data: string or sequence of strings.
+
+        :return: A list of (arrays_dict, weathering_data) tuples, as returned
+                 by read_data, one for each of the indices.
+        """
+        klass._check_data_file(netcdf_file)
+
+        with nc.Dataset(netcdf_file) as data:
+            offsets = klass._step_offsets(netcdf_file, data)
+            num_steps = len(offsets) - 1
+
+            if indices is None:
+                indices = range(num_steps)
+
+            indices = [klass._check_index(ix, num_steps) for ix in indices]
+            data_arrays = klass._arrays_to_read(data, which_data)
+
+            steps = {}
+            for first, stop in klass._step_runs(sorted(set(indices)),
+                                                offsets):
+                run = klass._read_run(data, offsets, first, stop, data_arrays)
+                steps.update(zip(range(first, stop), run))
+
+        return [steps[ix] for ix in indices]
+
+    @classmethod
+    def iter_steps(klass,
+                   netcdf_file,
+                   which_data='standard',
+                   block_size=2 ** 20):
+        """
+        Iterate over all the time steps of a netcdf file that was created
+        with NetCDFOutput class, in order. The file is read in one pass over
+        each variable, a block of steps at a time.
+
+        :param netcdf_file: Name of the NetCDF file from which to read the data
+
+        :param which_data='standard': Which data arrays are desired -- as for
+                                      read_data
+        :type which_data: string or sequence of strings.
+
+        :param block_size=2**20: number of elements to read at once -- a step
+                                 with more elements is read by itself.
+
+        :return: A generator of (arrays_dict, weathering_data) tuples, as
+                 returned by read_data.
+        """
+        klass._check_data_file(netcdf_file)
+
+        with nc.Dataset(netcdf_file) as data:
+            offsets = klass._step_offsets(netcdf_file, data)
+            data_arrays = klass._arrays_to_read(data, which_data)
+
+            for first, stop in klass._step_runs(range(len(offsets) - 1),
+                                                offsets, block_size):
+                for step in klass._read_run(data, offsets, first, stop,
+                                            data_arrays):
+                    yield step
+
+    # the index of the first element of each step of the files that were
+    # read, keyed by path -- in the order they were read
+    _offsets_cache = {}
+    _offsets_cache_size = 8
+
+    @staticmethod
+    def _check_data_file(netcdf_file):
         if not os.path.exists(netcdf_file):
             raise IOError('File not found: {0}'.format(netcdf_file))
 
-        arrays_dict = {}
-        with nc.Dataset(netcdf_file) as data:
-            _start_ix = 0
+    @staticmethod
+    def _check_index(index, num_steps):
+        if not -num_steps <= index < num_steps:
+            raise IndexError('index {0} is out of range for {1} time steps'
+                             .format(index, num_steps))
 
-            # first find the index of index in which we are interested
-            time_ = data.variables['time']
-
-            if time is None and index is None:
-                # there should only be 1 time in file. Read and
-                # return data associated with it
-                if len(time_) > 1:
-                    raise ValueError('More than one time found in netcdf '
-                                     'file. Please specify time/index for '
-                                     'which data is desired')
-                else:
-                    index = 0
+        return index % num_steps
+
+    @staticmethod
+    def _time_index(time_, time, index):
+        '''
+        index of the step at time, or index -- see read_data()
+        '''
+        if time is None and index is None:
+            # there should only be 1 time in file. Read and
+            # return data associated with it
+            if len(time_) > 1:
+                raise ValueError('More than one time found in netcdf '
+                                 'file. Please specify time/index for '
+                                 'which data is desired')
             else:
-                if time is not None:
-                    time_offset = nc.date2num(time, time_.units,
-                                              calendar=time_.calendar)
-                    if time_offset < 0:
-                        'desired time is before start of model'
-                        index = 0
-                    else:
-                        index = abs(time_[:] - time_offset).argmin()
-                elif index is not None:
-                    if index < 0:
-                        index = len(time_) + index
-
-            for idx in range(index):
-                _start_ix += data.variables['particle_count'][idx]
-
-            _stop_ix = _start_ix + data.variables['particle_count'][index]
-            elem = data.variables['particle_count'][index]
-
-            c_time = nc.num2date(time_[index], time_.units,
-                                 calendar=time_.calendar)
-
-            arrays_dict['current_time_stamp'] = np.array(c_time)
-
-            # figure out what arrays to read in:
-            if which_data == 'standard':
-                data_arrays = set(klass.standard_arrays)
-
-                # swap out positions:
-                [data_arrays.discard(x) for x in ('latitude',
-                                                  'longitude',
-                                                  'depth')]
-                data_arrays.add('positions')
-            elif which_data == 'all':
-                # pull them from the nc file
-                data_arrays = set(data.variables.keys())
-
-                # remove the irrelevant ones:
-                [data_arrays.discard(x) for x in ('time',
-                                                  'particle_count',
-                                                  'latitude',
-                                                  'longitude',
-                                                  'depth')]
-                data_arrays.add('positions')
-            else:  # should be list of data arrays
-                data_arrays = set(which_data)
-
-            # get the data
-            for array_name in data_arrays:
-                # special case time and positions:
-                if array_name == 'positions':
-                    positions = np.zeros((elem, 3), dtype=world_point_type)
-
-                    positions[:, 0] = \
-                        data.variables['longitude'][_start_ix:_stop_ix]
-                    positions[:, 1] = \
-                        data.variables['latitude'][_start_ix:_stop_ix]
-                    positions[:, 2] = \
-                        data.variables['depth'][_start_ix:_stop_ix]
-
-                    arrays_dict['positions'] = positions
-                else:
-                    try:
-                        arrays_dict[array_name] = data.variables[array_name][_start_ix:_stop_ix]
-                    except KeyError:
-                        # it's OK if it's not there, not all standard_arrays
-                        # will always be output
-                        pass
-
-            # get mass_balance
-            weathering_data = {}
-            if 'mass_balance' in data.groups:
-                mb = data.groups['mass_balance']
-
-                for key, val in mb.variables.items():
-                    # assume SI units
-                    weathering_data[key] = val[index]
-
-        return (arrays_dict, weathering_data)
+                return 0
+
+        if time is not None:
+            time_offset = nc.date2num(time, time_.units,
+                                      calendar=time_.calendar)
+            if time_offset < 0:
+                'desired time is before start of model'
+                return 0
+            else:
+                return abs(time_[:] - time_offset).argmin()
+
+        if index < 0:
+            index = len(time_) + index
+
+        return index
+
+    @classmethod
+    def _step_offsets(klass, netcdf_file, data):
+        '''
+        The index of the first element of each step in the data variables,
+        and the number of elements at the end -- the cumulative sum of the
+        particle_count.
+
+        It is computed once for each file, and again if the file changes --
+        the offsets of the last _offsets_cache_size files read are kept.
+        '''
+        path = os.path.abspath(netcdf_file)
+        stat = os.stat(path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+
+        # the stamp can miss a change (coarse mtime, same size), so the
+        # number of steps is checked too
+        cached = klass._offsets_cache.pop(path, None)
+        if (cached is not None and cached[0] == stamp and
+                len(cached[1]) - 1 == len(data.dimensions['time'])):
+            klass._offsets_cache[path] = cached
+
+            return cached[1]
+
+        counts = np.asarray(data.variables['particle_count'][:],
+                            dtype=np.int64)
+
+        offsets = np.zeros((len(counts) + 1,), dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        while len(klass._offsets_cache) >= klass._offsets_cache_size:
+            # drop the least recently read
+            del klass._offsets_cache[next(iter(klass._offsets_cache))]
+
+        klass._offsets_cache[path] = (stamp, offsets)
+
+        return offsets
+
+    @classmethod
+    def _forget_offsets(klass, netcdf_file):
+        'drop the offsets of a file that is being written'
+        klass._offsets_cache.pop(os.path.abspath(netcdf_file), None)
+
+    @staticmethod
+    def _step_runs(indices, offsets, block_size=None):
+        '''
+        split the (sorted) indices in runs of consecutive steps
+
+        :param block_size=None: if not None, the maximum number of elements
+                                in a run of more than one step
+
+        :returns: generator of (first, stop) -- stop is not in the run
+        '''
+        first = stop = None
+
+        for ix in indices:
+            if (ix == stop and
+                    (block_size is None or
+                     offsets[ix + 1] - offsets[first] <= block_size)):
+                stop += 1
+            else:
+                if first is not None:
+                    yield (first, stop)
+
+                first, stop = ix, ix + 1
+
+        if first is not None:
+            yield (first, stop)
+
+    @classmethod
+    def _arrays_to_read(klass, data, which_data):
+        '''
+        the names of the arrays asked for with which_data -- see read_data()
+        '''
+        if which_data == 'standard':
+            data_arrays = set(klass.standard_arrays)
+
+            # swap out positions:
+            [data_arrays.discard(x) for x in ('latitude',
+                                              'longitude',
+                                              'depth')]
+            data_arrays.add('positions')
+        elif which_data == 'all':
+            # pull them from the nc file
+            data_arrays = set(data.variables.keys())
+
+            # remove the irrelevant ones:
+            [data_arrays.discard(x) for x in ('time',
+                                              'particle_count',
+                                              'latitude',
+                                              'longitude',
+                                              'depth')]
+            data_arrays.add('positions')
+        else:  # should be list of data arrays
+            data_arrays = set(which_data)
+
+        return data_arrays
+
+    @staticmethod
+    def _read_run(data, offsets, first, stop, data_arrays):
+        '''
+        read the steps from first to stop (not included) -- one read of each
+        variable
+
+        :returns: list of (arrays_dict, weathering_data) for the steps
+        '''
+        _start_ix = offsets[first]
+        _stop_ix = offsets[stop]
+
+        time_ = data.variables['time']
+        c_times = nc.num2date(time_[first:stop], time_.units,
+                              calendar=time_.calendar)
+
+        # get the data
+        block = {}
+        for array_name in data_arrays:
+            # special case positions:
+            if array_name == 'positions':
+                positions = np.zeros((_stop_ix - _start_ix, 3),
+                                     dtype=world_point_type)
+
+                positions[:, 0] = \
+                    data.variables['longitude'][_start_ix:_stop_ix]
+                positions[:, 1] = \
+                    data.variables['latitude'][_start_ix:_stop_ix]
+                positions[:, 2] = \
+                    data.variables['depth'][_start_ix:_stop_ix]
+
+                block['positions'] = positions
+            else:
+                try:
+                    block[array_name] = \
+                        data.variables[array_name][_start_ix:_stop_ix]
+                except KeyError:
+                    # it's OK if it's not there, not all standard_arrays
+                    # will always be output
+                    pass
+
+        # get mass_balance
+        mb_block = {}
+        if 'mass_balance' in data.groups:
+            mb = data.groups['mass_balance']
+
+            for key, val in mb.variables.items():
+                # assume SI units
+                mb_block[key] = val[first:stop]
+
+        steps = []
+        for i, ix in enumerate(range(first, stop)):
+            start = offsets[ix] - _start_ix
+            end = offsets[ix + 1] - _start_ix
+
+            arrays_dict = {'current_time_stamp': np.array(c_times[i])}
+            for array_name, arr in block.items():
+                arrays_dict[array_name] = arr[start:end]
+
+            weathering_data = {key: val[i] for key, val in mb_block.items()}
+
+            steps.append((arrays_dict, weathering_data))
+
+        return steps
 
     def to_dict(self, json_=None):
         dict_ = super(NetCDFOutput, self).to_dict(json_)
@@ -63,6 +63,11 @@ class Outputter(GnomeId):
 
     _surf_conc_computed = False
 
+    # outputters that read the model's objects (movers, environment) in
+    # write_output are run in the model thread -- see
+    # gnome.outputters.executor
+    reads_model_objects = False
+
     def __init__(self,
                  cache=None,
                  on=True,
@@ -106,8 +111,8 @@ class Outputter(GnomeId):
         :param surface_conc = None: Compute surface concentration
                                   Any non-zero string will compute (and output)
                                   the surface concentration the contents of the
-                                  string determine the algorithm used. "kde" is
-                                  currently the only working option.
+                                  string determine the algorithm used: "kde"
+                                  or "grid" (faster for many elements).
         :type surface_conc: string or None
         """
 
@@ -296,6 +301,13 @@ class Outputter(GnomeId):
         """
         pass
 
+    def abort_model_run(self):
+        """
+        Called by the model when a step raises an error. Override this
+        method if a derived class keeps files open during the run.
+        """
+        pass
+
     def write_output(self, step_num, islast_step=False):
         """
         called by the model at the end of each time step
@@ -310,14 +322,7 @@ class Outputter(GnomeId):
         :type islast_step: bool
 
         """
-        if step_num == 0:
-            if self.output_zero_step:
-                self._write_step = True  # this is the default
-            else:
-                self._write_step = False
-
-        if (islast_step and self.output_last_step):
-            self._write_step = True
+        self._update_write_step(step_num, islast_step)
 
         if (self._write_step and self.cache is None):
             raise ValueError('cache object is not defined. It is required'
@@ -343,6 +348,20 @@ class Outputter(GnomeId):
                 compute_surface_concentration(sc, self.surface_conc)
                 self._surf_conc_computed = True
 
+    def _update_write_step(self, step_num, islast_step):
+        '''
+        the first and last steps are written according to output_zero_step
+        and output_last_step -- the others as prepare_for_model_step set it
+        '''
+        if step_num == 0:
+            if self.output_zero_step:
+                self._write_step = True  # this is the default
+            else:
+                self._write_step = False
+
+        if (islast_step and self.output_last_step):
+            self._write_step = True
+
     def clean_output_files(self):
         '''
         Cleans out the output dir
@@ -0,0 +1,375 @@
+"""
+Outputter that reduces the elements to gridded statistics as the model runs
+
+Rather than writing every step out and post-processing it, a ReducerOutputter
+updates a set of accumulators on a regular lon-lat grid at each output step.
+The memory used only depends on the size of the grid, and each update is
+O(number of elements).
+
+The accumulators of several runs -- in the same process or not -- can be
+merged, so they can be used for ensembles:
+
+    reducer = ReducerOutputter(((-127.5, 47.5), (-126.0, 48.5)), (150, 100))
+    model.outputters += reducer
+    model.full_run()
+
+    total.merge(reducer)  # total: a ReducerOutputter from another run
+
+The accumulators are plain python objects, so they can be pickled and sent
+between processes (ReducerOutputter.accumulators)
+"""
+
+import numpy as np
+
+from gnome.basic_types import oil_status
+from gnome.utilities.projections import FlatEarthProjection
+from gnome.persist import base_schema
+
+from .outputter import Outputter, BaseOutputterSchema
+
+
+def grid_cells(positions, bounds, shape):
+    '''
+    Flat index of the grid cell each position is in, -1 if it is outside the
+    grid.
+
+    :param positions: Nx2 or Nx3 array of (lon, lat, ...)
+    :param bounds: ((x_min, y_min), (x_max, y_max)) of the grid
+    :param shape: (num_x, num_y) of the grid
+
+    Cells are numbered row by row: cell = iy * num_x + ix
+    '''
+    (x_min, y_min), (x_max, y_max) = bounds
+    num_x, num_y = shape
+
+    ix = np.floor((positions[:, 0] - x_min) *
+                  (num_x / (x_max - x_min))).astype(np.intp)
+    iy = np.floor((positions[:, 1] - y_min) *
+                  (num_y / (y_max - y_min))).astype(np.intp)
+
+    cells = iy * num_x + ix
+    cells[(ix < 0) | (ix >= num_x) | (iy < 0) | (iy >= num_y)] = -1
+
+    return cells
+
+
+class Accumulator(object):
+    '''
+    Base class for the accumulators of a ReducerOutputter
+
+    An accumulator holds one value per grid cell, in a flat array of
+    num_x * num_y values (see grid_cells()).  Derived classes define:
+
+        initial: the value the cells start at
+        dtype: the dtype of the values
+        update(): add a step to the values
+        _merge(): combine with the values of another accumulator
+
+    and may define end_run(), called at the end of each model run.
+    '''
+    initial = 0
+    dtype = np.float64
+
+    def __init__(self):
+        self.values = None
+        self.shape = None
+
+    def reset(self, shape):
+        '''
+        Start again from scratch, on a grid of shape (num_x, num_y)
+        '''
+        self.shape = tuple(shape)
+        self.values = np.full(shape[0] * shape[1], self.initial,
+                              dtype=self.dtype)
+
+    def update(self, cells, mass, elapsed, time_step, cell_area):
+        '''
+        Update with one output step.
+
+        :param cells: flat index of the cell of each element in the grid.
+                      Elements outside of the grid are already left out.
+        :param mass: mass of each element (kg)
+        :param elapsed: seconds since the start of the model run
+        :param time_step: seconds since the previous output step
+        :param cell_area: area of each cell (m^2)
+        '''
+        raise NotImplementedError
+
+    def end_run(self):
+        pass
+
+    def merge(self, other):
+        '''
+        Combine the values of other -- from another run, or another part
+        of an ensemble -- into this one.
+        '''
+        if type(other) is not type(self) or other.shape != self.shape:
+            raise ValueError('can only merge a {} on a grid of shape {}'
+                             .format(self.__class__.__name__, self.shape))
+
+        self._merge(other)
+
+    def _merge(self, other):
+        raise NotImplementedError
+
+    @property
+    def result(self):
+        '''
+        the values, as a (num_y, num_x) array
+        '''
+        return self.values.reshape(self.shape[1], self.shape[0])
+
+
+class HitCount(Accumulator):
+    '''
+    Number of runs in which any element was in each cell.
+
+    Divide by ReducerOutputter.num_runs for the probability of a cell being
+    oiled.
+    '''
+    dtype = np.int64
+
+    def reset(self, shape):
+        super(HitCount, self).reset(shape)
+
+        self._hit = np.zeros(len(self.values), dtype=bool)
+
+    def update(self, cells, mass, elapsed, time_step, cell_area):
+        self._hit[cells] = True
+
+    def end_run(self):
+        self.values += self._hit
+        self._hit[:] = False
+
+    def _merge(self, other):
+        self.values += other.values
+
+
+class MinArrivalTime(Accumulator):
+    '''
+    Time (seconds since the start of the run) at which the first element
+    arrived in each cell.  inf where none did.
+    '''
+    initial = np.inf
+
+    def update(self, cells, mass, elapsed, time_step, cell_area):
+        # all the elements are at the same time, so no need for minimum.at
+        self.values[cells] = np.minimum(self.values[cells], elapsed)
+
+    def _merge(self, other):
+        np.minimum(self.values, other.values, out=self.values)
+
+
+class MaxConcentration(Accumulator):
+    '''
+    Largest mass per unit area (kg/m^2) in each cell, over all the steps.
+    '''
+    def update(self, cells, mass, elapsed, time_step, cell_area):
+        conc = (np.bincount(cells, weights=mass,
+                            minlength=len(self.values)) / cell_area)
+        np.maximum(self.values, conc, out=self.values)
+
+    def _merge(self, other):
+        np.maximum(self.values, other.values, out=self.values)
+
+
+class ExposureTime(Accumulator):
+    '''
+    Total time (seconds) that each cell had at least min_mass of oil in it.
+
+    Summed over runs when merged -- divide by ReducerOutputter.num_runs for
+    the mean exposure of a run.
+    '''
+    def __init__(self, min_mass=0.0):
+        super(ExposureTime, self).__init__()
+
+        self.min_mass = min_mass
+
+    def update(self, cells, mass, elapsed, time_step, cell_area):
+        cell_mass = np.bincount(cells, weights=mass,
+                                minlength=len(self.values))
+        self.values[cell_mass > self.min_mass] += time_step
+
+    def _merge(self, other):
+        self.values += other.values
+
+
+class ReducerOutputterSchema(BaseOutputterSchema):
+    grid_bounds = base_schema.LongLatBounds(save=True, update=False)
+    grid_shape = base_schema.ImageSize(save=True, update=False)
+
+
+class ReducerOutputter(Outputter):
+    '''
+    Outputter that keeps gridded statistics of the elements, rather than
+    writing them out.
+
+    Only the forecast (certain) elements are used.
+
+    The grid is saved with the model, but not the accumulators -- they hold
+    python objects. A loaded ReducerOutputter has the default ones.
+    '''
+    _schema = ReducerOutputterSchema
+
+    # elements with these status codes are counted
+    status_codes = (oil_status.in_water, oil_status.on_land)
+
+    def __init__(self,
+                 grid_bounds,
+                 grid_shape=(100, 100),
+                 accumulators=None,
+                 *args,
+                 **kwargs):
+        '''
+        :param grid_bounds: ((x_min, y_min), (x_max, y_max)) of the grid,
+                            in lon-lat
+
+        :param grid_shape=(100, 100): (num_x, num_y) number of grid cells
+
+        :param accumulators=None: dict of {name: Accumulator}.  Default is
+                                  one of each: 'hit_count', 'arrival_time',
+                                  'max_concentration' and 'exposure_time'.
+
+        Other arguments are passed on to the base class, Outputter.
+        '''
+        super(ReducerOutputter, self).__init__(*args, **kwargs)
+
+        (x_min, y_min), (x_max, y_max) = grid_bounds
+        self.grid_bounds = ((x_min, y_min), (x_max, y_max))
+        self.grid_shape = tuple(grid_shape)
+
+        if accumulators is None:
+            accumulators = {'hit_count': HitCount(),
+                            'arrival_time': MinArrivalTime(),
+                            'max_concentration': MaxConcentration(),
+                            'exposure_time': ExposureTime()}
+
+        self.accumulators = accumulators
+        self.num_runs = 0
+
+        for acc in self.accumulators.values():
+            acc.reset(self.grid_shape)
+
+        self._cell_area = self._compute_cell_area()
+
+    def _compute_cell_area(self):
+        '''
+        area of each cell in m^2 -- it only depends on the latitude
+        '''
+        (x_min, y_min), (x_max, y_max) = self.grid_bounds
+        num_x, num_y = self.grid_shape
+
+        dlon = (x_max - x_min) / num_x
+        dlat = (y_max - y_min) / num_y
+        lat = y_min + dlat * (np.arange(num_y) + 0.5)
+
+        size = np.zeros((num_y, 3))
+        size[:, 0] = dlon
+        size[:, 1] = dlat
+
+        ref = np.zeros((num_y, 3))
+        ref[:, 1] = lat
+
+        meters = FlatEarthProjection.lonlat_to_meters(size, ref)
+
+        return np.repeat(meters[:, 0] * meters[:, 1], num_x)
+
+    def prepare_for_model_run(self, *args, **kwargs):
+        super(ReducerOutputter, self).prepare_for_model_run(*args, **kwargs)
+
+        self._last_output_time = None
+
+    def write_output(self, step_num, islast_step=False):
+        '''
+        Update the accumulators with the elements at this step.
+
+        Nothing is returned to the model -- the results are in
+        self.accumulators (or self.results)
+        '''
+        super(ReducerOutputter, self).write_output(step_num, islast_step)
+
+        if self.on is False or not self._write_step:
+            return None
+
+        sc = self.cache.load_timestep(step_num).items()[0]
+
+        time_stamp = sc.current_time_stamp
+        elapsed = (time_stamp - self._model_start_time).total_seconds()
+
+        if self._last_output_time is None:
+            time_step = 0.0
+        else:
+            time_step = elapsed - self._last_output_time
+
+        self._last_output_time = elapsed
+
+        if len(sc) == 0:
+            return None
+
+        cells = grid_cells(sc['positions'], self.grid_bounds,
+                           self.grid_shape)
+        counted = (cells >= 0) & np.isin(sc['status_codes'],
+                                         self.status_codes)
+
+        cells = cells[counted]
+        mass = sc['mass'][counted]
+
+        for acc in self.accumulators.values():
+            acc.update(cells, mass, elapsed, time_step, self._cell_area)
+
+        return None
+
+    def post_model_run(self):
+        '''
+        A run is complete -- count it
+        '''
+        for acc in self.accumulators.values():
+            acc.end_run()
+
+        self.num_runs += 1
+
+    def clear(self):
+        '''
+        Reset the accumulators, dropping the statistics of any runs so far.
+
+        Note that rewinding the model does not do this, so the statistics
+        of successive runs of the model are combined.
+        '''
+        for acc in self.accumulators.values():
+            acc.reset(self.grid_shape)
+
+        self.num_runs = 0
+
+    def merge(self, other):
+        '''
+        Combine the statistics of another ReducerOutputter into this one.
+
+        :param other: a ReducerOutputter on the same grid, or its
+                      (accumulators, num_runs) -- e.g. sent back from
+                      another process.
+        '''
+        if isinstance(other, ReducerOutputter):
+            if (other.grid_bounds != self.grid_bounds or
+                    other.grid_shape != self.grid_shape):
+                raise ValueError('can only merge reducers on the same grid')
+
+            accumulators, num_runs = other.accumulators, other.num_runs
+        else:
+            accumulators, num_runs = other
+
+        if set(accumulators) != set(self.accumulators):
+            raise ValueError('can only merge reducers with the same '
+                             'accumulators: {}'
+                             .format(sorted(self.accumulators)))
+
+        for name, acc in self.accumulators.items():
+            acc.merge(accumulators[name])
+
+        self.num_runs += num_runs
+
+    @property
+    def results(self):
+        '''
+        dict of {name: (num_y, num_x) array} of the accumulated values
+        '''
+        return {name: acc.result for name, acc in self.accumulators.items()}
@@ -425,6 +425,11 @@ class Renderer(Outputter, MapCanvas):
                                  color, mask_color, size, width, scale)
         self.props.append(layer)
 
+    @property
+    def reads_model_objects(self):
+        'the props are drawn from the environment objects at each step'
+        return len(self.props) > 0
+
     def draw_props(self, time):
         for prop in self.props:
             prop.draw_to_image(self.fore_image, time)
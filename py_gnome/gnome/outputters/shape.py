@@ -43,7 +43,10 @@ class ShapeOutput(Outputter):
         :param zip_output=True: whether to zip up the output shape files
 
         :param surface_conc="kde": method to use to compute surface concentration
-                                   current options are: 'kde' and None
+                                   current options are: 'kde' and 'grid'
+                                   ('grid' is much faster for lots of
+                                   particles). It is always written out, so
+                                   None means 'kde'.
 
         '''
         # a little check:
@@ -61,7 +64,8 @@ class ShapeOutput(Outputter):
 
         self.zip_output = zip_output
 
-        surface_conc = "kde"  # force this, as it will try!
+        if not surface_conc:
+            surface_conc = "kde"  # it is always written out
         super(ShapeOutput, self).__init__(surface_conc=surface_conc, **kwargs)
 
     def prepare_for_model_run(self,
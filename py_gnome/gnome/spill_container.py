@@ -8,6 +8,7 @@ set of arrays. The spills themselves provide some of the arrays themselves
 """
 
 import os
+from contextlib import contextmanager
 
 import numpy as np
 
@@ -46,6 +47,9 @@ class FateDataView(AddLogger):
                'disperse', 'non_weather', 'all')
 
     def __init__(self):
+        # while batched, the data is kept between weatherers -- see
+        # SpillContainer.batched_weathering()
+        self.batched = False
         self.reset()
         # self.substance_id = substance_id
 
@@ -56,17 +60,24 @@ class FateDataView(AddLogger):
         # properties of old LEs and properties of newly released LEs
         self.all = {}
 
+        # (fate_status, fate_mask, fate_status array as it was got) of the
+        # data being kept -- None if no data is kept
+        self._kept = None
+
     def _get_fate_mask(self, sc, fate):
         '''
         get fate_status mask over SC - only include LEs with 'mass' > 0.0
         '''
+        # the arrays are used directly, so a batched view is not synced
+        data_arrays = sc._data_arrays
+
         if fate == 'all':
             # look at all fate data
-            w_mask = np.asarray([True] * len(sc))
+            w_mask = np.ones((len(sc),), dtype=bool)
         else:
-            w_mask = (sc['fate_status'] & getattr(bt_fate, fate) == getattr(bt_fate, fate))
+            w_mask = (data_arrays['fate_status'] & getattr(bt_fate, fate) == getattr(bt_fate, fate))
 
-        w_mask = np.logical_and(w_mask, sc['mass'] > 0.0)
+        w_mask = np.logical_and(w_mask, data_arrays['mass'] > 0.0)
         return w_mask
 
     def _set_data(self, sc, array_types, fate_mask, fate_status):
@@ -91,7 +102,7 @@ class FateDataView(AddLogger):
                 array = sc._array_name(at)
 
                 #if array not in dict_to_update:
-                dict_to_update[array] = sc[array][fate_mask]
+                dict_to_update[array] = sc._data_arrays[array][fate_mask]
 
             setattr(self, fate_status, dict_to_update)
 
@@ -102,12 +113,89 @@ class FateDataView(AddLogger):
 
         Options are: 'all', 'surface_weather', 'subsurf_weather', 'skim', 'non_weather',
         'burn'
+
+        While batched, the data is kept, and given to the next weatherer that
+        asks for the same fate_status -- only arrays it did not have yet are
+        gathered.
+        '''
+        if self._kept is not None:
+            if self._kept[0] == fate_status:
+                return self._add_arrays(sc, array_types)
+
+            # hand the kept data back before getting another fate's data
+            self.sync(sc)
+
+        if self.batched:
+            # start from scratch: the arrays in the dict all need the new mask
+            setattr(self, fate_status, {})
+
+        fate_mask = self._get_fate_mask(sc, fate_status)
+        self._set_data(sc, array_types, fate_mask, fate_status)
+        data = getattr(self, fate_status)
+
+        if self.batched:
+            if data is sc._data_arrays:
+                self._kept = (fate_status, fate_mask, None)
+            else:
+                self._kept = (fate_status, fate_mask,
+                              data['fate_status'].copy()
+                              if 'fate_status' in data else None)
+
+        return data
+
+    def _add_arrays(self, sc, array_types):
+        '''
+        add the arrays the kept data does not have yet
         '''
-        self._set_data(sc,
-                       array_types,
-                       self._get_fate_mask(sc, fate_status),
-                       fate_status)
-        return getattr(self, fate_status)
+        fate_status, fate_mask, _ = self._kept
+        data = getattr(self, fate_status)
+
+        if data is not sc._data_arrays:
+            for at in array_types:
+                array = sc._array_name(at)
+
+                if array not in data:
+                    data[array] = sc._data_arrays[array][fate_mask]
+
+        return data
+
+    def _same_elements(self, sc):
+        '''
+        True if the kept data is still for the same elements: no weatherer
+        changed their fate_status or used up their mass.  Otherwise the data
+        needs to go back to the SpillContainer, and be got again.
+        '''
+        fate_status, fate_mask, orig_fate = self._kept
+        data = getattr(self, fate_status)
+
+        if data is sc._data_arrays:
+            return bool(np.all(self._get_fate_mask(sc, fate_status)))
+
+        if (orig_fate is not None and
+                not np.array_equal(data['fate_status'], orig_fate)):
+            return False
+
+        return not ('mass' in data and np.any(np.isclose(data['mass'], 0)))
+
+    def sync(self, sc):
+        '''
+        Copy the kept data back into the SpillContainer arrays, and stop
+        keeping it.
+
+        The dicts are not cleared, so a weatherer still holding the data
+        can update the SpillContainer from it as usual.
+        '''
+        if self._kept is None:
+            return
+
+        fate_status, fate_mask, _ = self._kept
+        self._kept = None
+
+        data = getattr(self, fate_status)
+
+        if data is not sc._data_arrays:
+            for key, val in data.items():
+                sc._data_arrays[key][fate_mask] = val
 
     def update_sc(self, sc, fate_status='surface_weather'):
         '''
@@ -125,6 +213,15 @@ class FateDataView(AddLogger):
                   same between getting the data and resync'ing the original arrays
                   in the SC
         '''
+        if self._kept is not None and self._kept[0] == fate_status:
+            # batched: keep the data for the next weatherer, if it's still
+            # for the same elements
+            if not self._same_elements(sc):
+                self.sync(sc)
+                self.reset()
+
+            return
+
         d_to_sync = getattr(self, fate_status)
 
         if d_to_sync is sc._data_arrays:
@@ -147,7 +244,7 @@ class FateDataView(AddLogger):
         # and let it be recreated when the next weatherer asks for data.
         reset_view = False
         if ('fate_status' in d_to_sync and
-                np.any(sc['fate_status'][w_mask] != d_to_sync['fate_status'])):
+                np.any(sc._data_arrays['fate_status'][w_mask] != d_to_sync['fate_status'])):
             reset_view = True
         elif ('mass' in d_to_sync and
               np.any(np.isclose(d_to_sync['mass'], 0))):
@@ -157,7 +254,7 @@ class FateDataView(AddLogger):
                               "reset_view")
 
         for key, val in d_to_sync.items():
-            sc[key][w_mask] = val
+            sc._data_arrays[key][w_mask] = val
 
         if reset_view:
             self.reset()
@@ -292,7 +389,10 @@ class SpillContainerData(object):
         val_is_dict = []
         for key, val in self.__dict__.items():
             'compare dict not including _data_arrays'
-            if isinstance(val, dict):
+            if key == '_buffers':
+                # storage backing _data_arrays - unused rows are garbage
+                pass
+            elif isinstance(val, dict):
                 val_is_dict.append(key)
             elif key == '_substances_spills' or key == '_fate_data_view':
                 '''
@@ -382,8 +482,32 @@ class SpillContainer(AddLogger, SpillContainerData):
     positions = spill_container['positions'] : returns a (num_LEs, 3) array of
     world_point_types
     """
-    def __init__(self, uncertain=False):
+    # smallest buffer allocated for a data array when elements are released
+    _min_capacity = 16
+
+    def __init__(self, uncertain=False,
+                 removal_interval=1, removal_fraction=None):
+        """
+        :param uncertain=False: flag indicating whether this holds uncertainty
+                                elements or not
+        :param removal_interval=1: elements marked to_be_removed are dropped
+            from the data arrays every removal_interval steps. Until then they
+            stay in the arrays with status_codes == to_be_removed -- the
+            ElementCache leaves them out of the steps it saves, so they are
+            not output.
+        :param removal_fraction=None: if given, elements marked to_be_removed
+            are dropped as soon as they make up at least this fraction of all
+            elements, even if removal_interval steps have not passed.
+
+        Removal is never deferred for uncertain containers: the movers drop
+        the marked elements from their uncertainty lists (in C++) at the
+        end of every step, so the data arrays have to follow.
+        """
         super(SpillContainer, self).__init__(uncertain=uncertain)
+        self.removal_interval = removal_interval
+        self.removal_fraction = removal_fraction
+        self._steps_since_removal = 0
+
         self.spills = OrderedCollection(dtype=gnome.spill.spill.Spill)
         self.spills.register_callback(self._spills_changed,
                                       ('add', 'replace', 'remove'))
@@ -398,6 +522,10 @@ class SpillContainer(AddLogger, SpillContainerData):
         self._array_types = {}
         self._data_arrays = {}
 
+        # preallocated storage backing each data array. The arrays in
+        # _data_arrays are views onto the first len(self) rows of these
+        self._buffers = {}
+
 
     def _reset__substances_spills(self):
         ## Most of this not needed
@@ -432,6 +560,42 @@ class SpillContainer(AddLogger, SpillContainerData):
         # for viewer in self._fate_data_list:
         #     viewer.reset()
 
+    @contextmanager
+    def batched_weathering(self):
+        '''
+        Keep the fate data between weatherers, rather than getting it from
+        the data arrays for each weatherer and putting it back after.  The
+        data is put back once, at the end.
+
+        Used by the model around all the weatherers (and sub-steps) of a
+        time step::
+
+            with sc.batched_weathering():
+                for w in weatherers:
+                    w.weather_elements(sc, time_step, model_time)
+
+        The data is put back early if a weatherer changes the fate_status
+        or uses up the mass of an element, or indexes the SpillContainer
+        directly (sc['mass']).
+        '''
+        view = self._fate_data_view
+        view.reset()
+        view.batched = True
+
+        try:
+            yield self
+        finally:
+            view.sync(self)
+            view.batched = False
+            view.reset()
+
+    def __getitem__(self, data_name):
+        # whoever wants the arrays directly gets them up to date
+        if self._fate_data_view._kept is not None:
+            self._fate_data_view.sync(self)
+
+        return self._data_arrays[data_name]
+
     def _set_substancespills(self):
         '''
         _substances could change when spills are added/deleted
@@ -576,14 +740,69 @@ class SpillContainer(AddLogger, SpillContainerData):
         else:
             return at.name
 
+    @property
+    def capacity(self):
+        """
+        Number of elements the data arrays can hold before their buffers need
+        to be reallocated.
+        """
+        if len(self._buffers) == 0:
+            return 0
+
+        return min(len(buf) for buf in self._buffers.values())
+
+    def reserve(self, num_elements):
+        """
+        Make sure the buffers backing the data arrays can hold at least
+        num_elements, so releasing that many elements only writes into
+        existing storage.
+
+        :param int num_elements: total number of elements to make room for
+        """
+        for name in self._array_types:
+            self._grow_buffer(name, num_elements)
+
+    def _grow_buffer(self, name, capacity):
+        '''
+        make sure the buffer for data array 'name' holds at least 'capacity'
+        elements and that self._data_arrays[name] is a view onto it.
+
+        If the data array was replaced since the buffer was set up (for
+        instance by split_element), its data is copied back into the buffer.
+        '''
+        data = self._data_arrays[name]
+        buf = self._buffers.get(name)
+
+        if (buf is not None and
+                buf.dtype == data.dtype and
+                buf.shape[1:] == data.shape[1:] and
+                len(buf) >= capacity):
+            if data.base is buf:
+                return
+        else:
+            # amortized growth -- at least double the current capacity
+            old_capacity = 0 if buf is None else len(buf)
+            new_capacity = max(capacity, 2 * old_capacity, self._min_capacity)
+            buf = np.empty((new_capacity,) + data.shape[1:], dtype=data.dtype)
+
+        buf[:len(data)] = data
+        self._buffers[name] = buf
+        self._data_arrays[name] = buf[:len(data)]
+
     def _append_data_arrays(self, num_released):
         """
         initialize data arrays once spill has spawned particles
         Data arrays are set to their initial_values
 
+        The new elements are written into the preallocated buffers, which are
+        only reallocated (doubling in size) when they are full.
+
         :param int num_released: number of particles released
 
         """
+        num_current = len(self)
+        num_total = num_current + num_released
+
         for name, atype in self._array_types.items():
             # initialize all arrays even if 0 length
             if atype.shape is None:
@@ -600,7 +819,11 @@ class SpillContainer(AddLogger, SpillContainerData):
                                             initial_value=tuple([0] * self._oil_comp_array_len))
             else:
                 a_append = atype.initialize(num_released)
-            self._data_arrays[name] = np.r_[self._data_arrays[name], a_append]
+
+            self._grow_buffer(name, num_total)
+            buf = self._buffers[name]
+            buf[num_current:num_total] = a_append
+            self._data_arrays[name] = buf[:num_total]
 
     # def _set_substance_array(self, subs_idx, num_rel_by_substance):
     #     '''
@@ -771,6 +994,7 @@ class SpillContainer(AddLogger, SpillContainerData):
         self._reset__fate_data_view()
         self._set_substancespills()
         self.mass_balance = {}  # reset to empty dict
+        self._steps_since_removal = 0
 
     def get_spill_mask(self, spill):
         return self['spill_num'] == self.spills.index(spill)
@@ -782,7 +1006,9 @@ class SpillContainer(AddLogger, SpillContainerData):
         It has all the same spills, with the same ids, and the uncertain
         flag set to True
         """
-        u_sc = SpillContainer(uncertain=True)
+        u_sc = SpillContainer(uncertain=True,
+                              removal_interval=self.removal_interval,
+                              removal_fraction=self.removal_fraction)
         for sp in self.spills:
             u_sc.spills += sp.uncertain_copy()
 
@@ -847,12 +1073,34 @@ class SpillContainer(AddLogger, SpillContainerData):
         self._set_substancespills()
         self.initialize_data_arrays()
 
+        # preallocate room for all the elements the spills know they will
+        # release so releases don't need to grow the arrays
+        self.reserve(self._expected_num_elements())
+
         # todo: maybe better to let map do this, but it does not have a
         # prepare_for_model_run() yet so can't do it there
         # need 'amount_released' here as well
         self.mass_balance['beached'] = 0.0
         self.mass_balance['off_maps'] = 0.0
 
+    def _expected_num_elements(self):
+        '''
+        total number of elements the 'on' spills will release, as given by
+        Spill.release.num_elements. Releases defined by num_per_timestep
+        don't know this up front, so they do not contribute.
+        '''
+        total = 0
+        for spill in self.spills:
+            if not spill.on:
+                continue
+
+            num = getattr(getattr(spill, 'release', None),
+                          'num_elements', None)
+            if num is not None:
+                total += num
+
+        return total
+
     def initialize_data_arrays(self):
         """
         initialize_data_arrays() is called without input data during rewind
@@ -974,24 +1222,60 @@ class SpillContainer(AddLogger, SpillContainerData):
         # for now we only have one type of substance
         self._fate_data_view._reset_fatedata(self, ix)
 
-    def model_step_is_done(self):
+    def model_step_is_done(self, force_removal=False):
         '''
         Called at the end of a time step
         Need to remove particles marked as to_be_removed...
+
+        Removal is deferred according to removal_interval and
+        removal_fraction, except in uncertain containers. Elements that are
+        kept around are taken out of weathering by clearing their
+        fate_status, and are left out of the aggregated mass balance.
+
+        :param force_removal=False: remove the marked elements now, regardless
+            of removal_interval and removal_fraction
         '''
         if len(self._data_arrays) == 0:
             return  # nothing to do - arrays are not yet defined.
 
+        self._steps_since_removal += 1
+
         # LEs are marked as to_be_removed
         # C++ might care about this so leave as is
-        to_be_removed = np.where(self['status_codes'] ==
-                                 oil_status.to_be_removed)[0]
+        tbr_mask = self['status_codes'] == oil_status.to_be_removed
+        num_tbr = np.count_nonzero(tbr_mask)
+
+        if num_tbr == 0:
+            return
 
-        if len(to_be_removed) > 0:
-            for key in self._array_types:
-                self._data_arrays[key] = np.delete(self[key], to_be_removed,
-                                                   axis=0)
+        if (force_removal or self.uncertain or
+                self._steps_since_removal >= self.removal_interval or
+                (self.removal_fraction is not None and
+                 num_tbr >= self.removal_fraction * len(self))):
+            self._remove_elements(tbr_mask)
+            self._steps_since_removal = 0
             self._fate_data_view.reset()
+        elif 'fate_status' in self:
+            # no fate: not weathered, and not counted as non_weathering
+            self['fate_status'][tbr_mask] = 0
+
+    def _remove_elements(self, remove_mask):
+        '''
+        Compact all data arrays in place, dropping the elements where
+        remove_mask is True.
+
+        The index of the elements to keep is computed once and shared by all
+        arrays. Elements in front of the first removed one don't move, so
+        only the tail of each array is shifted down within its own storage.
+        '''
+        first = np.argmax(remove_mask)
+        keep = np.flatnonzero(~remove_mask[first:]) + first
+        num_keep = first + len(keep)
+
+        for key in self._array_types:
+            data = self._data_arrays[key]
+            data[first:num_keep] = data[keep]
+            self._data_arrays[key] = data[:num_keep]
 
     def __str__(self):
         return ('gnome.spill_container.SpillContainer\n'
@@ -1101,17 +1385,22 @@ class SpillContainerPair(SpillContainerPairData):
     Container holds two SpillContainers, one contains the certain spills while
     the other contains uncertainty spills if model uncertainty is on.
     """
-    def __init__(self, uncertain=False):
+    def __init__(self, uncertain=False,
+                 removal_interval=1, removal_fraction=None):
         """
         initialize object:
         init spill_container, _uncertain and u_spill_container if uncertain
 
+        :param removal_interval=1, removal_fraction=None: when the elements
+            marked to_be_removed are dropped -- see SpillContainer
+
         Note: all operations like add, remove, replace and __iter__ are exposed
         to user for the spill_container.spills OrderedCollection
         """
-        sc = SpillContainer()
+        sc = SpillContainer(removal_interval=removal_interval,
+                            removal_fraction=removal_fraction)
         if uncertain:
-            u_sc = SpillContainer(uncertain=True)
+            u_sc = sc.uncertain_copy()
         else:
             u_sc = None
 
@@ -1149,6 +1438,24 @@ class SpillContainerPair(SpillContainerPairData):
             self._uncertain = value
             self._u_spill_container = self._spill_container.uncertain_copy()
 
+    @property
+    def removal_interval(self):
+        return self._spill_container.removal_interval
+
+    @removal_interval.setter
+    def removal_interval(self, value):
+        for sc in self.items():
+            sc.removal_interval = value
+
+    @property
+    def removal_fraction(self):
+        return self._spill_container.removal_fraction
+
+    @removal_fraction.setter
+    def removal_fraction(self, value):
+        for sc in self.items():
+            sc.removal_fraction = value
+
     def _add_spill_pair(self, pair_tuple):
         'add both certain and uncertain spills given as a pair'
         if self.uncertain and len(pair_tuple) != 2:
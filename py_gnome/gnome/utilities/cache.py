@@ -10,12 +10,15 @@ import os
 import warnings
 import tempfile
 import shutil
-import copy
 from multiprocessing import Lock
+import threading
+import queue
 import atexit
+from collections import OrderedDict
 
 import numpy as np
 
+from gnome.basic_types import oil_status
 from gnome.spill_container import (SpillContainerData,
                                    SpillContainerPairData)
 
@@ -55,6 +58,286 @@ def clean_up_cache(dir_name=_cache_dir):
         warnings.warn(repr(excp))
 
 
+def _write_step_data(filename, data, file_format='npz'):
+    """
+    Write one step of element data to disk
+
+    :param filename: file (npz) or directory (npy) to write to
+    :param data: dict of arrays to write
+    :param file_format='npz': 'npz' writes a single (uncompressed) zip
+                              container, 'npy' writes one .npy file per array
+                              in the filename directory, so arrays can be
+                              memory-mapped when loaded.
+    """
+    if file_format == 'npz':
+        np.savez(filename, **data)
+    else:
+        os.mkdir(filename)
+        for name, array in data.items():
+            np.save(os.path.join(filename, name + '.npy'), array)
+
+
+def _keys_to_load(keys, array_names, load):
+    """
+    names of the arrays to load for one step: all of them if array_names is
+    None, else the ones in array_names plus the time stamp and mass balance
+    data that go with every step.
+
+    :param keys: names of all the arrays stored for the step
+    :param load: function that returns the stored array of a given name
+    """
+    if array_names is None:
+        return list(keys)
+
+    wanted = set(array_names)
+    wanted.update(('current_time_stamp', 'mass_balance'))
+
+    if 'mass_balance' in keys:
+        wanted.update(load('mass_balance'))
+
+    return [k for k in keys if k in wanted]
+
+
+def _recent_step(step_data, copy=False, array_names=None):
+    """
+    The (data, uncertain data) dicts of a step kept in memory, for
+    ElementCache._make_pair
+
+    They are shallow copies of the dicts, because the current_time_stamp and
+    mass_balance are popped out of them. The arrays themselves are shared,
+    unless copy is True.
+    """
+    step_data = [None if d is None else
+                 {k: d[k] for k in _keys_to_load(d.keys(), array_names, d.get)}
+                 for d in step_data]
+
+    if copy:
+        step_data = [None if d is None else
+                     {k: np.array(v) for k, v in d.items()}
+                     for d in step_data]
+
+    return step_data
+
+
+def _read_step_data(filename, file_format='npz', array_names=None):
+    """
+    Read one step of element data written by _write_step_data
+
+    Arrays stored as .npy files are memory-mapped read-only where possible.
+
+    :param array_names=None: names of the element arrays to read. If None,
+                             all of them are read.
+
+    :raises IOError: if the data is not there
+    """
+    if file_format == 'npz':
+        with np.load(filename, allow_pickle=True) as npz:
+            return {k: npz[k]
+                    for k in _keys_to_load(npz.files, array_names,
+                                           npz.__getitem__)}
+
+    def load(name):
+        path = os.path.join(filename, name + '.npy')
+        try:
+            return np.load(path, mmap_mode='r')
+        except ValueError:
+            # object arrays (current_time_stamp) can't be memory-mapped
+            return np.load(path, allow_pickle=True)
+
+    keys = [os.path.splitext(fname)[0] for fname in os.listdir(filename)]
+
+    return {k: load(k) for k in _keys_to_load(keys, array_names, load)}
+
+
+class _Column(object):
+    """
+    One element array of a _ColumnarStore: a flat binary file that the rows
+    of every step are appended to.
+    """
+    def __init__(self, filename, dtype, row_shape):
+        self.filename = filename
+        self.dtype = dtype
+        self.row_shape = row_shape
+        self.num_rows = 0
+
+        self._file = open(filename, 'ab')
+        self._map = None
+
+    def append(self, array):
+        'append the rows of array, returns the index of the first one'
+        start = self.num_rows
+
+        np.ascontiguousarray(array, dtype=self.dtype).tofile(self._file)
+        self.num_rows += len(array)
+
+        return start
+
+    def rows(self, start, count):
+        'memory-mapped, read-only view of count rows starting at start'
+        if count == 0:
+            return np.empty((0,) + self.row_shape, dtype=self.dtype)
+
+        if self._map is None or len(self._map) < start + count:
+            # the file has grown since it was mapped
+            self._file.flush()
+            self._map = np.memmap(self.filename, dtype=self.dtype, mode='r',
+                                  shape=(self.num_rows,) + self.row_shape)
+
+        return self._map[start:start + count]
+
+    def close(self):
+        self._file.close()
+        self._map = None
+
+
+class _ColumnarStore(object):
+    """
+    On-disk store for the element data of every step of one spill container.
+
+    Each element array is a column file the data of every step is appended
+    to. Like the ragged arrays NetCDFOutput writes with particle_count, an
+    index of where each step starts in the columns is all that's needed to
+    find a step. Loading a step returns slices of memory-mapped columns, so
+    only the arrays and rows that are actually used get read from disk.
+    """
+    def __init__(self, dir_name):
+        self.dir_name = dir_name
+        if not os.path.isdir(dir_name):
+            os.makedirs(dir_name)
+
+        self._columns = {}
+
+        # step_num -> (number of elements,
+        #              {array name: first row in column},
+        #              {name: the step's other (not per-element) data})
+        self._index = {}
+
+    def __contains__(self, step_num):
+        return step_num in self._index
+
+    def append(self, step_num, data, element_names):
+        """
+        add the data for a step
+
+        :param data: dict of all the arrays for the step
+        :param element_names: names of the arrays in data that hold one row
+                              per element -- the rest is kept in the index
+        """
+        num_elements = 0
+        starts = {}
+
+        for name in element_names:
+            array = data[name]
+            column = self._columns.get(name)
+
+            if column is None:
+                column = _Column(os.path.join(self.dir_name, name + '.bin'),
+                                 array.dtype, array.shape[1:])
+                self._columns[name] = column
+            elif column.row_shape != array.shape[1:]:
+                raise CacheError('shape of {0} array changed during the run'
+                                 .format(name))
+
+            starts[name] = column.append(array)
+            num_elements = len(array)
+
+        other = {k: v for k, v in data.items() if k not in starts}
+        self._index[step_num] = (num_elements, starts, other)
+
+    def load(self, step_num, array_names=None):
+        """
+        the data for a step -- the element arrays are memory-mapped views
+
+        :param array_names=None: names of the element arrays to return. If
+                                 None, all of them are returned.
+        """
+        num_elements, starts, other = self._index[step_num]
+
+        data = dict(other)
+        for name, start in starts.items():
+            if array_names is None or name in array_names:
+                data[name] = self._columns[name].rows(start, num_elements)
+
+        return data
+
+    def close(self):
+        for column in self._columns.values():
+            column.close()
+
+
+def _cache_writer(write_queue, errors):
+    """
+    Loop run by the background writer threads of an ElementCache
+
+    Takes (filename, data, file_format) off write_queue until it gets None.
+    Exceptions are put in the errors list so the ElementCache can raise them
+    in the model thread.
+
+    This is a function rather than a method so the threads don't keep the
+    ElementCache alive.
+    """
+    while True:
+        item = write_queue.get()
+        try:
+            if item is None:
+                return
+
+            _write_step_data(*item)
+        except Exception as excp:
+            errors.append(excp)
+        finally:
+            write_queue.task_done()
+
+
+class CachedStep(object):
+    """
+    One step of an ElementCache, that can be used in place of the cache by an
+    outputter writing the step while the model goes on -- the cache is not
+    thread safe, and may drop the step from memory.
+
+    It has the parts of the cache the outputters use: load_timestep() for
+    the step, and recent (which the surface concentration is added to).
+    The arrays are the read-only snapshots shared by the cache, so it is
+    cheap to make.
+    """
+    def __init__(self, step_num, step_data):
+        """
+        :param step_num: the step number of the data
+        :param step_data: the [data, uncertain data] dicts kept by the cache
+        """
+        self.step_num = step_num
+        self.recent = {step_num: [None if d is None else dict(d)
+                                  for d in step_data]}
+
+        # True if the model computed the surface concentration for the
+        # outputter writing the step
+        self.surface_conc_computed = False
+
+    def with_surface_concentration(self, surface_concentration):
+        """
+        A CachedStep of the same step, with the surface concentration of
+        the (certain) elements
+        """
+        step = CachedStep(self.step_num, self.recent[self.step_num])
+        step.recent[self.step_num][0]['surface_concentration'] = \
+            surface_concentration
+        step.surface_conc_computed = True
+
+        return step
+
+    def load_timestep(self, step_num, copy=False, array_names=None):
+        """
+        Returns a SpillContainerPairData with the data of the step -- as
+        ElementCache.load_timestep does
+        """
+        if step_num != self.step_num:
+            raise CacheError('step: {0} is not in the cached step {1}'
+                             .format(step_num, self.step_num))
+
+        return ElementCache._make_pair(*_recent_step(self.recent[step_num],
+                                                     copy, array_names))
+
+
 # need to clean up temp directories at exit:
 # this will clean up the master temp dir, and anything in it if
 # something went wrong with __del__ in the individual objects
@@ -72,7 +355,9 @@ class ElementCache(object):
           the _cache_dir at the whim of the GC.
           We may want to manage this differently.
     """
-    def __init__(self, cache_dir=None, enabled=True):
+    def __init__(self, cache_dir=None, enabled=True,
+                 num_writers=0, max_queue_size=4, file_format='npz',
+                 recent_steps=1, recent_bytes=None, spill_to_disk=False):
         """
         initialize a new cache object
 
@@ -80,24 +365,136 @@ class ElementCache(object):
                                should be stored.
                                If not provided, a temp dir will be created by
                                the python tempfile module
+        :param num_writers=0: number of background threads writing the disk
+                              cache. If 0, steps are written in save_timestep.
+        :param max_queue_size=4: number of steps that can be waiting to be
+                                 written before save_timestep blocks.
+        :param file_format='npz': 'npz' to write one zip container per step,
+                                  'npy' to write one .npy file per array, so
+                                  arrays are memory-mapped when loaded.
+                                  'columnar' to append every step to one
+                                  memory-mapped file per array, for fast
+                                  random access to any step and array.
+                                  Columnar writes are not done in the
+                                  background writers, as they must be in
+                                  order.
+        :param recent_steps=1: number of the most recently used steps to keep
+                               in memory.
+        :param recent_bytes=None: if given, least recently used steps are
+                                  also dropped from memory once the steps
+                                  kept use more than this many bytes. The
+                                  newest step is always kept.
+        :param spill_to_disk=False: if the disk cache is not enabled, write
+                                    steps dropped from memory to disk, so
+                                    they can still be loaded.
         """
+        if file_format not in ('npz', 'npy', 'columnar'):
+            raise ValueError('file_format must be "npz", "npy" or '
+                             '"columnar", not {0}'.format(file_format))
+
+        if recent_steps < 1:
+            raise ValueError('recent_steps must be at least 1')
+
+        if num_writers < 0:
+            raise ValueError('num_writers can not be negative')
+
         self.create_new_dir(cache_dir)
 
-        # dict to hold recent data so we don't need to pull from the
-        # file system
-        self.recent = {}
+        # LRU of recent data so we don't need to pull from the
+        # file system: step_num -> [data, uncertain data]
+        self.recent = OrderedDict()
+        self.recent_steps = recent_steps
+        self.recent_bytes = recent_bytes
+        self.spill_to_disk = spill_to_disk
+
+        # step_num -> bytes used by the step in self.recent
+        self._recent_nbytes = {}
+        self._reset_stats()
 
         # flag for whether to enable disk cache
         self.enabled = enabled
 
+        self.num_writers = num_writers
+        self.file_format = file_format
+
+        self._write_queue = queue.Queue(maxsize=max_queue_size)
+        self._write_errors = []
+        self._writers = []
+
+        # _ColumnarStore for the forecast (False) and uncertain (True) data
+        self._stores = {}
+
         self.lock = Lock()
 
     def __del__(self):
         'Clear out the cache when this object is deleted'
+        self._stop_writers()
+        self._close_stores()
+
         with self.lock:
             if os.path.isdir(self._cache_dir):
                 shutil.rmtree(self._cache_dir)
 
+    def _start_writers(self):
+        'start the background writer threads if they are not running'
+        while len(self._writers) < self.num_writers:
+            writer = threading.Thread(target=_cache_writer,
+                                      args=(self._write_queue,
+                                            self._write_errors),
+                                      daemon=True)
+            writer.start()
+            self._writers.append(writer)
+
+    def _stop_writers(self):
+        'wait for pending writes and stop the background writer threads'
+        for _writer in self._writers:
+            self._write_queue.put(None)
+
+        for writer in self._writers:
+            writer.join()
+
+        self._writers = []
+
+    def _get_store(self, uncertain):
+        'the _ColumnarStore for the forecast or uncertain data'
+        if uncertain not in self._stores:
+            dir_name = os.path.join(self._cache_dir,
+                                    'uncert' if uncertain else 'forecast')
+            self._stores[uncertain] = _ColumnarStore(dir_name)
+
+        return self._stores[uncertain]
+
+    def _close_stores(self):
+        for store in self._stores.values():
+            store.close()
+
+        self._stores = {}
+
+    def flush(self):
+        """
+        Block until all the steps queued for the background writers are on
+        disk.
+
+        :raises CacheError: if writing any step failed
+        """
+        if self._writers:
+            self._write_queue.join()
+
+        self._check_write_errors()
+
+    def _check_write_errors(self):
+        'raise a CacheError if a background write failed'
+        if self._write_errors:
+            excp = self._write_errors[0]
+            del self._write_errors[:]
+
+            raise CacheError('writing the element cache failed: {0!r}'
+                             .format(excp)) from excp
+
+    def post_model_run(self):
+        'make sure everything is written at the end of a model run'
+        self.flush()
+
     def _make_filename(self, step_num, uncertain=False):
         """
         Returns a filename of the temp file generated from step_num
@@ -106,12 +503,14 @@ class ElementCache(object):
 
         This here so that loading and saving use the same code
         """
+        ext = '.npz' if self.file_format == 'npz' else ''
+
         if uncertain:
             return os.path.join(self._cache_dir,
-                                'step_%06i_uncert.npz' % step_num)
+                                'step_%06i_uncert%s' % (step_num, ext))
         else:
             return os.path.join(self._cache_dir,
-                                'step_%06i.npz' % step_num)
+                                'step_%06i%s' % (step_num, ext))
 
     def create_new_dir(self, cache_dir=None):
         if cache_dir is None:
@@ -124,11 +523,27 @@ class ElementCache(object):
         """
         add a time step of data to the cache
 
+        The data arrays are copied once, and the copies are made read-only so
+        they can be shared by everything that loads this step.
+
+        Elements marked to_be_removed are left out: the SpillContainer may
+        keep them in its arrays for a few steps (removal_interval), but they
+        are gone from the model, so they are not output.
+
+        If there are background writers, the disk write is queued and this
+        only blocks if the queue is full. Errors from earlier queued writes
+        are raised here.
+
         :param step_num: the step number of the data
         :param spill_container: the spill container at this step
         """
+        self._check_write_errors()
+
         for sc in spill_container_pair.items():
-            data = copy.deepcopy(sc.data_arrays)
+            keep = self._elements_to_keep(sc.data_arrays)
+
+            data = {name: self._snapshot(array, keep)
+                    for name, array in sc.data_arrays.items()}
 
             self._set_weathering_data(sc, data)
 
@@ -140,55 +555,165 @@ class ElementCache(object):
             if sc.uncertain:
                 self.recent[step_num][1] = data
             else:
-                # this creates a new dict, so only one step is saved
-                self.recent = {step_num: [data, None]}
+                self.recent.pop(step_num, None)
+                self.recent[step_num] = [data, None]
+                self._recent_nbytes[step_num] = 0
+
+            self._recent_nbytes[step_num] += sum(a.nbytes
+                                                 for a in data.values())
 
-            # write the data if enabled
-            # could be threaded -- data is a copy, so doesn't need to be
-            #                      re-used by anything
             if self.enabled:
-                filename = self._make_filename(step_num, sc.uncertain)
-                np.savez(filename, **data)
+                self._write_step(step_num, data, sc.uncertain,
+                                 sc.data_arrays.keys())
+
+        self._evict_recent()
+
+    def _write_step(self, step_num, data, uncertain, element_names):
+        'write the data for a step to the disk cache'
+        filename = self._make_filename(step_num, uncertain)
+
+        # data is a copy, so doesn't need to be re-used by anything,
+        # but outputters may add arrays to the dict, so pass on a copy
+        if self.file_format == 'columnar':
+            self._get_store(uncertain).append(step_num, data, element_names)
+        elif self.num_writers > 0:
+            self._start_writers()
+            self._write_queue.put((filename, dict(data), self.file_format))
+        else:
+            _write_step_data(filename, data, self.file_format)
+
+    def _evict_recent(self):
+        """
+        drop the least recently used steps from memory until there are no
+        more than recent_steps, using no more than recent_bytes.
+
+        Dropped steps are written to disk if spill_to_disk is set and they
+        aren't there already.
+        """
+        while len(self.recent) > 1:
+            nbytes = sum(self._recent_nbytes.values())
+
+            if (len(self.recent) <= self.recent_steps and
+                    (self.recent_bytes is None or
+                     nbytes <= self.recent_bytes)):
+                break
+
+            step_num, step_data = self.recent.popitem(last=False)
+            del self._recent_nbytes[step_num]
+            self.stats['evictions'] += 1
+
+            if self.spill_to_disk and not self.enabled:
+                for uncertain, data in zip((False, True), step_data):
+                    if data is not None:
+                        self._write_step(step_num, data, uncertain,
+                                         self._element_names(data))
+
+                self.stats['spilled'] += 1
 
-    def load_timestep(self, step_num):
+    @staticmethod
+    def _element_names(data):
+        'names of the per-element arrays in the data saved for a step'
+        other = {'current_time_stamp', 'mass_balance'}
+        if 'mass_balance' in data:
+            other.update(data['mass_balance'])
+
+        return [k for k in data if k not in other]
+
+    def _reset_stats(self):
+        """
+        statistics for the in-memory LRU:
+          hits: steps loaded from memory
+          misses: steps that had to be loaded from disk (or weren't there)
+          evictions: steps dropped from memory
+          spilled: dropped steps that were written to disk
+        """
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'spilled': 0}
+
+    @staticmethod
+    def _elements_to_keep(data_arrays):
+        '''
+        boolean mask of the elements not marked to_be_removed -- None if
+        they are all kept
+        '''
+        status_codes = data_arrays.get('status_codes')
+
+        if status_codes is None:
+            return None
+
+        keep = status_codes != oil_status.to_be_removed
+
+        return None if keep.all() else keep
+
+    @staticmethod
+    def _snapshot(array, keep=None):
+        '''
+        a read-only copy of a data array
+
+        :param keep=None: boolean mask of the elements to copy -- all of them
+                          if None
+        '''
+        snapshot = np.array(array) if keep is None else array[keep]
+        snapshot.flags.writeable = False
+
+        return snapshot
+
+    def load_timestep(self, step_num, copy=False, array_names=None):
         """
         Returns a SpillContainer with the data arrays cached on disk
 
+        Data for the most recent step is not copied: the arrays are the
+        read-only snapshot taken in save_timestep, shared by all callers.
+
         :param step_num: the step number you want to load.
+        :param copy=False: if True, return writeable copies of the arrays the
+                           caller is free to modify.
+        :param array_names=None: names of the data arrays to load. If None,
+                                 all of them are loaded. The time stamp and
+                                 mass balance are always loaded.
         """
         # look first in in-memory cache.
         try:
-            # make a copy because we pop out the current_time_stamp
-            # make these changes to the copy so the self.recent does not change
-
-            (data_arrays, u_data_arrays) = copy.deepcopy(self.recent[step_num])
-
-            # copy.deepcopy(self.recent[step_num]) converts
-            # 'current_time_stamp' to datetime object
-            # To be consistent with np.load() operation below,
-            # make this an array.
-            if 'current_time_stamp' in data_arrays:
-                data_arrays['current_time_stamp'] = \
-                    np.array(data_arrays['current_time_stamp'])
-                if u_data_arrays:
-                    u_data_arrays['current_time_stamp'] = \
-                        np.array(u_data_arrays['current_time_stamp'])
+            (data_arrays, u_data_arrays) = _recent_step(self.recent[step_num],
+                                                        copy, array_names)
         except KeyError:
             # not in the recent dict: try to load from disk
+            self.stats['misses'] += 1
+
+            # the step may still be waiting for a background writer
+            self.flush()
+
             try:
-                data_arrays = dict(np.load(self._make_filename(step_num),
-                                           allow_pickle=True))
+                data_arrays = self._read_step(step_num, False, array_names)
             except IOError:
                 raise CacheError('step: {0} is not in the cache'
                                  .format(step_num))
 
             try:
-                u_data_arrays = dict(np.load(self._make_filename(step_num,
-                                                                 True),
-                                             allow_pickle=True))
+                u_data_arrays = self._read_step(step_num, True, array_names)
             except IOError:
                 u_data_arrays = None
+        else:
+            self.stats['hits'] += 1
+            self.recent.move_to_end(step_num)
+
+        return self._make_pair(data_arrays, u_data_arrays)
 
+    def step_snapshot(self, step_num):
+        """
+        A CachedStep with the data of a step, for an outputter writing it in
+        another thread while the model goes on.
+
+        Call it after save_timestep(step_num) -- the newest step is always
+        in memory.
+        """
+        return CachedStep(step_num, self.recent[step_num])
+
+    @classmethod
+    def _make_pair(cls, data_arrays, u_data_arrays):
+        """
+        SpillContainerPairData of the data of a step -- the dicts are used
+        for the spill containers' data arrays
+        """
         # HOWEVER, loading numpy arrays
         #     data_arrays = dict(np.load(self._make_filename(step_num)))
         # converts current_time_stamp to numpy.ndarray objects
@@ -196,7 +721,7 @@ class ElementCache(object):
         if 'current_time_stamp' in data_arrays:
             current_time_stamp = data_arrays.pop('current_time_stamp').item()
 
-        weathering_data = self._get_weathering_data(data_arrays)
+        weathering_data = cls._get_weathering_data(data_arrays)
         sc = SpillContainerData(data_arrays)
         sc.mass_balance = weathering_data
         if current_time_stamp:
@@ -210,7 +735,7 @@ class ElementCache(object):
                 current_time_stamp = \
                     u_data_arrays.pop('current_time_stamp').item()
 
-            u_weathering_data = self._get_weathering_data(u_data_arrays)
+            u_weathering_data = cls._get_weathering_data(u_data_arrays)
             u_sc = SpillContainerData(u_data_arrays, uncertain=True)
             u_sc.mass_balance = u_weathering_data
 
@@ -221,6 +746,20 @@ class ElementCache(object):
 
         return scp
 
+    def _read_step(self, step_num, uncertain, array_names=None):
+        'read the data for a step from disk -- IOError if it is not there'
+        if self.file_format == 'columnar':
+            store = self._stores.get(uncertain)
+
+            if store is None or step_num not in store:
+                raise IOError('step {0} is not in the columnar cache'
+                              .format(step_num))
+
+            return store.load(step_num, array_names)
+
+        return _read_step_data(self._make_filename(step_num, uncertain),
+                               self.file_format, array_names)
+
     def _set_weathering_data(self, sc, data):
         'add mass balance data to arrays'
         if sc.mass_balance:
@@ -231,7 +770,8 @@ class ElementCache(object):
             for key in data['mass_balance']:
                 data[key] = np.asarray(sc.mass_balance[key])
 
-    def _get_weathering_data(self, data_arrays):
+    @staticmethod
+    def _get_weathering_data(data_arrays):
         mb_data = {}
         if 'mass_balance' in data_arrays:
             mb_names = data_arrays.pop('mass_balance')
@@ -243,7 +783,17 @@ class ElementCache(object):
     def rewind(self):
         'Rewinds the cache -- clearing out everything'
         # clean out the in-memory cache
-        self.recent = {}
+        self.recent = OrderedDict()
+        self._recent_nbytes = {}
+        self._reset_stats()
+
+        # let pending writes finish -- the data is being thrown away, so
+        # errors writing it don't matter any more
+        if self._writers:
+            self._write_queue.join()
+        del self._write_errors[:]
+
+        self._close_stores()
 
         # clean out the disk cache
         if os.path.isdir(self._cache_dir):
@@ -31,6 +31,9 @@ class Weatherer(Process):
     '''
     _schema = WeathererSchema  # nothing new added so use this schema
 
+    # EnvironmentSampler shared with the other weatherers -- set by the model
+    _sampler = None
+
     def __init__(self, **kwargs):
         '''
         Base weatherer class; defines the API for all weatherers
@@ -108,7 +111,15 @@ class Weatherer(Process):
                        coord_sys='r', fill_value=1.0):
         '''
             Wrapper for the weatherers so they can get wind speeds
+
+            If the weatherer has a sampler, the speeds are shared with the
+            other weatherers, and are read-only.
         '''
+        if self._sampler is not None:
+            return self._sampler.at(self.wind, points, model_time,
+                                    coord_sys=coord_sys,
+                                    fill_value=fill_value)
+
         retval = self.wind.at(points, model_time, coord_sys=coord_sys)
 
         if isinstance(retval, np.ma.MaskedArray):
@@ -92,10 +92,12 @@ class NaturalDispersion(Weatherer):
                 continue
             points = data['positions']
             # from the waves module
+            # (copied: they may be shared, read-only arrays, and
+            # disperse_oil needs writeable buffers)
             waves_values = self.waves.get_value(points, model_time)
-            wave_height = waves_values[0]
-            frac_breaking_waves = waves_values[2]
-            disp_wave_energy = waves_values[3]
+            wave_height = np.array(waves_values[0], dtype=np.float64)
+            frac_breaking_waves = np.array(waves_values[2], dtype=np.float64)
+            disp_wave_energy = np.array(waves_values[3], dtype=np.float64)
 
             visc_w = self.waves.water.kinematic_viscosity
             rho_w = self.waves.water.density
@@ -25,6 +25,64 @@ PI = np.pi
 PISQUARED = np.pi ** 2
 
 
+class BlobTable(object):
+    '''
+    The blobs of oil being spread.  The LEs released together from a spill
+    spread as one blob; each LE keeps the index of its blob in its
+    'blob_num'.  Blobs are added as LEs are released, so they don't have to
+    be found again each step.
+    '''
+    def __init__(self):
+        # the spill each blob was released from
+        self.spill_num = np.zeros((0,), dtype=np.int32)
+
+    def __len__(self):
+        return len(self.spill_num)
+
+    def add(self, spill_num):
+        '''
+        add a blob released from spill_num
+
+        :returns: the index of the new blob
+        '''
+        self.spill_num = np.append(self.spill_num, np.int32(spill_num))
+
+        return len(self.spill_num) - 1
+
+    def add_existing(self, blob_num, spill_num):
+        '''
+        add the blobs LEs are in that are not in the table -- those of a
+        model loaded in the middle of a run -- so new blobs go after them
+
+        :param blob_num: blob index of each LE (-1 if not in a blob)
+        :param spill_num: spill index of each LE
+        '''
+        missing = blob_num >= len(self)
+        if not np.any(missing):
+            return
+
+        table = np.zeros((blob_num.max() + 1,), dtype=np.int32)
+        table[:len(self)] = self.spill_num
+        table[blob_num[missing]] = spill_num[missing]
+
+        self.spill_num = table
+
+
+def blob_values(blobs, values, num_blobs):
+    '''
+    value of each blob: that of its first LE (0 for blobs with no LEs)
+
+    :param blobs: blob index of each LE
+    :param values: array of a value for each LE
+    :param num_blobs: number of blobs
+    '''
+    out = np.zeros((num_blobs,), dtype=np.float64)
+    # the last assignment to an index wins, so assign in reverse
+    out[blobs[::-1]] = values[::-1]
+
+    return out
+
+
 class FayGravityViscousSchema(WeathererSchema):
     thickness_limit = SchemaNode(Float(), missing=drop, save=True, update=True)
     water = WaterSchema(save=True, update=True)
@@ -62,12 +120,16 @@ class FayGravityViscous(Weatherer):
                                  'age': gat('age'),
                                  'density': gat('density'),
                                  'frac_coverage': gat('frac_coverage'),
-                                 'spill_num': gat('spill_num')})
+                                 'spill_num': gat('spill_num'),
+                                 'blob_num': gat('blob_num')})
         # relative_buoyancy - use density at release time. For now
         # temperature is fixed so just compute once and store. When temperature
         # varies over time, may want to do something different
         self._init_relative_buoyancy = None
         self.thickness_limit = thickness_limit
+
+        # BlobTable of each spill container, by id -- (sc, table)
+        self._blob_tables = {}
         # self.is_first_step = True
 
     @staticmethod
@@ -81,6 +143,19 @@ class FayGravityViscous(Weatherer):
         depends on blob volume, but is on the order of minutes. Cache up to 10
         inputs - don't expect 10 or more spills in one scenario.
         '''
+        return FayGravityViscous._spreading_t0(water_viscosity,
+                                               relative_buoyancy,
+                                               blob_init_vol,
+                                               spreading_const)
+
+    @staticmethod
+    def _spreading_t0(water_viscosity,
+                      relative_buoyancy,
+                      blob_init_vol,
+                      spreading_const):
+        '''
+        _gravity_spreading_t0, not cached, so blob_init_vol can be an array
+        '''
         # time to reach a0
         t0 = ((spreading_const[1] / spreading_const[0]) ** 4.0 *
               (blob_init_vol / (water_viscosity * constants.gravity *
@@ -158,7 +233,8 @@ class FayGravityViscous(Weatherer):
                     relative_buoyancy,
                     blob_init_volume,
                     area,
-                    age):
+                    age,
+                    blobs=None):
         '''
         update area array in place, also return area array
         each blob is defined by its age. This updates the area of each blob,
@@ -185,6 +261,9 @@ class FayGravityViscous(Weatherer):
             This is the age of each LE. The LEs with the same age belong to
             the same blob. Age is in seconds.
         :type age: numpy array of int32
+        :param blobs=None: index of the blob of each LE. If None, the LEs
+            with the same age are a blob.
+        :type blobs: numpy array of ints
         :param at_max_area: bool array. If a blob reaches max_area beyond
             which it will not spread, toggle the LEs associated with that blob
             to True. Max spreading is based on min thickness based on initial
@@ -201,40 +280,22 @@ class FayGravityViscous(Weatherer):
             msg = "use init_area for age == 0"
             raise ValueError(msg)
 
-        # update area for each blob of LEs
-        for b_age in np.unique(age):
-            # within each age blob_init_volume should also be the same
-            m_age = b_age == age
-            t0 = self._gravity_spreading_t0(water_viscosity,
-                                            relative_buoyancy,
-                                            blob_init_volume[m_age][0],
-                                            self.spreading_const)
-
-            if b_age <= t0:
-                '''
-                only update initial area, A_0, if age is past the transient
-                phase. Expect this to be the case since t0 is on the order of
-                minutes; but do a check in case we want to experiment with
-                smaller timesteps.
-                '''
-                continue
+        blobs, spreading = self._spreading_blobs(water_viscosity,
+                                                 relative_buoyancy,
+                                                 blob_init_volume,
+                                                 area,
+                                                 age,
+                                                 blobs)
+        if len(spreading['index']) == 0:
+            return area
 
-            # now update area of old LEs - only update till max area is reached
-            max_area = blob_init_volume[m_age][0] / self.thickness_limit
-            if area[m_age].sum() < max_area:
-                # update area
-                blob_area = self._update_blob_area(water_viscosity,
-                                                   relative_buoyancy,
-                                                   blob_init_volume[m_age][0],
-                                                   age[m_age][0])
-
-                if blob_area >= max_area:
-                    area[m_age] = max_area / m_age.sum()
-                else:
-                    area[m_age] = blob_area / m_age.sum()
+        # now update area of old LEs - only update till max area is reached
+        blob_area = self._update_blob_area(water_viscosity,
+                                           relative_buoyancy,
+                                           spreading['init_volume'],
+                                           spreading['age'])
 
-                self.logger.debug('{0}\tarea after update: {1}'
-                                  .format(self._pid, blob_area))
+        self._set_blob_area(area, blobs, spreading, blob_area)
 
         return area
 
@@ -244,7 +305,8 @@ class FayGravityViscous(Weatherer):
                      blob_init_volume,
                      area,
                      time_step,
-                     age):
+                     age,
+                     blobs=None):
         '''
         update area array in place, also return area array
         each blob is defined by its age. This updates the area of each blob,
@@ -271,6 +333,9 @@ class FayGravityViscous(Weatherer):
             This is the age of each LE. The LEs with the same age belong to
             the same blob. Age is in seconds.
         :type age: numpy array of int32
+        :param blobs=None: index of the blob of each LE. If None, the LEs
+            with the same age are a blob.
+        :type blobs: numpy array of ints
         :param at_max_area: bool array. If a blob reaches max_area beyond
             which it will not spread, toggle the LEs associated with that blob
             to True. Max spreading is based on min thickness based on initial
@@ -287,56 +352,107 @@ class FayGravityViscous(Weatherer):
             msg = "use init_area for age == 0"
             raise ValueError(msg)
 
-        # update area for each blob of LEs
-        for b_age in np.unique(age):
-            # within each age blob_init_volume should also be the same
-            m_age = b_age == age
-            t0 = self._gravity_spreading_t0(water_viscosity,
-                                            relative_buoyancy,
-                                            blob_init_volume[m_age][0],
-                                            self.spreading_const)
-
-            if b_age <= t0:
-                '''
-                only update initial area, A_0, if age is past the transient
-                phase. Expect this to be the case since t0 is on the order of
-                minutes; but do a check in case we want to experiment with
-                smaller timesteps.
-                '''
-                continue
-
-            # now update area of old LEs - only update till max area is reached
-            max_area = blob_init_volume[m_age][0] / self.thickness_limit
-            if area[m_age].sum() < max_area:
+        blobs, spreading = self._spreading_blobs(water_viscosity,
+                                                 relative_buoyancy,
+                                                 blob_init_volume,
+                                                 area,
+                                                 age,
+                                                 blobs)
+        if len(spreading['index']) == 0:
+            return area
 
-                C = (PI *
-                    self.spreading_const[1] ** 2 *
-                    (blob_init_volume[m_age][0] ** 2 *
-                    constants.gravity *
-                    relative_buoyancy /
-                    np.sqrt(water_viscosity)) ** (1. / 3.))
+        # now update area of old LEs - only update till max area is reached
+        C = (PI *
+             self.spreading_const[1] ** 2 *
+             (spreading['init_volume'] ** 2 *
+              constants.gravity *
+              relative_buoyancy /
+              np.sqrt(water_viscosity)) ** (1. / 3.))
 
-                #blob_area_fgv = area[m_age].sum() + .5 * (C**2 / area[m_age].sum()) * time_step	# make sure area > 0
-                blob_area_fgv = .5 * (C**2 / area[m_age].sum()) * time_step	# make sure area > 0
+        old_area = spreading['area']
 
-                K = 4 * PI * 2 * .033
+        blob_area_fgv = .5 * (C**2 / old_area) * time_step	# make sure area > 0
 
-                #blob_area_diffusion = area[m_age].sum() + ((7 / 6) * K * (area[m_age].sum() / K) ** (1 / 7)) * time_step
-                blob_area_diffusion = ((7. / 6.) * K * (area[m_age].sum() / K) ** (1. / 7.)) * time_step
+        K = 4 * PI * 2 * .033
 
-                #blob_area = blob_area_fgv + blob_area_diffusion
-                blob_area = area[m_age].sum() + blob_area_fgv + blob_area_diffusion
+        blob_area_diffusion = ((7. / 6.) * K * (old_area / K) ** (1. / 7.)) * time_step
 
-                if blob_area >= max_area:
-                    area[m_age] = max_area / m_age.sum()
-                else:
-                    area[m_age] = blob_area / m_age.sum()
+        blob_area = old_area + blob_area_fgv + blob_area_diffusion
 
-                self.logger.debug('{0}\tarea after update: {1}'
-                                  .format(self._pid, blob_area))
+        self._set_blob_area(area, blobs, spreading, blob_area)
 
         return area
 
+    def _spreading_blobs(self,
+                         water_viscosity,
+                         relative_buoyancy,
+                         blob_init_volume,
+                         area,
+                         age,
+                         blobs=None):
+        '''
+        Group the LEs into blobs, and find the blobs that are still spreading:
+        past the initial transient phase, and not yet at max area.
+
+        Each blob's initial volume and age are those of its first LE.
+
+        :returns: (blobs, spreading) -- blobs is the blob index of each LE,
+            from 0 (made from age if None was given). spreading is a dict of
+            arrays for the spreading blobs: 'index', 'init_volume', 'age',
+            'area' (the sum of the area of the LEs), 'max_area' and 'count'
+            (the number of LEs).
+        '''
+        if blobs is None:
+            # the LEs with the same age are a blob
+            _, blobs = np.unique(age, return_inverse=True)
+
+        blobs = np.asarray(blobs).reshape(-1)
+        num_blobs = blobs.max() + 1 if len(blobs) > 0 else 0
+
+        count = np.bincount(blobs, minlength=num_blobs)
+        b_area = np.bincount(blobs, weights=area, minlength=num_blobs)
+        b_init_volume = blob_values(blobs, blob_init_volume, num_blobs)
+        b_age = blob_values(blobs, age, num_blobs)
+
+        t0 = self._spreading_t0(water_viscosity,
+                                relative_buoyancy,
+                                b_init_volume,
+                                self.spreading_const)
+        max_area = b_init_volume / self.thickness_limit
+
+        # only update initial area, A_0, if age is past the transient phase.
+        # Expect this to be the case since t0 is on the order of minutes; but
+        # do a check in case we want to experiment with smaller timesteps.
+        index = np.flatnonzero((count > 0) & (b_age > t0) &
+                               (b_area < max_area))
+
+        spreading = {'index': index,
+                     'init_volume': b_init_volume[index],
+                     'age': b_age[index],
+                     'area': b_area[index],
+                     'max_area': max_area[index],
+                     'count': count[index]}
+
+        return blobs, spreading
+
+    def _set_blob_area(self, area, blobs, spreading, blob_area):
+        '''
+        Divide the new area of each spreading blob equally between its LEs,
+        up to the max area of the blob.  Changes area in place.
+        '''
+        blob_area = np.minimum(blob_area, spreading['max_area'])
+
+        # new area of each LE, by blob (nan for blobs not spreading)
+        le_area = np.full((blobs.max() + 1,), np.nan)
+        le_area[spreading['index']] = blob_area / spreading['count']
+
+        new = le_area[blobs]
+        updated = ~np.isnan(new)
+        area[updated] = new[updated]
+
+        self.logger.debug('{0}\tarea after update of {1} blobs: {2}'
+                          .format(self._pid, len(blob_area), blob_area))
+
     def _get_thickness_limit(self, vo):
         '''
         return the spreading thickness limit based on viscosity
@@ -376,6 +492,9 @@ class FayGravityViscous(Weatherer):
         # make it None so no stale data
         self._init_relative_buoyancy = None
 
+        # and the blobs
+        self._blob_tables.pop(id(sc), None)
+
         #self.is_first_step = True
 
     def _set_init_relative_buoyancy(self, substance):
@@ -440,8 +559,51 @@ class FayGravityViscous(Weatherer):
                 data['fay_area'][s_mask] = init_blob_area / num
                 data['area'][s_mask] = init_blob_area / num
 
+            self._add_to_blobs(sc, data, mask)
+
         sc.update_from_fatedataview()
 
+    def _blob_table(self, sc):
+        '''
+        the BlobTable of sc -- a new one if it does not have one yet
+        '''
+        if id(sc) not in self._blob_tables:
+            # keep sc too, so its id is not reused while the table is kept
+            self._blob_tables[id(sc)] = (sc, BlobTable())
+
+        return self._blob_tables[id(sc)][1]
+
+    def _add_to_blobs(self, sc, data, mask):
+        '''
+        Put the LEs in mask that are not in a blob yet into blobs: the LEs of
+        a spill with the same age are a blob.  They join the blob of the LEs
+        of that spill already there with the same age (released at the same
+        time step), or start a new one.
+        '''
+        blob_num = data['blob_num']
+        spill_num = data['spill_num']
+        age = data['age']
+
+        new = mask & (blob_num < 0)
+        if not np.any(new):
+            return
+
+        table = self._blob_table(sc)
+        table.add_existing(blob_num, spill_num)
+
+        # only a few blobs are added at a time -- usually one
+        for s_num in np.unique(spill_num[new]):
+            for b_age in np.unique(age[new & (spill_num == s_num)]):
+                same = (spill_num == s_num) & (age == b_age)
+                in_blob = same & (blob_num >= 0)
+
+                if np.any(in_blob):
+                    blob = blob_num[in_blob][0]
+                else:
+                    blob = table.add(s_num)
+
+                blob_num[same & new] = blob
+
     def weather_elements(self, sc, time_step, model_time):
         '''
         Update 'area', 'fay_area' for previously released particles
@@ -458,22 +620,25 @@ class FayGravityViscous(Weatherer):
             if len(data['fay_area']) == 0:
                 continue
 
-            for s_num in np.unique(data['spill_num']):
-                s_mask = data['spill_num'] == s_num
-                data['fay_area'][s_mask] = \
-                    self.update_area2(water_kvis,
-                                     self._init_relative_buoyancy,
-                                     data['bulk_init_volume'][s_mask],
-                                     data['fay_area'][s_mask],
-                                     time_step,
-                                     data['age'][s_mask] + time_step)
-    #                     self.update_area(water_kvis,
-    #                                      self._init_relative_buoyancy,
-    #                                      data['bulk_init_volume'][s_mask],
-    #                                      data['fay_area'][s_mask],
-    #                                      data['age'][s_mask] + time_step)
-
-                data['area'][s_mask] = data['fay_area'][s_mask]
+            # LEs not put in a blob when they were released
+            self._add_to_blobs(sc, data, data['blob_num'] < 0)
+
+            # all the blobs at once -- each spill has its own blobs
+            self.update_area2(water_kvis,
+                              self._init_relative_buoyancy,
+                              data['bulk_init_volume'],
+                              data['fay_area'],
+                              time_step,
+                              data['age'] + time_step,
+                              blobs=data['blob_num'])
+    #         self.update_area(water_kvis,
+    #                          self._init_relative_buoyancy,
+    #                          data['bulk_init_volume'],
+    #                          data['fay_area'],
+    #                          data['age'] + time_step,
+    #                          blobs=data['blob_num'])
+
+            data['area'][:] = data['fay_area']
 
         sc.update_from_fatedataview()
 
@@ -217,11 +217,16 @@ class WeatheringData(Weatherer):
         # avg_density, avg_viscosity applies to elements that are on the
         # surface and being weathered
 
-        if data['mass'].sum() > 0.0:
+        # elements waiting to be removed (see SpillContainer's
+        # removal_interval) are not in the water anymore
+        mass = np.where(data['status_codes'] == oil_status.to_be_removed,
+                        0.0, data['mass'])
+
+        if mass.sum() > 0.0:
             data.mass_balance['avg_density'] = \
-                np.sum(data['mass']/data['mass'].sum() * data['density'])
+                np.sum(mass/mass.sum() * data['density'])
             data.mass_balance['avg_viscosity'] = \
-                np.sum(data['mass']/data['mass'].sum() * data['viscosity'])
+                np.sum(mass/mass.sum() * data['viscosity'])
         else:
             self.logger.info("{0} sum of 'mass' array went to 0.0"
                              .format(self._pid))
@@ -247,7 +252,7 @@ class WeatheringData(Weatherer):
 
         # add 'non_weathering' key if any mass is released for nonweathering
         # particles.
-        data.mass_balance['non_weathering'] = data['mass'][data['fate_status'] == fate.non_weather].sum()
+        data.mass_balance['non_weathering'] = mass[data['fate_status'] == fate.non_weather].sum()
 
         if new_LEs > 0:
             amount_released = np.sum(data['mass'][-new_LEs:])
@@ -0,0 +1,145 @@
+'''
+tests for the Monte Carlo ensemble runner
+'''
+
+import numpy as np
+
+import pytest
+
+from gnome.spill import point_line_release_spill
+from gnome.environment import constant_wind
+from gnome.movers import RandomMover, WindMover, CatsMover
+
+from gnome.ensemble import (sample_perturbations,
+                            perturbed,
+                            run_member,
+                            EnsembleRunner)
+
+from .conftest import testdata
+
+
+@pytest.fixture(scope='function')
+def model(sample_model_fcn):
+    model = sample_model_fcn['model']
+
+    model.spills += point_line_release_spill(
+        10,
+        sample_model_fcn['release_start_pos'],
+        model.start_time,
+        end_position=sample_model_fcn['release_end_pos'],
+        amount=100,
+        units='kg')
+    model.movers += RandomMover(diffusion_coef=100000)
+
+    return model
+
+
+def test_sample_perturbations():
+    spec = {'diffusion_coef': (1e4, 1e5),
+            'windage_range': ((0.01, 0.02), (0.03, 0.05)),
+            'amount_scale': lambda rs: rs.choice([0.5, 2.0])}
+
+    members = sample_perturbations(spec, 20, seed=3)
+
+    assert len(members) == 20
+    assert [m['seed'] for m in members] == list(range(3, 23))
+
+    for m in members:
+        assert 1e4 <= m['diffusion_coef'] <= 1e5
+        assert 0.01 <= m['windage_range'][0] <= 0.02
+        assert 0.03 <= m['windage_range'][1] <= 0.05
+        assert m['amount_scale'] in (0.5, 2.0)
+
+    # reproducible
+    assert members == sample_perturbations(spec, 20, seed=3)
+
+
+def test_sample_perturbations_unknown():
+    with pytest.raises(ValueError):
+        sample_perturbations({'current_scale': (0.5, 1.5)}, 2)
+
+
+def test_perturbed_restores(model):
+    mover = model.movers[-1]
+    spill = model.spills[0]
+    amount = spill.amount
+
+    with perturbed(model, {'diffusion_coef': 10.0, 'amount_scale': 2.0}):
+        assert mover.diffusion_coef == 10.0
+        assert spill.amount == 2 * amount
+        assert not model.uncertain
+
+    assert mover.diffusion_coef == 100000
+    assert spill.amount == amount
+    assert model.uncertain
+
+
+def test_perturbed_wind_scale(model):
+    '''
+    the winds are scaled, the currents are not
+    '''
+    wind = constant_wind(10, 45, 'm/s')
+    model.movers += WindMover(wind)
+
+    cats = CatsMover(testdata['CatsMover']['curr'])
+    model.movers += cats
+    current_scale = cats.scale_value
+
+    with perturbed(model, {'wind_scale': 2.0}):
+        assert np.allclose(wind.get_wind_data()['value'][:, 0], 20.0)
+        assert cats.scale_value == current_scale
+
+    assert np.allclose(wind.get_wind_data()['value'][:, 0], 10.0)
+    assert cats.scale_value == current_scale
+
+
+def test_run_member_seed(model, monkeypatch):
+    '''
+    the members differ by their seeds -- with the same perturbations
+    '''
+    positions = []
+    post_model_run = model.post_model_run
+
+    def record_positions():
+        positions.append(model.spills.items()[0]['positions'].copy())
+        post_model_run()
+
+    monkeypatch.setattr(model, 'post_model_run', record_positions)
+
+    for seed in (1, 2, 2):
+        run_member(model, {'seed': seed, 'diffusion_coef': 1e5})
+
+    assert not np.allclose(positions[0], positions[1])
+    assert np.array_equal(positions[1], positions[2])
+
+
+def test_run_in_process(model):
+    runner = EnsembleRunner(model, 3,
+                            perturbations={'diffusion_coef': (1e4, 1e5)},
+                            num_workers=0,
+                            grid_shape=(10, 10))
+    result = runner.run()
+
+    assert result.num_members == 3
+    assert result.beaching_probability.shape == (10, 10)
+    assert np.all((result.beaching_probability >= 0) &
+                  (result.beaching_probability <= 1))
+
+    percentiles = result.mass_balance_percentiles(q=(10, 90))
+    assert 'beached' in percentiles
+    assert percentiles['beached'].shape == (2, model.num_time_steps)
+
+
+@pytest.mark.slow
+def test_run_pool(model):
+    in_process = EnsembleRunner(model, 4,
+                                perturbations={'diffusion_coef': (1e4, 1e5)},
+                                num_workers=0).run()
+    pooled = EnsembleRunner(model, 4,
+                            perturbations={'diffusion_coef': (1e4, 1e5)},
+                            num_workers=2).run()
+
+    # same members, whichever process ran them
+    assert (sorted(p['seed'] for p in pooled.params) ==
+            sorted(p['seed'] for p in in_process.params))
+    assert np.array_equal(pooled.beached_count, in_process.beached_count)
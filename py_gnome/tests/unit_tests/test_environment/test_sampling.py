@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+"""
+tests for the EnvironmentSampler
+"""
+
+import datetime
+import numpy as np
+
+from gnome.environment import Waves, Water, constant_wind
+from gnome.environment.sampling import EnvironmentSampler
+
+import pytest
+
+start_time = datetime.datetime(2014, 12, 1, 0)
+
+
+class CountingWind(object):
+    '''
+    Looks like an environment object -- counts the at() calls
+    '''
+    def __init__(self, speed=5.0):
+        self.speed = speed
+        self.calls = 0
+
+    def at(self, points, time, coord_sys='r'):
+        self.calls += 1
+        speed = np.full((len(points),), self.speed)
+
+        return np.ma.MaskedArray(speed, mask=np.arange(len(points)) == 0)
+
+
+def points(n=5):
+    pts = np.zeros((n, 3), dtype=np.float64)
+    pts[:, 0] = np.linspace(-120, -119, n)
+    pts[:, 1] = 45.0
+
+    return pts
+
+
+def test_at_is_cached():
+    sampler = EnvironmentSampler()
+    wind = CountingWind()
+
+    first = sampler.at(wind, points(), start_time, fill_value=1.0)
+    # a new array with the same points
+    second = sampler.at(wind, points(), start_time, fill_value=1.0)
+
+    assert wind.calls == 1
+    assert second is first
+    assert not isinstance(first, np.ma.MaskedArray)
+    assert first[0] == 1.0
+    assert np.all(first[1:] == 5.0)
+
+
+def test_values_are_read_only():
+    sampler = EnvironmentSampler()
+
+    values = sampler.at(CountingWind(), points(), start_time)
+
+    with pytest.raises(ValueError):
+        values[0] = 3.0
+
+
+@pytest.mark.parametrize('change', ['time', 'points', 'num_points',
+                                    'fill_value', 'invalidate'])
+def test_at_recomputed(change):
+    sampler = EnvironmentSampler()
+    wind = CountingWind()
+
+    sampler.at(wind, points(), start_time, fill_value=1.0)
+
+    time = start_time
+    pts = points()
+    fill_value = 1.0
+
+    if change == 'time':
+        time = start_time + datetime.timedelta(seconds=900)
+    elif change == 'points':
+        pts[2, 1] += 0.01
+    elif change == 'num_points':
+        pts = points(6)
+    elif change == 'fill_value':
+        fill_value = 0.0
+    else:
+        sampler.invalidate()
+
+    sampler.at(wind, pts, time, fill_value=fill_value)
+
+    assert wind.calls == 2
+
+
+def test_waves_share_sampler():
+    '''
+    the waves and the weatherers look up the wind once between them
+    '''
+    sampler = EnvironmentSampler()
+    wind = constant_wind(10, 45, 'm/s')
+    waves = Waves(wind, Water())
+
+    expected = waves.get_value(points(), start_time)
+
+    waves._sampler = sampler
+    values = waves.get_value(points(), start_time)
+
+    for v, e in zip(values, expected):
+        assert np.allclose(v, e)
+
+    assert waves.get_value(points(), start_time) is values
+
+    # the value of the wind, and the waves
+    assert len(sampler) == 2
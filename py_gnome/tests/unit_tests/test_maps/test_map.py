@@ -347,6 +347,137 @@ class Test_RasterMap:
         # outside polygon, off land:
         assert not gmap.allowable_spill_position((3.0, 3.0, 0.))
 
+    @pytest.mark.parametrize('ratios', [(16, 1),
+                                        (8, 3, 1),
+                                        (12, 4, 2, 1),
+                                        (7, 5, 1)])
+    def test_build_coarser_rasters(self, ratios):
+        gmap = RasterMap(refloat_halflife=6, raster=self.raster,
+                         projection=NoProjection())
+        gmap.ratios = ratios
+
+        assert len(gmap.layers) == len(ratios)
+        assert gmap.layers[-1] is gmap.raster
+
+        for ratio, layer in zip(ratios, gmap.layers):
+            assert layer.shape == (-(-self.w // ratio), -(-self.h // ratio))
+
+            for i in range(layer.shape[0]):
+                for j in range(layer.shape[1]):
+                    tile = self.raster[i * ratio:(i + 1) * ratio,
+                                       j * ratio:(j + 1) * ratio]
+                    assert layer[i, j] == np.any(tile)
+
+    @pytest.mark.parametrize('ratios', [(1, 16), (16, 4), (4, 4, 1)])
+    def test_bad_ratios(self, ratios):
+        gmap = RasterMap(refloat_halflife=6, raster=self.raster,
+                         projection=NoProjection())
+
+        with pytest.raises(ValueError):
+            gmap.ratios = ratios
+
+    def test_layers_file(self, tmpdir):
+        layers_file = str(tmpdir.join('raster.layers.npz'))
+
+        gmap = RasterMap(refloat_halflife=6, raster=self.raster,
+                         projection=NoProjection(),
+                         layers_file=layers_file)
+        assert os.path.isfile(layers_file)
+
+        gmap2 = RasterMap(refloat_halflife=6, raster=self.raster,
+                          projection=NoProjection())
+        assert gmap2.load_layers(layers_file)
+        for layer, layer2 in zip(gmap.layers, gmap2.layers):
+            assert np.array_equal(layer, layer2)
+
+        # a different raster doesn't use the saved layers
+        raster = self.raster.copy()
+        raster[0, 0] = 1
+        gmap3 = RasterMap(refloat_halflife=6, raster=raster,
+                          projection=NoProjection())
+        assert not gmap3.load_layers(layers_file)
+
+    def test_threaded_land_check(self):
+        '''
+        the threaded land check gives the same results as the serial one
+        '''
+        gmap = RasterMap(refloat_halflife=6, raster=self.raster,
+                         projection=NoProjection())
+
+        num = 10000
+        rs = np.random.RandomState(3)
+        start = rs.randint(-2, 22, (num, 2)).astype(np.int32)
+        end = rs.randint(-2, 22, (num, 2)).astype(np.int32)
+        # some that don't move -- on land, in water and off the raster
+        end[:100] = start[:100]
+        status = np.full(num, oil_status.in_water, dtype=status_code_type)
+
+        results = []
+        for num_threads in (1, 4):
+            gmap.num_threads = num_threads
+            args = (start.copy(), end.copy(), status.copy(),
+                    np.zeros_like(start))
+            gmap._check_land_layers(gmap.layers, gmap.ratios, *args)
+            results.append(args)
+
+        for serial, threaded in zip(*results):
+            assert np.array_equal(serial, threaded)
+
+        # the ones that didn't move only beach if they were on land
+        start_pos, _end_pos, status_codes, _lwp = results[0]
+        on_land = np.array([self.raster[x, y] if (0 <= x < 20 and
+                                                  0 <= y < 12) else 0
+                            for x, y in start[:100]], dtype=bool)
+        assert np.array_equal(status_codes[:100] == oil_status.on_land,
+                              on_land)
+        assert np.array_equal(start_pos[:100], start[:100])
+
+    def test_beach_elements_subset(self):
+        '''
+        beaching only the elements that could hit land, with the pixel
+        positions kept between steps, gives the same results as checking
+        all of them
+        '''
+        raster = np.zeros((200, 120), dtype=np.uint8)
+        raster[60:130, 40:80] = 1
+        raster[10, 100] = 1
+
+        # refloat everything every step
+        gmap = RasterMap(refloat_halflife=0, raster=raster,
+                         projection=NoProjection())
+
+        num = 1000
+        rs = np.random.RandomState(1)
+        sc = sample_sc_release(num, arr_types=gmap.array_types.copy())
+        assert 'pixel_positions' in sc
+
+        sc['positions'][:, :2] = rs.uniform((-10, -10), (210, 130),
+                                            (num, 2))
+
+        for step in range(5):
+            gmap.refloat_elements(sc, 900)
+
+            sc['next_positions'][:] = sc['positions']
+            sc['next_positions'][:, :2] += rs.normal(0, 10, (num, 2))
+
+            # all of them at once
+            start = gmap.projection.to_pixel(sc['positions'], asint=True)
+            end = gmap.projection.to_pixel(sc['next_positions'], asint=True)
+            status = sc['status_codes'].copy()
+            gmap._check_land_layers(gmap.layers, gmap.ratios, start, end,
+                                    status, np.zeros_like(start))
+
+            gmap.beach_elements(sc)
+
+            assert np.array_equal(sc['status_codes'], status)
+            assert np.any(status == oil_status.on_land)
+
+            beached = status == oil_status.on_land
+            assert np.array_equal(sc['next_positions'][beached, :2],
+                                  end[beached])
+
+            sc['positions'][:] = sc['next_positions']
+
 
 class TestRefloat:
 
@@ -899,6 +1030,36 @@ def test_bna_no_map_bounds():
                                          ])
 
 
+@pytest.mark.parametrize('shift_lons', [0, 360])
+def test_bna_raster_cache(tmpdir, shift_lons):
+    """
+    the second map from the same file comes from the raster cache,
+    and is the same as the first
+    """
+    cache_dir = str(tmpdir.join('raster_cache'))
+
+    m1 = MapFromBNA(bna_with_lake, raster_size=100000,
+                    shift_lons=shift_lons, raster_cache_dir=cache_dir)
+    assert len(os.listdir(cache_dir)) == 1
+
+    m2 = MapFromBNA(bna_with_lake, raster_size=100000,
+                    shift_lons=shift_lons, raster_cache_dir=cache_dir)
+    assert isinstance(m2.raster, np.memmap)
+
+    assert np.array_equal(m1.raster, m2.raster)
+    assert m1.projection == m2.projection
+    assert np.array_equal(m1.map_bounds, m2.map_bounds)
+    assert m1.to_geojson() == m2.to_geojson()
+
+    for layer1, layer2 in zip(m1.layers, m2.layers):
+        assert np.array_equal(layer1, layer2)
+
+    # a different size is a different entry
+    MapFromBNA(bna_with_lake, raster_size=50000,
+               shift_lons=shift_lons, raster_cache_dir=cache_dir)
+    assert len(os.listdir(cache_dir)) == 2
+
+
 class Test_lake():
     """
     tests for handling a BNA with a lake
@@ -0,0 +1,111 @@
+'''
+tests for the VectorMap -- beaching on the shoreline polygons
+'''
+
+import os
+
+import numpy as np
+
+from gnome.basic_types import oil_status
+from gnome.maps import VectorMap
+from gnome.maps.vector_map import SegmentIndex, segment_crossings
+
+from ..conftest import sample_sc_release
+
+
+basedir = os.path.dirname(__file__)
+basedir = os.path.split(basedir)[0]
+datadir = os.path.normpath(os.path.join(basedir, "sample_data"))
+testbnamap = os.path.join(datadir, 'MapBounds_Island.bna')
+
+# a square island, with a square lake in it
+island = ((-1.0, -1.0), (1.0, -1.0), (1.0, 1.0), (-1.0, 1.0))
+lake = ((-0.5, -0.5), (0.5, -0.5), (0.5, 0.5), (-0.5, 0.5))
+
+
+def test_segment_crossings():
+    start = np.array([(0.0, 0.0), (0.0, 0.0), (0.0, 0.0)])
+    end = np.array([(2.0, 0.0), (0.5, 0.0), (0.0, 2.0)])
+    edges = np.array([(1.0, -1.0, 1.0, 1.0),
+                      (1.0, -1.0, 1.0, 1.0),
+                      (1.0, -1.0, 1.0, 1.0)])
+
+    t = segment_crossings(start, end, edges)
+
+    assert t[0] == 0.5
+    assert np.isnan(t[1])  # stops short
+    assert np.isnan(t[2])  # parallel
+
+
+def test_candidates():
+    '''
+    the index finds all the segments that cross
+    '''
+    rs = np.random.RandomState(2)
+    segments = rs.uniform(0, 10, (200, 4))
+    segments[:, 2:] = segments[:, :2] + rs.normal(0, 0.5, (200, 2))
+
+    index = SegmentIndex(segments)
+
+    start = rs.uniform(-1, 11, (500, 2))
+    end = start + rs.normal(0, 1, (500, 2))
+
+    item, seg = index.candidates(index.bounds(start, end))
+    found = set(zip(item, seg))
+
+    for i in range(len(start)):
+        t = segment_crossings(np.repeat(start[i:i + 1], 200, axis=0),
+                              np.repeat(end[i:i + 1], 200, axis=0),
+                              segments)
+        for j in np.flatnonzero(~np.isnan(t)):
+            assert (i, j) in found
+
+
+def test_on_land():
+    gmap = VectorMap(testbnamap, refloat_halflife=6)
+
+    assert gmap.on_land((-127, 47.8, 0.))
+    assert not gmap.on_land((-126.78709, 48.1647, 0.))
+    # in the lake
+    assert not gmap.on_land((-126.8, 47.84, 0.))
+    assert gmap.in_water((-126.8, 47.84, 0.))
+
+    assert gmap.allowable_spill_position((-126.984472, 48.08106, 0.))
+    assert not gmap.allowable_spill_position((-127, 47.8, 0.))
+
+
+def test_beach_elements():
+    gmap = VectorMap(map_bounds=((-10, -10), (10, -10), (10, 10), (-10, 10)),
+                     land_polys=[island, lake],
+                     refloat_halflife=-1)
+
+    sc = sample_sc_release(4)
+    sc['positions'][:] = ((-3.0, 0.0, 0.0),  # crosses onto the island
+                          (-3.0, 3.0, 0.0),  # misses
+                          (0.0, 0.0, 0.0),  # in the lake, onto the shore
+                          (-3.0, -3.0, 0.0))  # doesn't move
+    sc['next_positions'][:] = ((3.0, 0.0, 0.0),
+                               (3.0, 3.0, 0.0),
+                               (0.0, 0.75, 0.0),
+                               (-3.0, -3.0, 0.0))
+    sc['status_codes'][:] = oil_status.in_water
+
+    gmap.beach_elements(sc)
+
+    assert np.array_equal(sc['status_codes'] == oil_status.on_land,
+                          (True, False, True, False))
+
+    # on the shoreline
+    assert np.allclose(sc['next_positions'][0], (-1.0, 0.0, 0.0))
+    assert np.allclose(sc['next_positions'][2], (0.0, 0.5, 0.0))
+
+    # just off it, on the water side
+    lwp = sc['last_water_positions']
+    assert -1.0 - 1e-6 < lwp[0, 0] < -1.0
+    assert 0.5 - 1e-6 < lwp[2, 1] < 0.5
+    assert not gmap.on_land(lwp[0])
+    assert not gmap.on_land(lwp[2])
+
+    # unmoved
+    assert np.array_equal(sc['next_positions'][1], (3.0, 3.0, 0.0))
+    assert np.array_equal(sc['next_positions'][3], (-3.0, -3.0, 0.0))
@@ -130,6 +130,30 @@ def test_init_with_mode():
         model = Model(mode='bogus')
 
 
+def test_cache_options():
+    model = Model(cache_enabled=True,
+                  cache_options={'recent_steps': 3, 'file_format': 'npy'})
+
+    assert model._cache.recent_steps == 3
+    assert model._cache.file_format == 'npy'
+    assert model.cache_options == {'recent_steps': 3, 'file_format': 'npy'}
+
+    model.outputters += TrajectoryGeoJsonOutput()
+
+    model.cache_options = {'spill_to_disk': True}
+
+    assert model.cache_enabled
+    assert model._cache.spill_to_disk
+    assert model._cache.recent_steps == 1
+    assert model.outputters[0].cache is model._cache
+
+    with raises(TypeError):
+        model.cache_options = {'cache_dir': '.'}
+
+    with raises(ValueError):
+        model.cache_options = {'file_format': 'bogus'}
+
+
 def test_start_time():
     model = Model()
 
@@ -3,6 +3,7 @@ import os
 import sys
 import time
 import traceback
+from multiprocessing import shared_memory
 
 from datetime import datetime, timedelta
 
@@ -26,7 +27,9 @@ from gnome.weatherers import Evaporation, ChemicalDispersion, Burn, Skimmer
 
 from gnome.outputters import WeatheringOutput, TrajectoryGeoJsonOutput
 
-from gnome.multi_model_broadcast import ModelBroadcaster
+from gnome.multi_model_broadcast import (ModelBroadcaster,
+                                         attach_shared_arrays,
+                                         close_shared_blocks)
 
 from .conftest import testdata, test_oil
 
@@ -342,6 +345,145 @@ def test_step():
         model_broadcaster.stop()
 
 
+@pytest.mark.slow
+@pytest.mark.timeout(30)
+def test_iter_steps():
+    model = make_model()
+
+    model_broadcaster = ModelBroadcaster(model,
+                                         ('down', 'normal', 'up'),
+                                         ('down', 'normal', 'up'))
+
+    try:
+        steps = {}
+        for idx, step_num, res in model_broadcaster.iter_steps(num_steps=3):
+            steps.setdefault(idx, []).append(step_num)
+
+        assert len(steps) == 9
+        assert all([s == [0, 1, 2] for s in steps.values()])
+
+        # the sockets are ready for another command
+        res = model_broadcaster.cmd('rewind', {})
+        assert len(res) == 9
+    finally:
+        model_broadcaster.stop()
+
+
+@pytest.mark.slow
+@pytest.mark.timeout(60)
+def test_iter_steps_restart():
+    '''
+        Kill one of the subprocesses in the middle of a run.  It is restarted
+        and re-runs its steps, the others carry on.
+    '''
+    model = make_model()
+
+    model_broadcaster = ModelBroadcaster(model,
+                                         ('down', 'up'),
+                                         ('down', 'up'))
+
+    try:
+        pids = [c.pid for c in model_broadcaster.consumers]
+        killed = 1
+
+        steps = {}
+        for idx, step_num, res in model_broadcaster.iter_steps(num_steps=6):
+            steps.setdefault(idx, []).append((step_num, res['step_num']))
+
+            if idx == 0 and step_num == 0:
+                model_broadcaster.consumers[killed].terminate()
+
+        # every step is yielded once, the re-run ones are not yielded again
+        assert len(steps) == 4
+        assert all([s == [(i, i) for i in range(6)] for s in steps.values()])
+
+        new_pids = [c.pid for c in model_broadcaster.consumers]
+        assert new_pids[killed] != pids[killed]
+        assert [p for i, p in enumerate(new_pids) if i != killed] == \
+            [p for i, p in enumerate(pids) if i != killed]
+
+        res = model_broadcaster.cmd('rewind', {})
+        assert len(res) == 4
+    finally:
+        model_broadcaster.stop()
+
+
+@pytest.mark.slow
+@pytest.mark.timeout(30)
+def test_get_element_arrays():
+    model = make_model()
+
+    model_broadcaster = ModelBroadcaster(model,
+                                         ('down', 'up'),
+                                         ('down', 'up'))
+
+    try:
+        for _i in range(3):
+            model_broadcaster.cmd('step', {})
+
+        res = model_broadcaster.get_element_arrays(['positions', 'mass'])
+        assert len(res) == 4
+
+        for arrays in res:
+            assert set(arrays) == {'positions', 'mass'}
+            assert arrays['positions'].shape == (1000, 3)
+            assert arrays['mass'].shape == (1000,)
+
+        arrays = model_broadcaster.get_element_arrays(
+            uncertainty_values=('down', 'down')
+        )
+        assert 'status_codes' in arrays
+        assert np.array_equal(arrays['positions'], res[0]['positions'])
+    finally:
+        model_broadcaster.stop()
+
+
+def test_close_shared_blocks_in_use(caplog):
+    shm = shared_memory.SharedMemory(create=True, size=80)
+    arr = attach_shared_arrays({'mass': (shm.name, '<f8', (2, 5))},
+                               {shm.name: shm})['mass']
+
+    blocks = {shm.name: shm}
+    close_shared_blocks(blocks, unlink=True)
+
+    assert blocks == {}
+    assert not os.path.exists(os.path.join('/dev/shm', shm.name))
+    assert 'still used by arrays' in caplog.text
+
+    del arr
+    shm.close()
+
+
+@pytest.mark.slow
+@pytest.mark.timeout(30)
+def test_terminated_consumer_blocks_unlinked():
+    model = make_model()
+
+    model_broadcaster = ModelBroadcaster(model,
+                                         ('down', 'up'),
+                                         ('down', 'up'))
+
+    try:
+        model_broadcaster.cmd('step', {})
+
+        model_broadcaster.get_element_arrays(['positions', 'mass'], idx=0)
+        block_names = list(model_broadcaster._shared_blocks[0])
+        assert block_names
+
+        model_broadcaster.consumers[0].terminate()
+        model_broadcaster._restart_task(0)
+
+        assert 0 not in model_broadcaster._shared_blocks
+        for name in block_names:
+            assert not os.path.exists(os.path.join('/dev/shm', name))
+
+        # the restarted consumer publishes new blocks
+        arrays = model_broadcaster.get_element_arrays(['mass'], idx=0)
+        assert 'mass' in arrays
+    finally:
+        model_broadcaster.stop()
+
+
 @pytest.mark.slow
 @pytest.mark.timeout(30)
 def test_full_run():
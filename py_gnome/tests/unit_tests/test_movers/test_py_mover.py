@@ -12,7 +12,9 @@ import numpy as np
 from pytest import raises
 from ..conftest import sample_sc_release
 
+from gnome.basic_types import oil_status
 from gnome.utilities.inf_datetime import InfDateTime
+from gnome.utilities.projections import FlatEarthProjection
 from gnome.movers import PyMover
 
 
@@ -124,3 +126,98 @@ def test_get_move():
     delta = mv.get_move(sc, time_step, model_time)
 
     assert np.all(np.isnan(delta))
+
+
+class ConstantField(object):
+    '''
+    velocity field that is the same everywhere -- keeps track of the points
+    it was evaluated at
+    '''
+    def __init__(self, vel):
+        self.vel = np.array(vel, dtype=np.float64)
+        self.num_points = 0
+
+    def at(self, points, time):
+        self.num_points += len(points)
+
+        return np.tile(self.vel, (len(points), 1))
+
+
+def test_get_active_deltas():
+    '''
+    only the elements in the water are integrated
+    '''
+    time_step = 15 * 60  # seconds
+    model_time = datetime(2012, 8, 20, 13)
+    sc = sample_sc_release(10, (0, 0, 0))
+    sc['status_codes'][::2] = oil_status.on_land
+
+    mv = PyMover()
+    field = ConstantField((1.0, 2.0))
+
+    idx, deltas = mv.get_active_deltas(sc, time_step, model_time, field,
+                                       num_method='RK4')
+
+    assert np.array_equal(idx, np.arange(1, 10, 2))
+    # RK4 evaluates four times
+    assert field.num_points == 4 * 5
+    assert np.allclose(deltas, (time_step, 2 * time_step, 0.0))
+
+
+class RotatingField(object):
+    '''
+    solid body rotation about (0, 0) -- one turn an hour
+    '''
+    omega = 2 * np.pi / 3600
+
+    def __init__(self):
+        self.num_calls = 0
+
+    def at(self, points, time):
+        self.num_calls += 1
+        meters = FlatEarthProjection.lonlat_to_meters(points,
+                                                      np.zeros_like(points))
+
+        return np.column_stack((-self.omega * meters[:, 1],
+                                self.omega * meters[:, 0]))
+
+
+def test_RK45_rotation():
+    '''
+    a quarter turn in one step: the adaptive method stays on the circle
+    '''
+    radius = np.linspace(100, 2000, 5)
+    pos = np.zeros((5, 3))
+    pos[:, 0] = FlatEarthProjection.meters_to_lonlat(
+        np.column_stack((radius, radius * 0, radius * 0)), pos)[:, 0]
+
+    mv = PyMover()
+    mv.rk45_tolerance = 0.1
+    field = RotatingField()
+
+    delta = mv.get_delta_RK45(None, 900, datetime(2012, 8, 20, 13),
+                              pos, field)
+
+    assert np.allclose(delta, np.column_stack((-radius, radius)), atol=0.1)
+    # it took more than one step
+    assert field.num_calls > 7
+
+    # Euler is way off
+    euler = mv.get_delta_Euler(None, 900, datetime(2012, 8, 20, 13),
+                               pos, field)
+    assert not np.allclose(euler, np.column_stack((-radius, radius)),
+                           atol=10)
+
+
+def test_RK45_uniform():
+    '''
+    no sub-steps where the field doesn't change
+    '''
+    pos = np.zeros((5, 3))
+    field = ConstantField((1.0, 2.0))
+
+    delta = PyMover().get_delta_RK45(None, 900, datetime(2012, 8, 20, 13),
+                                     pos, field)
+
+    assert np.allclose(delta, (900.0, 1800.0))
+    assert field.num_points == 7 * 5
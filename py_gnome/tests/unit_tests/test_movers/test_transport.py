@@ -0,0 +1,91 @@
+'''
+tests for the TransportStep shared by the movers
+'''
+
+from datetime import datetime
+
+import numpy as np
+
+from gnome.basic_types import oil_status
+from gnome.utilities.projections import FlatEarthProjection
+from gnome.movers import SimpleMover
+from gnome.movers.transport import TransportStep
+
+from ..conftest import sample_sc_release
+
+
+model_time = datetime(2012, 8, 20, 13)
+
+
+class CountingField(object):
+    def __init__(self):
+        self.calls = 0
+
+    def at(self, points, time):
+        self.calls += 1
+
+        return np.ones((len(points), 2))
+
+
+def make_sc(num=10):
+    sc = sample_sc_release(num, (0, 0, 0))
+    sc['positions'][:, 1] = np.linspace(-60, 60, num)
+    sc['status_codes'][::3] = oil_status.on_land
+
+    return sc
+
+
+def test_active():
+    sc = make_sc()
+    step = TransportStep(sc, 900, model_time)
+
+    assert np.array_equal(step.active,
+                          np.flatnonzero(sc['status_codes'] ==
+                                         oil_status.in_water))
+
+
+def test_meters_to_lonlat():
+    sc = make_sc()
+    step = TransportStep(sc, 900, model_time)
+
+    meters = np.random.RandomState(0).normal(0, 100, (10, 3))
+    expected = FlatEarthProjection.meters_to_lonlat(meters, sc['positions'])
+
+    assert np.allclose(step.meters_to_lonlat(meters.copy()), expected)
+
+    idx = step.active
+    assert np.allclose(step.meters_to_lonlat(meters[idx].copy(), idx),
+                       expected[idx])
+
+
+def test_sample_shared():
+    sc = make_sc()
+    step = TransportStep(sc, 900, model_time)
+    field = CountingField()
+
+    vels = step.sample(field, active_only=True)
+    assert len(vels) == len(step.active)
+    assert not vels.flags.writeable
+
+    assert step.sample(field, active_only=True) is vels
+    assert field.calls == 1
+
+    # all the elements, or another time, are separate
+    assert len(step.sample(field)) == 10
+    step.sample(field, datetime(2012, 8, 20, 14), active_only=True)
+    assert field.calls == 3
+
+
+def test_add_move():
+    '''
+    the default add_move adds what get_move returns
+    '''
+    sc = make_sc()
+    mover = SimpleMover(velocity=(1.0, 10.0, 0.0))
+    mover.prepare_for_model_step(sc, 900, model_time)
+
+    out = np.ones_like(sc['positions'])
+    mover.add_move(sc, 900, model_time, out, TransportStep(sc, 900,
+                                                           model_time))
+
+    assert np.allclose(out, 1 + mover.get_move(sc, 900, model_time))
@@ -0,0 +1,228 @@
+'''
+tests for running the outputters in an OutputExecutor
+'''
+
+import time
+import threading
+from datetime import timedelta
+
+import numpy as np
+import pytest
+
+from gnome.spill import point_line_release_spill
+from gnome.outputters import Outputter, TrajectoryGeoJsonOutput
+from gnome.outputters.executor import OutputExecutor, output_results
+
+
+class Step(object):
+    'stands in for a CachedStep'
+    def __init__(self, step_num):
+        self.step_num = step_num
+        self.surface_conc_computed = False
+
+
+class SlowOutputter(object):
+    '''
+    records the calls it gets -- and fails on one step if asked to
+    '''
+    def __init__(self, delay=0.0, fail_at=None):
+        self.cache = 'model cache'
+        self.delay = delay
+        self.fail_at = fail_at
+        self.calls = []
+        self.running = 0
+
+    def prepare_for_model_step(self, time_step, model_time):
+        self.calls.append(('prepare', model_time))
+
+    def write_output(self, step_num, islast_step=False):
+        self.running += 1
+        assert self.running == 1
+        assert self.cache.step_num == step_num
+
+        time.sleep(self.delay)
+        self.running -= 1
+
+        if step_num == self.fail_at:
+            raise RuntimeError('failed at step {}'.format(step_num))
+
+        self.calls.append(('write', step_num))
+
+        return {'step': step_num} if step_num % 2 else None
+
+
+class ThreadOutputter(Outputter):
+    'records the threads it writes in'
+    def __init__(self, reads_model_objects=False, **kwargs):
+        super(ThreadOutputter, self).__init__(**kwargs)
+        self.reads_model_objects = reads_model_objects
+        self.threads = set()
+
+    def write_output(self, step_num, islast_step=False):
+        super(ThreadOutputter, self).write_output(step_num, islast_step)
+        self.threads.add(threading.current_thread())
+
+
+@pytest.fixture(scope='function')
+def model(sample_model_fcn):
+    model = sample_model_fcn['model']
+
+    model.spills += point_line_release_spill(
+        20,
+        start_position=sample_model_fcn['release_start_pos'],
+        release_time=model.start_time,
+        end_position=sample_model_fcn['release_end_pos'])
+
+    model.outputters += TrajectoryGeoJsonOutput()
+
+    return model
+
+
+@pytest.mark.parametrize('max_workers', [1, 3])
+def test_order_of_calls(max_workers):
+    outputters = [SlowOutputter(0.002), SlowOutputter(), SlowOutputter(0.001)]
+    executor = OutputExecutor(max_workers, max_pending_steps=2)
+
+    for step_num in range(10):
+        for o in outputters:
+            executor.submit(o, o.prepare_for_model_step, 900, step_num)
+            executor.write_output(o, Step(step_num))
+
+        executor.end_step()
+        assert len(executor._steps) <= 2
+
+    executor.shutdown()
+
+    for o in outputters:
+        assert o.calls == [c for step_num in range(10)
+                           for c in (('prepare', step_num),
+                                     ('write', step_num))]
+        assert o.cache == 'model cache'
+
+
+def test_errors_raised():
+    outputter = SlowOutputter(fail_at=2)
+    executor = OutputExecutor(max_pending_steps=1)
+
+    with pytest.raises(RuntimeError):
+        for step_num in range(5):
+            executor.write_output(outputter, Step(step_num))
+            executor.end_step()
+
+    executor.write_output(outputter, Step(2))
+
+    with pytest.raises(RuntimeError):
+        executor.drain()
+
+    executor.shutdown()
+
+
+def test_output_results():
+    executor = OutputExecutor()
+    outputter = SlowOutputter()
+
+    info = [{'step_num': step_num,
+             'SlowOutputter': executor.write_output(outputter, Step(step_num)),
+             'valid': True}
+            for step_num in range(2)]
+
+    executor.shutdown()
+
+    assert output_results(info[0]) == {'step_num': 0}
+    assert output_results(info[1]) == {'step_num': 1,
+                                       'SlowOutputter': {'step': 1},
+                                       'valid': True}
+
+
+def test_model_output_workers(model):
+    '''
+    the output is the same when it's written in other threads
+    '''
+    expected = model.full_run()
+
+    model.output_workers = 2
+    results = model.full_run()
+
+    assert model._output_executor is None
+    assert results == expected
+
+
+def test_model_output_workers_surface_conc(model, monkeypatch):
+    '''
+    the surface concentration is computed once for a step, by the model, and
+    is kept in the cache
+    '''
+    model.outputters += TrajectoryGeoJsonOutput(surface_conc='grid')
+    model.outputters += TrajectoryGeoJsonOutput(surface_conc='grid')
+
+    model.rewind()
+    for _i in range(3):
+        model.step()
+
+    expected = model._cache.recent[2][0]['surface_concentration']
+
+    def not_in_outputter(sc, algorithm):
+        raise AssertionError('computed by an outputter')
+
+    monkeypatch.setattr('gnome.outputters.outputter.'
+                        'compute_surface_concentration', not_in_outputter)
+
+    model.output_workers = 2
+    model.rewind()
+    for _i in range(3):
+        output_results(model.step())
+
+    sc = model._cache.load_timestep(2).items()[0]
+    assert np.all(sc['surface_concentration'] == expected)
+
+    model._finish_output()
+
+
+def test_model_thread_outputters(model):
+    '''
+    the outputters that read the model's objects are run in the model thread
+    '''
+    in_model = ThreadOutputter(reads_model_objects=True)
+    in_pool = ThreadOutputter()
+    model.outputters += [in_model, in_pool]
+
+    model.output_workers = 2
+    model.full_run()
+
+    assert in_model.threads == {threading.current_thread()}
+    assert threading.current_thread() not in in_pool.threads
+
+
+def test_model_output_workers_surface_conc_steps(model, monkeypatch):
+    '''
+    the surface concentration is only computed for the steps written -- once
+    for each algorithm
+    '''
+    every_step = TrajectoryGeoJsonOutput(surface_conc='grid')
+    every_other = TrajectoryGeoJsonOutput(
+        surface_conc='grid',
+        output_timestep=timedelta(seconds=2 * model.time_step))
+    model.outputters += [every_step, every_other]
+
+    computed = []
+
+    def count(sc, algorithm):
+        computed.append((model.current_time_step, algorithm))
+
+    monkeypatch.setattr('gnome.model.compute_surface_concentration', count)
+
+    model.output_workers = 2
+    model.full_run()
+
+    # not step 0 -- as in the model thread
+    assert computed == [(step_num, 'grid')
+                        for step_num in range(1, model.num_time_steps)]
+
+    del model.outputters[every_step.id]
+    del computed[:]
+
+    model.full_run()
+
+    written = [step_num for step_num in range(1, model.num_time_steps)
+               if step_num % 2 == 0 or step_num == model.num_time_steps - 1]
+    assert [c[0] for c in computed] == written
@@ -365,6 +365,84 @@ def test_run_without_spills(model):
     _run_model(model)
 
 
+@pytest.mark.parametrize("buffer_steps", [2, 3, 100])
+def test_write_output_buffered(model, buffer_steps):
+    """
+    buffered steps are written to the same places as unbuffered ones, and
+    the files are closed at the end of the run
+    """
+    o_put = [model.outputters[outputter.id]
+             for outputter in model.outputters
+             if isinstance(outputter, NetCDFOutput)][0]
+
+    model.rewind()
+    o_put.buffer_steps = buffer_steps
+
+    _run_model(model)
+
+    assert o_put._datasets == {}
+    assert o_put._buffers == {}
+
+    uncertain = False
+    for file_ in (o_put.filename, o_put._u_filename):
+        with nc.Dataset(file_) as data:
+            assert data.variables['longitude'].chunking()[0] == \
+                o_put.chunksize * buffer_steps
+
+        for step in range(model.num_time_steps):
+            scp = model._cache.load_timestep(step)
+            (arrays, mb) = NetCDFOutput.read_data(file_, index=step)
+
+            assert np.allclose(scp.LE('positions', uncertain),
+                               arrays['positions'], 0, 1e-5)
+            assert np.all(scp.LE('id', uncertain) == arrays['id'])
+            assert np.all(scp.LE('mass', uncertain) == arrays['mass'])
+
+        uncertain = True
+
+
+def test_step_error_closes_files(model, monkeypatch):
+    """
+    the files are closed, with the buffered steps written, if a step fails
+    """
+    o_put = [model.outputters[outputter.id]
+             for outputter in model.outputters
+             if isinstance(outputter, NetCDFOutput)][0]
+
+    model.rewind()
+    o_put.buffer_steps = 3
+
+    model.step()
+    model.step()
+    assert o_put._datasets != {}
+
+    def move_elements():
+        raise RuntimeError('mover failed')
+
+    monkeypatch.setattr(model, 'move_elements', move_elements)
+
+    with raises(RuntimeError):
+        model.step()
+
+    assert o_put._datasets == {}
+    assert o_put._buffers == {}
+
+    with nc.Dataset(o_put.filename) as data:
+        assert len(data.dimensions['time']) == 2
+
+    scp = model._cache.load_timestep(1)
+    (arrays, mb) = NetCDFOutput.read_data(o_put.filename, index=1)
+    assert np.all(scp.LE('id') == arrays['id'])
+
+
+def test_buffer_steps_exceptions(output_filename):
+    with raises(ValueError):
+        NetCDFOutput(output_filename, buffer_steps=0)
+
+    with raises(ValueError):
+        NetCDFOutput(output_filename, buffer_steps=2.5)
+
+
 @pytest.mark.slow
 def test_read_data_exception(model):
     """
@@ -525,6 +603,97 @@ def test_read_all_arrays(model):
         uncertain = True
 
 
+@pytest.mark.parametrize("block_size", [1, 7, 2 ** 20])
+def test_read_steps(model, block_size):
+    """
+    read_steps and iter_steps return the same data as read_data
+    """
+    model.rewind()
+
+    o_put = [model.outputters[outputter.id]
+             for outputter in model.outputters
+             if isinstance(outputter, NetCDFOutput)][0]
+
+    _run_model(model)
+
+    file_ = o_put.filename
+    num_steps = model.num_time_steps
+
+    expected = [NetCDFOutput.read_data(file_, index=step)
+                for step in range(num_steps)]
+
+    # the offsets are computed once for the file
+    assert len(NetCDFOutput._offsets_cache[os.path.abspath(file_)][1]) == \
+        num_steps + 1
+
+    indices = [num_steps - 1, 0, 1, 1, -2]
+    batched = NetCDFOutput.read_steps(file_, indices)
+    streamed = list(NetCDFOutput.iter_steps(file_, block_size=block_size))
+
+    assert len(streamed) == num_steps
+
+    for ix, (nc_data, mb) in zip(indices, batched):
+        (exp_data, exp_mb) = expected[ix]
+
+        assert sorted(nc_data) == sorted(exp_data)
+        for key in exp_data:
+            assert np.all(nc_data[key] == exp_data[key])
+        assert mb == exp_mb
+
+    for (nc_data, mb), (exp_data, exp_mb) in zip(streamed, expected):
+        for key in exp_data:
+            assert np.all(nc_data[key] == exp_data[key])
+        assert mb == exp_mb
+
+    with raises(IndexError):
+        NetCDFOutput.read_steps(file_, [num_steps])
+
+
+def test_offsets_cache(model, monkeypatch):
+    """
+    the cached offsets are dropped when the file is written, and not used
+    if they don't match the steps in the file
+    """
+    model.rewind()
+
+    o_put = [model.outputters[outputter.id]
+             for outputter in model.outputters
+             if isinstance(outputter, NetCDFOutput)][0]
+
+    _run_model(model)
+
+    file_ = o_put.filename
+    path = os.path.abspath(file_)
+    num_steps = model.num_time_steps
+
+    expected = NetCDFOutput.read_steps(file_, [-1])
+
+    # same stamp, wrong number of steps
+    stamp, offsets = NetCDFOutput._offsets_cache[path]
+    NetCDFOutput._offsets_cache[path] = (stamp, offsets[:-1])
+
+    (nc_data, _mb), = NetCDFOutput.read_steps(file_, [-1])
+    assert len(NetCDFOutput._offsets_cache[path][1]) == num_steps + 1
+    assert np.all(nc_data['positions'] == expected[0][0]['positions'])
+
+    # writing the file drops them
+    model.rewind()
+    model.step()
+    assert path not in NetCDFOutput._offsets_cache
+
+    # only the last files read are kept
+    monkeypatch.setattr(NetCDFOutput, '_offsets_cache', {})
+    monkeypatch.setattr(NetCDFOutput, '_offsets_cache_size', 1)
+
+    _run_model(model)
+
+    NetCDFOutput.read_steps(file_, [0])
+    NetCDFOutput.read_steps(o_put._u_filename, [0])
+
+    assert list(NetCDFOutput._offsets_cache) == \
+        [os.path.abspath(o_put._u_filename)]
+
+
 @pytest.mark.slow
 @pytest.mark.parametrize("output_ts_factor", [1, 2])
 def test_write_output_post_run(model, output_ts_factor):
@@ -639,10 +808,8 @@ def test_serialize_deserialize(output_filename):
     # ==========================================================================
 
     model.rewind()
-    print("step: {0}, _start_idx: {1}".format(-1, o_put._start_idx))
-    for ix in range(2):
+    for _ix in range(2):
         model.step()
-        print("step: {0}, _start_idx: {1}".format(ix, o_put._start_idx))
 
     o_put2 = NetCDFOutput.deserialize(o_put.serialize())
     assert o_put == o_put2
@@ -0,0 +1,148 @@
+'''
+tests for the reducer outputter
+'''
+
+import pickle
+
+import numpy as np
+import pytest
+
+from gnome.spill import point_line_release_spill
+from gnome.model import Model
+from gnome.outputters import ReducerOutputter
+from gnome.outputters.reducer import (grid_cells,
+                                      HitCount,
+                                      MinArrivalTime,
+                                      MaxConcentration,
+                                      ExposureTime)
+
+
+bounds = ((-127.5, 47.5), (-126.0, 48.5))
+shape = (30, 20)
+
+
+@pytest.fixture(scope='function')
+def model(sample_model_fcn):
+    model = sample_model_fcn['model']
+    model.uncertain = False
+
+    model.spills += point_line_release_spill(
+        100,
+        start_position=sample_model_fcn['release_start_pos'],
+        release_time=model.start_time,
+        end_position=sample_model_fcn['release_end_pos'],
+        amount=1000,
+        units='kg')
+
+    return model
+
+
+def test_grid_cells():
+    pos = np.array([(-127.49, 47.51, 0.0),
+                    (-126.01, 48.49, 0.0),
+                    (-128.0, 48.0, 0.0),
+                    (-127.0, 48.6, 0.0)])
+
+    cells = grid_cells(pos, bounds, shape)
+
+    assert cells.tolist() == [0, 30 * 20 - 1, -1, -1]
+
+
+def test_accumulators():
+    reducer = ReducerOutputter(bounds, shape)
+    area = reducer._cell_area
+
+    cells = np.array([0, 0, 5])
+    mass = np.array([1.0, 2.0, 4.0])
+
+    for acc in reducer.accumulators.values():
+        acc.update(cells, mass, 900.0, 900.0, area)
+        acc.update(cells[2:], mass[2:], 1800.0, 900.0, area)
+        acc.end_run()
+
+    res = reducer.results
+
+    assert res['hit_count'][0, 0] == 1
+    assert res['hit_count'][0, 5] == 1
+    assert res['hit_count'].sum() == 2
+
+    assert res['arrival_time'][0, 0] == 900.0
+    assert res['arrival_time'][0, 5] == 900.0
+    assert np.isinf(res['arrival_time'][1, 0])
+
+    assert np.isclose(res['max_concentration'][0, 0], 3.0 / area[0])
+    assert res['exposure_time'][0, 0] == 900.0
+    assert res['exposure_time'][0, 5] == 1800.0
+
+
+@pytest.mark.parametrize('acc', [HitCount(),
+                                 MinArrivalTime(),
+                                 MaxConcentration(),
+                                 ExposureTime()])
+def test_merge_wrong_grid(acc):
+    acc.reset((3, 3))
+    other = acc.__class__()
+    other.reset((3, 4))
+
+    with pytest.raises(ValueError):
+        acc.merge(other)
+
+
+def test_model_run(model):
+    reducer = ReducerOutputter(bounds, shape)
+    model.outputters += reducer
+
+    model.full_run()
+
+    assert reducer.num_runs == 1
+
+    res = reducer.results
+    assert res['hit_count'].max() == 1
+    assert res['hit_count'].sum() > 0
+    assert np.all(res['exposure_time'] >= 0)
+
+    # arrival time is known wherever there was a hit
+    hit = res['hit_count'] > 0
+    assert np.all(np.isfinite(res['arrival_time'][hit]))
+    assert np.all(np.isinf(res['arrival_time'][~hit]))
+
+
+def test_merge_runs(model):
+    reducer = ReducerOutputter(bounds, shape)
+    model.outputters += reducer
+
+    model.full_run()
+    single = {k: v.copy() for k, v in reducer.results.items()}
+
+    # as if sent back from another process
+    other = pickle.loads(pickle.dumps((reducer.accumulators,
+                                       reducer.num_runs)))
+    reducer.merge(other)
+
+    assert reducer.num_runs == 2
+    res = reducer.results
+    assert np.array_equal(res['hit_count'], 2 * single['hit_count'])
+    assert np.array_equal(res['arrival_time'], single['arrival_time'])
+    assert np.array_equal(res['max_concentration'],
+                          single['max_concentration'])
+
+    reducer.clear()
+    assert reducer.num_runs == 0
+    assert reducer.results['hit_count'].sum() == 0
+
+
+def test_save_load(model, tmpdir):
+    'the grid is saved with the model -- the accumulators are not'
+    model.outputters += ReducerOutputter(bounds, shape)
+
+    _json_, savefile, _refs = model.save(tmpdir.strpath)
+    model2 = Model.load(savefile)
+
+    reducer = [o for o in model2.outputters
+               if isinstance(o, ReducerOutputter)][0]
+
+    assert reducer.grid_bounds == bounds
+    assert reducer.grid_shape == shape
+    assert set(reducer.accumulators) == {'hit_count', 'arrival_time',
+                                         'max_concentration',
+                                         'exposure_time'}
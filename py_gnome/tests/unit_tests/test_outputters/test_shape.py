@@ -56,6 +56,16 @@ def test_init(output_dir):
     shp = ShapeOutput(os.path.join(output_dir, 'test'))
 
 
+@pytest.mark.parametrize(('surface_conc', 'expected'), [('kde', 'kde'),
+                                                         ('grid', 'grid'),
+                                                         (None, 'kde')])
+def test_init_surface_conc(output_dir, surface_conc, expected):
+    shp = ShapeOutput(os.path.join(output_dir, 'test'),
+                      surface_conc=surface_conc)
+
+    assert shp.surface_conc == expected
+
+
 def test_init_filenname_exceptions():
     '''
     test exceptions raised during __init__
@@ -1,10 +1,14 @@
 
 from datetime import datetime, timedelta
 
+import numpy as np
+
 from gnome.spill.spill import (Spill)
 from gnome.spill.substance import NonWeatheringSubstance
 from gnome.spill.release import PointLineRelease
-from gnome.spill_container import SpillContainer
+from gnome.spill_container import SpillContainer, SpillContainerPair
+from gnome.basic_types import oil_status, fate as bt_fate
+from gnome.array_types import gat
 
 import pytest
 
@@ -98,6 +102,102 @@ class TestSpill:
             else:
                 assert to_rel == 0
 
+    def test_release_elements_preallocated(self):
+        'releases write into the buffers reserved in prepare_for_model_run'
+        end_time = self.rel_time + timedelta(hours=1)
+        release = PointLineRelease(self.rel_time,
+                                   self.pos,
+                                   num_elements=1000,
+                                   end_release_time=end_time)
+        sp = Spill(release=release)
+        sc = SpillContainer()
+        sc.spills += sp
+        sc.prepare_for_model_run(array_types=sp.array_types)
+        sp.prepare_for_model_run(900)
+
+        assert sc.capacity >= 1000
+        buffers = dict(sc._buffers)
+
+        for ix in range(4):
+            model_time = self.rel_time + timedelta(seconds=900 * ix)
+            sp.release_elements(sc, model_time, 900)
+
+            for name, buf in buffers.items():
+                assert sc[name].base is buf
+                assert len(sc[name]) == (ix + 1) * 250
+
+    def test_append_data_arrays_grows(self):
+        'buffers grow (at least doubling) if nothing was reserved'
+        sc = SpillContainer()
+        sc.prepare_for_model_run()
+
+        sc._append_data_arrays(10)
+        capacity = sc.capacity
+        assert capacity >= 10
+
+        sc._append_data_arrays(capacity - 10 + 1)
+        assert sc.capacity >= 2 * capacity
+        assert len(sc['positions']) == capacity + 1
+
+    @pytest.mark.parametrize(('interval', 'fraction', 'removed_after'),
+                             [(1, None, 1),
+                              (3, None, 3),
+                              (10, 0.3, 1),
+                              (10, 0.5, 10)])
+    def test_model_step_is_done_removal(self, interval, fraction,
+                                        removed_after):
+        'to_be_removed elements are compacted out, possibly deferred'
+        sc = SpillContainer(removal_interval=interval,
+                            removal_fraction=fraction)
+        sc.prepare_for_model_run()
+        sc._append_data_arrays(10)
+        buf = sc._buffers['positions']
+
+        sc['positions'][:, 0] = np.arange(10)
+        sc['status_codes'][[2, 5, 6]] = oil_status.to_be_removed
+
+        for step in range(1, removed_after):
+            sc.model_step_is_done()
+            assert len(sc) == 10
+
+        sc.model_step_is_done()
+        assert len(sc) == 7
+        assert sc['positions'][:, 0].tolist() == [0, 1, 3, 4, 7, 8, 9]
+        assert sc['positions'].base is buf
+
+    def test_model_step_is_done_removal_uncertain(self):
+        'removal is not deferred in uncertain containers'
+        sc = SpillContainer(uncertain=True, removal_interval=3)
+        sc.prepare_for_model_run()
+        sc._append_data_arrays(10)
+
+        sc['status_codes'][[2, 5, 6]] = oil_status.to_be_removed
+        sc.model_step_is_done()
+
+        assert len(sc) == 7
+
+    def test_model_step_is_done_deferred_fate(self):
+        'elements waiting to be removed are not weathered'
+        sc = SpillContainer(removal_interval=3)
+        sc.prepare_for_model_run({'fate_status': gat('fate_status')})
+        sc._append_data_arrays(10)
+
+        sc['fate_status'][:] = bt_fate.non_weather
+        sc['status_codes'][[2, 5, 6]] = oil_status.to_be_removed
+        sc.model_step_is_done()
+
+        assert len(sc) == 10
+        assert np.all(sc['fate_status'][[2, 5, 6]] == 0)
+        assert np.count_nonzero(sc['fate_status'] == bt_fate.non_weather) == 7
+
+    def test_pair_removal_options(self):
+        scp = SpillContainerPair(uncertain=True, removal_interval=3)
+
+        assert [sc.removal_interval for sc in scp.items()] == [3, 3]
+
+        scp.removal_fraction = 0.2
+        assert [sc.removal_fraction for sc in scp.items()] == [0.2, 0.2]
+
     def test_amount(self, sp):
         assert sp.amount == 0
         assert sp.release.release_mass == 0
@@ -18,6 +18,7 @@ from datetime import datetime, timedelta
 
 import pytest
 
+from gnome.basic_types import oil_status
 from gnome.utilities import cache
 
 from gnome.spill_container import SpillContainerPairData
@@ -242,6 +243,82 @@ def test_write_and_read_back_uncertain():
     assert np.array_equal(sc2._spill_container['positions'], pos2)
 
 
+@pytest.mark.parametrize(('num_writers', 'file_format'), [(0, 'npy'),
+                                                          (2, 'npz'),
+                                                          (2, 'npy'),
+                                                          (0, 'columnar')])
+def test_write_and_read_back_background(num_writers, file_format):
+    """
+    write to cache with background writers and/or .npy files and read back
+    """
+    c = cache.ElementCache(num_writers=num_writers,
+                           max_queue_size=1,
+                           file_format=file_format)
+
+    sc = sample_sc_release(num_elements=10, start_pos=(3.14, 2.72, 1.2))
+    scp = SpillContainerPairData(sc)
+
+    positions = []
+    for step in range(5):
+        sc.current_time_stamp = dt + tdelta * step
+        sc['positions'] += 1.1
+        positions.append(sc['positions'].copy())
+
+        c.save_timestep(step, scp)
+
+    c.post_model_run()
+
+    for step in range(5):
+        sc_step = c.load_timestep(step)._spill_container
+        assert np.array_equal(sc_step['positions'], positions[step])
+        assert sc_step.current_time_stamp == dt + tdelta * step
+
+
+@pytest.mark.parametrize('file_format', ['npz', 'npy', 'columnar'])
+def test_load_array_names(file_format):
+    """
+    only the requested arrays are loaded, plus time stamp and mass balance
+    """
+    c = cache.ElementCache(file_format=file_format)
+
+    sc = sample_sc_release(num_elements=10, start_pos=(3.14, 2.72, 1.2))
+    sc.mass_balance = {'beached': 1.0}
+    scp = SpillContainerPairData(sc)
+
+    for step in range(3):
+        sc.current_time_stamp = dt + tdelta * step
+        sc['positions'] += 1.1
+        c.save_timestep(step, scp)
+
+    # step 0 comes from disk, step 2 from memory
+    for step in (0, 2):
+        sc_step = c.load_timestep(step, array_names=['positions',
+                                                     'status_codes'])
+        sc_step = sc_step._spill_container
+
+        assert set(sc_step.keys()) == {'positions', 'status_codes'}
+        assert sc_step.current_time_stamp == dt + tdelta * step
+        assert sc_step.mass_balance == {'beached': 1.0}
+
+
+def test_background_write_error():
+    """
+    errors in the background writers are raised in the model thread
+    """
+    c = cache.ElementCache(num_writers=1)
+
+    sc = sample_sc_release(num_elements=10, start_pos=(3.14, 2.72, 1.2))
+    scp = SpillContainerPairData(sc)
+
+    # make the writes fail (private API...)
+    cache.clean_up_cache(dir_name=c._cache_dir)
+
+    c.save_timestep(0, scp)
+
+    with pytest.raises(cache.CacheError):
+        c.flush()
+
+
 def test_read_back_from_memory():
     """
     test reading back the last item from the memory cache
@@ -285,6 +362,140 @@ def test_read_back_from_memory():
                           sc['positions'])
 
 
+def test_read_back_from_memory_shared():
+    """
+    the most recent step is a read-only snapshot shared by all readers
+    unless a copy is asked for
+    """
+    c = cache.ElementCache(enabled=False)
+
+    sc = sample_sc_release(num_elements=10, start_pos=(3.14, 2.72, 1.2))
+    sc.current_time_stamp = dt
+    scp = SpillContainerPairData(sc)
+
+    c.save_timestep(0, scp)
+    pos0 = sc['positions'].copy()
+
+    # changing the spill container doesn't change the snapshot
+    sc['positions'] += 1.1
+
+    scp_a = c.load_timestep(0)._spill_container
+    scp_b = c.load_timestep(0)._spill_container
+
+    assert np.array_equal(scp_a['positions'], pos0)
+    assert scp_a['positions'] is scp_b['positions']
+    assert scp_a.current_time_stamp == dt
+
+    with pytest.raises(ValueError):
+        scp_a['positions'][0] = 0.0
+
+    scp_c = c.load_timestep(0, copy=True)._spill_container
+    assert scp_c['positions'] is not scp_a['positions']
+
+    scp_c['positions'][0] = 0.0
+    assert np.array_equal(c.load_timestep(0)._spill_container['positions'],
+                          pos0)
+
+
+def test_to_be_removed_not_saved():
+    """
+    elements the SpillContainer keeps until its next removal are not in the
+    cached steps
+    """
+    c = cache.ElementCache(enabled=False)
+
+    sc = sample_sc_release(num_elements=10, start_pos=(3.14, 2.72, 1.2))
+    sc.removal_interval = 3
+    sc['positions'][:, 0] = np.arange(10)
+    sc['status_codes'][[2, 5]] = oil_status.to_be_removed
+
+    sc.model_step_is_done()
+    assert len(sc) == 10
+
+    c.save_timestep(0, SpillContainerPairData(sc))
+    saved = c.load_timestep(0)._spill_container
+
+    assert len(saved['status_codes']) == 8
+    assert np.all(saved['status_codes'] != oil_status.to_be_removed)
+    assert saved['positions'][:, 0].tolist() == [0, 1, 3, 4, 6, 7, 8, 9]
+
+
+def test_step_snapshot():
+    """
+    a CachedStep keeps the data of a step after the cache drops it
+    """
+    c = cache.ElementCache(enabled=False)
+
+    sc = sample_sc_release(num_elements=10, start_pos=(3.14, 2.72, 1.2))
+    sc.current_time_stamp = dt
+    scp = SpillContainerPairData(sc)
+
+    c.save_timestep(0, scp)
+    step = c.step_snapshot(0)
+    pos0 = sc['positions'].copy()
+
+    sc['positions'] += 1.1
+    c.save_timestep(1, scp)
+
+    with pytest.raises(cache.CacheError):
+        c.load_timestep(0)
+
+    sc0 = step.load_timestep(0)._spill_container
+
+    assert np.array_equal(sc0['positions'], pos0)
+    assert sc0.current_time_stamp == dt
+
+    # arrays added to the step don't get into the cache
+    step.recent[0][0]['surface_concentration'] = np.ones((10,))
+
+    assert 'surface_concentration' in step.load_timestep(0)._spill_container
+    assert ('surface_concentration' not in
+            c.load_timestep(1)._spill_container)
+
+    with pytest.raises(cache.CacheError):
+        step.load_timestep(1)
+
+
+@pytest.mark.parametrize(('recent_steps', 'recent_bytes', 'spill_to_disk'),
+                         [(3, None, False),
+                          (10, 1, False),
+                          (2, None, True)])
+def test_recent_lru(recent_steps, recent_bytes, spill_to_disk):
+    """
+    the last few steps are kept in memory, older ones are dropped or spilled
+    to disk
+    """
+    c = cache.ElementCache(enabled=False,
+                           recent_steps=recent_steps,
+                           recent_bytes=recent_bytes,
+                           spill_to_disk=spill_to_disk)
+
+    sc = sample_sc_release(num_elements=10, start_pos=(3.14, 2.72, 1.2))
+    scp = SpillContainerPairData(sc)
+
+    positions = []
+    for step in range(5):
+        sc['positions'] += 1.1
+        positions.append(sc['positions'].copy())
+        c.save_timestep(step, scp)
+
+    # the newest step is always kept
+    num_kept = 1 if recent_bytes == 1 else recent_steps
+    assert list(c.recent) == list(range(5 - num_kept, 5))
+    assert c.stats['evictions'] == 5 - num_kept
+
+    for step in range(5):
+        if step >= 5 - num_kept or spill_to_disk:
+            sc_step = c.load_timestep(step)._spill_container
+            assert np.array_equal(sc_step['positions'], positions[step])
+        else:
+            with pytest.raises(cache.CacheError):
+                c.load_timestep(step)
+
+    assert c.stats['hits'] == num_kept
+    assert c.stats['misses'] == 5 - num_kept
+
+
 def test_cache_error():
     """
     you should get an exception when you ask for somethign not there
@@ -0,0 +1,96 @@
+"""
+tests of the surface concentration code
+"""
+
+import numpy as np
+import pytest
+
+from gnome.utilities.surface_concentration import (compute_surface_concentration,
+                                                   _gaussian_smooth,
+                                                   _KernelGrid)
+
+
+def sample_sc(num=2000, seed=0):
+    """
+    a dict with the arrays compute_surface_concentration needs -- it only
+    indexes the spill container
+    """
+    rng = np.random.RandomState(seed)
+
+    positions = np.zeros((num, 3))
+    positions[:, 0] = -120 + rng.normal(0, 0.02, num)
+    positions[:, 1] = 45 + rng.normal(0, 0.01, num)
+
+    return {'positions': positions,
+            'spill_num': np.zeros((num,), dtype=np.int32),
+            'mass': rng.uniform(1, 2, num),
+            'age': rng.randint(0, 3 * 3600, num)}
+
+
+def test_grid_matches_kde():
+    sc = sample_sc()
+
+    compute_surface_concentration(sc, 'kde')
+    kde = sc['surface_concentration'].copy()
+
+    compute_surface_concentration(sc, 'grid')
+    grid = sc['surface_concentration']
+
+    assert np.all(grid > 0)
+    assert np.median(np.abs(grid - kde) / kde) < 0.02
+
+
+def test_grid_too_few_points():
+    sc = sample_sc(num=2)
+
+    compute_surface_concentration(sc, 'grid')
+
+    assert np.all(sc['surface_concentration'] == 0)
+
+
+def test_unknown_algorithm():
+    with pytest.raises(ValueError):
+        compute_surface_concentration(sample_sc(), 'not_an_algorithm')
+
+
+def test_grid_conserves_mass():
+    rng = np.random.RandomState(1)
+    weights = rng.uniform(1, 2, 500)
+
+    grid = _KernelGrid(rng.normal(0, 100, 500), rng.normal(0, 50, 500),
+                       weights)
+
+    assert np.isclose(grid.conc.sum() * grid.cell[0] * grid.cell[1],
+                      weights.sum())
+
+
+def test_gaussian_smooth():
+    grid = np.zeros((41, 31))
+    grid[20, 15] = 1.0
+
+    smoothed = _gaussian_smooth(grid, (3.0, 2.0))
+
+    assert np.isclose(smoothed.sum(), 1.0)
+    assert np.unravel_index(smoothed.argmax(), smoothed.shape) == (20, 15)
+    # symmetric about the point
+    assert np.allclose(smoothed, smoothed[::-1, ::-1])
+
+
+def test_grid_young_particles_no_mass():
+    """
+    a kernel made only of particles with no mass counts them, as the kde
+    does -- even if the spill has mass
+    """
+    sc = sample_sc()
+
+    young = np.argsort(sc['age'])[:100]
+    sc['age'][young] = 0
+    sc['age'][sc['age'] < 3600] += 3600
+    sc['age'][young] = 0
+    sc['mass'][young] = 0.0
+
+    compute_surface_concentration(sc, 'grid')
+    conc = sc['surface_concentration']
+
+    assert np.all(np.isfinite(conc))
+    assert np.all(conc[young] > 0)
@@ -200,6 +200,83 @@ class TestFayGravityViscous(object):
         assert np.all(area[:4] == i_area)
         assert np.all(area[4:] < i_area)
 
+    def test_update_area_blobs(self):
+        '''
+        giving the blob of each LE is the same as grouping them by age, if
+        the blobs are the ages
+        '''
+        bulk_init_volume, age, area = data_arrays(10)
+
+        age[0::2] = 900
+        age[1::2] = 1800
+        bulk_init_volume[0::2] = 60
+        area[:] = 100.0
+
+        blobs = np.where(age == 900, 7, 3)
+
+        by_age = self.spread.update_area2(water_viscosity,
+                                          rel_buoy,
+                                          bulk_init_volume,
+                                          area.copy(),
+                                          default_ts,
+                                          age)
+        by_blob = self.spread.update_area2(water_viscosity,
+                                           rel_buoy,
+                                           bulk_init_volume,
+                                           area.copy(),
+                                           default_ts,
+                                           age,
+                                           blobs=blobs)
+
+        assert np.all(by_age > area)
+        assert np.allclose(by_age, by_blob)
+
+    def test_add_to_blobs(self):
+        '''
+        LEs of a spill released at the same time are one blob
+        '''
+        spread = FayGravityViscous()
+        sc = object()
+
+        data = {'blob_num': np.full((6,), -1, dtype=np.int32),
+                'spill_num': np.array([0, 0, 1, 1, 0, 0]),
+                'age': np.zeros((6,), dtype=np.int32)}
+
+        spread._add_to_blobs(sc, data, np.arange(6) < 3)
+
+        assert np.all(data['blob_num'] == [0, 0, 1, -1, -1, -1])
+
+        # released in the same step: they join the blobs
+        spread._add_to_blobs(sc, data, data['blob_num'] < 0)
+
+        assert np.all(data['blob_num'] == [0, 0, 1, 1, 0, 0])
+
+        # released later: a new blob
+        data['age'][:] = default_ts
+        data['age'][4:] = 0
+        data['blob_num'][4:] = -1
+        spread._add_to_blobs(sc, data, data['blob_num'] < 0)
+
+        assert np.all(data['blob_num'] == [0, 0, 1, 1, 2, 2])
+        assert np.all(spread._blob_table(sc).spill_num == [0, 1, 0])
+
+    def test_add_to_blobs_loaded(self):
+        '''
+        LEs already in blobs the table doesn't have -- a model loaded in the
+        middle of a run -- keep their blobs, and new ones go after them
+        '''
+        spread = FayGravityViscous()
+        sc = object()
+
+        data = {'blob_num': np.array([0, 0, 1, 2, -1, -1], dtype=np.int32),
+                'spill_num': np.array([0, 0, 1, 0, 0, 1]),
+                'age': np.array([2, 2, 2, 1, 0, 0]) * default_ts}
+
+        spread._add_to_blobs(sc, data, data['blob_num'] < 0)
+
+        assert np.all(data['blob_num'] == [0, 0, 1, 2, 3, 4])
+        assert np.all(spread._blob_table(sc).spill_num == [0, 1, 0, 0, 1])
+
 
 class TestLangmuir(ObjForTests):
     thick = 1e-4
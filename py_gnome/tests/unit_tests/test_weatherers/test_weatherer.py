@@ -8,6 +8,7 @@ from datetime import datetime
 
 import numpy as np
 
+from gnome.basic_types import fate
 from gnome.utilities.inf_datetime import InfDateTime
 
 from gnome.environment import Water
@@ -65,3 +66,67 @@ class TestWeatherer(object):
 
 def test_sort_order():
     assert weatherer_sort(Dissolution()) > weatherer_sort(NaturalDispersion())
+
+
+class TestBatchedWeathering(object):
+    time_step = 15. * 60
+
+    def weathered_sc(self):
+        weatherer = HalfLifeWeatherer(half_lives=tuple([self.time_step] *
+                                                       subs.num_components))
+        sc = weathering_data_arrays(weatherer.array_types,
+                                    Water(),
+                                    self.time_step,
+                                    num_elements=4)[0]
+
+        # one element that is not weathered, so the data the weatherers
+        # get is a copy
+        sc['fate_status'][0] = fate.non_weather
+
+        weatherer.prepare_for_model_run(sc)
+        weatherer.prepare_for_model_step(sc, self.time_step, rel_time)
+
+        return weatherer, sc
+
+    def test_synced_at_end(self):
+        weatherer, sc = self.weathered_sc()
+        orig_mc = np.copy(sc['mass_components'])
+
+        with sc.batched_weathering():
+            weatherer.weather_elements(sc, self.time_step, rel_time)
+            weatherer.weather_elements(sc, self.time_step, rel_time)
+
+            # the data is kept until the end
+            assert np.all(sc._data_arrays['mass_components'] == orig_mc)
+
+        assert np.all(sc['mass_components'][0] == orig_mc[0])
+        assert np.allclose(0.25 * orig_mc[1:], sc['mass_components'][1:])
+        assert np.allclose(sc['mass_components'].sum(1), sc['mass'])
+
+    def test_direct_access_syncs(self):
+        weatherer, sc = self.weathered_sc()
+        orig_mc = np.copy(sc['mass_components'])
+
+        with sc.batched_weathering():
+            weatherer.weather_elements(sc, self.time_step, rel_time)
+
+            assert np.allclose(0.5 * orig_mc[1:], sc['mass_components'][1:])
+
+            weatherer.weather_elements(sc, self.time_step, rel_time)
+
+        assert np.allclose(0.25 * orig_mc[1:], sc['mass_components'][1:])
+
+    def test_same_as_unbatched(self):
+        weatherer, sc = self.weathered_sc()
+        _, unbatched = self.weathered_sc()
+
+        with sc.batched_weathering():
+            for _i in range(3):
+                weatherer.weather_elements(sc, self.time_step, rel_time)
+
+        for _i in range(3):
+            weatherer.weather_elements(unbatched, self.time_step, rel_time)
+
+        assert np.allclose(sc['mass_components'],
+                           unbatched['mass_components'])
+        assert np.allclose(sc['mass'], unbatched['mass'])
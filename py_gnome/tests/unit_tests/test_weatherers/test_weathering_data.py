@@ -8,6 +8,7 @@ import numpy as np
 import pytest
 from testfixtures import log_capture
 
+from gnome.basic_types import oil_status, fate
 from gnome.environment import Water
 from gnome.weatherers import WeatheringData, FayGravityViscous
 from gnome.spill import point_line_release_spill
@@ -93,6 +94,32 @@ class TestWeatheringData(object):
         wd.weather_elements(sc, time_step, rel_time)
         wd.model_step_is_done(sc)
 
+    def test_aggregated_data_to_be_removed(self):
+        '''
+        elements waiting to be removed are left out of the averages and of
+        the non_weathering mass
+        '''
+        rel_time = datetime.now().replace(microsecond=0)
+        (sc, wd) = self.sample_sc_intrinsic(10, rel_time)
+
+        num = sc.release_elements(3600, rel_time)
+        wd.initialize_data(sc, num)
+
+        tbr = np.arange(len(sc)) % 2 == 1
+        sc['status_codes'][tbr] = oil_status.to_be_removed
+        sc['density'][tbr] = 2000.0
+        sc['viscosity'][tbr] = 1.0
+        sc['fate_status'][:] = fate.non_weather
+
+        wd._aggregated_data(sc, 0)
+
+        assert np.isclose(sc.mass_balance['avg_density'],
+                          sc['density'][~tbr].mean())
+        assert np.isclose(sc.mass_balance['avg_viscosity'],
+                          sc['viscosity'][~tbr].mean())
+        assert np.isclose(sc.mass_balance['non_weathering'],
+                          sc['mass'][~tbr].sum())
+
     @pytest.mark.parametrize("vary_mf", [True, False])
     def test_density_visc_update(self, vary_mf):
         '''